@@ -118,6 +118,7 @@ app.jinja_env.globals.update(get_locale=get_locale)
 app.config['DEBUG'] = False
 app.config['SECRET_KEY'] = config_data.get('secret_key', 'default-secret-key')
 app.config['SECURITY_PASSWORD_SALT'] = config_data.get('security_password_salt', 'default-salt')
+# Auth/session store. Metrics history has its own database file (stats.database in config.yml).
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///../stats.db'
 app.config['SECURITY_PASSWORD_HASH'] = 'bcrypt'
 app.config['SECURITY_PASSWORD_SINGLE_HASH'] = False
@@ -265,12 +266,14 @@ history_data = {
     'cpu_history': stats.cpu_history,
     'memory_history_basic': stats.memory_history_basic,
     'disk_history_basic': stats.disk_history_basic,
-    'cpu_history_24h': stats.cpu_history_24h,
-    'memory_history_24h': stats.memory_history_24h,
-    'disk_history': stats.disk_history,
+    'cpu_core_history': stats.cpu_core_history,
+    'disk_io_history': stats.disk_io_history,
+    'rollups': stats.rollups,
     'network_history': stats.network_history
 }
-load_history(history_data)
+# Restore the histories from the warm start snapshot; fall back to the database
+if not stats.load_warm_start():
+    load_history(history_data)
 
 # Set NPM domain and API URL from config_data
 NPM_DOMAIN = config_data["npm"]["domain"]
@@ -328,30 +331,11 @@ def on_user_authenticated(sender, user, **extra):
 # Start the metrics collection threads
 def start_collection_threads():
     """Start the background threads for collecting metrics"""
-    # Start the main stats collection thread
+    # Start the stats collection thread (runs the CPU, memory, disk and network samplers)
     stats_collection.start_stats_collection()
     
-    # Start individual stat collector threads
-    cpu_thread = threading.Thread(target=stats_collection.collect_cpu_stats)
-    cpu_thread.daemon = True
-    cpu_thread.start()
-    
-    mem_thread = threading.Thread(target=stats_collection.collect_memory_stats)
-    mem_thread.daemon = True
-    mem_thread.start()
-    
-    disk_thread = threading.Thread(target=stats_collection.collect_disk_stats)
-    disk_thread.daemon = True
-    disk_thread.start()
-    
-    net_thread = threading.Thread(target=stats_collection.collect_network_stats)
-    net_thread.daemon = True
-    net_thread.start()
-    
-    # Start RTAD thread if configured
-    rtad_thread = threading.Thread(target=rtad_collection.rtad_main)
-    rtad_thread.daemon = True
-    rtad_thread.start()
+    # Start RTAD ingestion (thread or separate process, see rtad.ingest_process)
+    rtad_collection.start_rtad()
 
 # Start the collection threads when the application starts
 start_collection_threads()
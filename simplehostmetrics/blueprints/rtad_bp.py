@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, jsonify, request
 from flask_security import login_required
 import rtad_manager
+import rtad_ingest
 import logging
 
 rtad_bp = Blueprint('rtad', __name__, url_prefix='/rtad')
@@ -75,6 +76,36 @@ def handle_config():
         logging.error(f"Error handling RTAD config: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@rtad_bp.route('/api/ingest')
+@login_required
+def get_ingest_status():
+    """
+    Return how RTAD ingestion runs and, for the separate ingestion process, its
+    throughput, lag, backlog and restarts.
+    """
+    try:
+        return jsonify(rtad_ingest.get_ingest_status())
+    except Exception as e:
+        logging.error(f"Error getting RTAD ingestion status: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@rtad_bp.route('/api/backfill', methods=['GET', 'POST'])
+@login_required
+def handle_backfill():
+    """
+    GET: progress of the current or last archive backfill.
+    POST: start importing the rotated (and .gz) archives of all configured proxy logs.
+    """
+    try:
+        if request.method == 'GET':
+            return jsonify(rtad_manager.get_backfill_progress())
+        if not rtad_manager.start_backfill():
+            return jsonify({"error": "A backfill is already running"}), 409
+        return jsonify({"success": True}), 202
+    except Exception as e:
+        logging.error(f"Error handling RTAD backfill: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @rtad_bp.route('/rtad_lastb')
 @login_required
 def get_lastb_data():
@@ -1,7 +1,11 @@
-from flask import Blueprint, render_template, jsonify
+from flask import Blueprint, render_template, jsonify, request, Response
 from flask_security import login_required
 import stats
 import psutil
+from cpu_sampler import cpu_sampler
+from history_query import query_range, DEFAULT_MAX_POINTS, MAX_MAX_POINTS
+from maintenance import storage_stats
+from export import export_history, MIME_TYPES
 import time
 from datetime import datetime, timedelta
 
@@ -12,19 +16,83 @@ stats_bp = Blueprint('stats', __name__, url_prefix='/stats')
 def index():
     return render_template('stats.html')
 
+def snapshot_response(snapshot):
+    """
+    Serve a pre-encoded stats snapshot, answering If-None-Match with 304 and
+    using the pre-compressed body for clients that accept gzip.
+    """
+    if snapshot is None:
+        return jsonify({"error": "Stats not collected yet"}), 503
+    if request.if_none_match.contains(snapshot.etag):
+        response = Response(status=304)
+    elif snapshot.gzip_body is not None and 'gzip' in request.accept_encodings:
+        response = Response(snapshot.gzip_body, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(snapshot.body, mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+@stats_bp.route('/api/snapshot')
+@login_required
+def get_snapshot():
+    """
+    Return the latest dashboard stats (system, network) as published by the collector.
+    """
+    return snapshot_response(stats.snapshot)
+
+@stats_bp.route('/api/stream')
+@login_required
+def stream_stats():
+    """
+    Server-Sent Events stream of the dashboard stats, one 'stats' event per collector tick.
+    Clients that cannot keep up with their buffer are disconnected and should reconnect.
+    """
+    subscriber = stats.stream_hub.subscribe()
+    if subscriber is None:
+        return jsonify({"error": "Too many stream subscribers"}), 503
+
+    last_event_id = request.headers.get('Last-Event-ID')
+
+    def generate():
+        try:
+            yield b"retry: 3000\n\n"
+            current = stats.snapshot
+            if current is not None and last_event_id != current.etag:
+                yield current.frame
+            while True:
+                try:
+                    frame = subscriber.get(stats.STREAM_HEARTBEAT)
+                except EOFError:
+                    break
+                yield frame if frame is not None else b": keepalive\n\n"
+        finally:
+            stats.stream_hub.unsubscribe(subscriber)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @stats_bp.route('/api/system')
 @login_required
 def get_system_stats():
+    """
+    Return current CPU, memory and disk figures from the collector's latest samples.
+    Never blocks: CPU utilization comes from the shared CPU sampler.
+    """
     try:
-        cpu_percent = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
+        cpu = cpu_sampler.snapshot()
+        memory = stats.latest['memory'] or psutil.virtual_memory()
+        disk = stats.latest['disk'] or psutil.disk_usage('/')
         
         return jsonify({
             'cpu': {
-                'percent': cpu_percent,
-                'cores': psutil.cpu_count(),
-                'frequency': psutil.cpu_freq()._asdict() if psutil.cpu_freq() else None
+                'percent': cpu['percent'],
+                'cores': cpu['cores'],
+                'frequency': cpu['frequency']
             },
             'memory': {
                 'total': memory.total,
@@ -43,6 +111,51 @@ def get_system_stats():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@stats_bp.route('/api/cpu/cores')
+@login_required
+def get_cpu_cores():
+    """
+    Return the latest per-core CPU utilization and its recent history.
+
+    Query parameters:
+    - limit: Optional. Number of history points (default: the dashboard window).
+    """
+    try:
+        try:
+            limit = max(1, int(request.args.get('limit', stats.MAX_HISTORY)))
+        except ValueError:
+            return jsonify({"error": "Invalid limit parameter"}), 400
+        cpu = cpu_sampler.snapshot()
+        return jsonify({
+            'timestamp': cpu['timestamp'],
+            'percent': cpu['percent'],
+            'per_core': cpu['per_core'],
+            'history': stats.cpu_core_history.to_columns(limit, raw_timestamps=True)
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@stats_bp.route('/api/disk/io')
+@login_required
+def get_disk_io():
+    """
+    Return per-device disk throughput (bytes/s), IOPS and busy time (%) with recent history.
+
+    Query parameters:
+    - limit: Optional. Number of history points per device (default: the dashboard window).
+    """
+    try:
+        try:
+            limit = max(1, int(request.args.get('limit', stats.MAX_HISTORY)))
+        except ValueError:
+            return jsonify({"error": "Invalid limit parameter"}), 400
+        response = stats.disk_io_sampler.snapshot()
+        response['history'] = {device: series.to_columns(limit, raw_timestamps=True)
+                               for device, series in list(stats.disk_io_history.items())}
+        return jsonify(response)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @stats_bp.route('/api/network')
 @login_required
 def get_network_stats():
@@ -64,29 +177,188 @@ def get_network_stats():
 @stats_bp.route('/api/history')
 @login_required
 def get_history():
+    """
+    Return the metric histories.
+
+    Query parameters:
+    - since: Optional. Cursor from a previous response; only newer points are returned.
+    - epoch: Required with since. Epoch from the previous response.
+    - series: Optional with since. Comma-separated series families, e.g. cpu,memory,network.
+    """
     try:
+        since = request.args.get('since')
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return jsonify({"error": "Invalid since parameter"}), 400
+            families = request.args.get('series')
+            families = set(families.split(',')) if families else None
+            return jsonify(stats.history_since(since, request.args.get('epoch'), families))
+        # The live histories end exactly at the returned cursor, so a client can continue
+        # from it with the increments of the stats stream without gaps or duplicates.
+        cursor = stats.history_cursor()
         return jsonify({
-            'cpu_history': stats.cpu_history,
-            'memory_history_basic': stats.memory_history_basic,
-            'disk_history_basic': stats.disk_history_basic,
-            'cpu_history_24h': stats.cpu_history_24h,
-            'memory_history_24h': stats.memory_history_24h,
-            'disk_history': stats.disk_history,
-            'network_history': stats.network_history
+            'cursor': cursor,
+            'epoch': stats.SNAPSHOT_EPOCH,
+            'max_points': stats.MAX_HISTORY,
+            'cpu_history': stats.cpu_history.to_columns(stats.MAX_HISTORY, until=cursor),
+            'memory_history_basic': stats.memory_history_basic.to_columns(stats.MAX_HISTORY, until=cursor),
+            'disk_history_basic': stats.disk_history_basic.to_columns(stats.MAX_HISTORY, until=cursor),
+            'cpu_history_24h': stats.get_cpu_details()['history24h'],
+            'memory_history_24h': stats.get_memory_details()['history24h'],
+            'disk_history': stats.format_rollup_history('disk.used', stats.DETAIL_SPAN_DISK, 'used', '%m-%d %H:%M'),
+            'network_history': stats.network_history.to_records(stats.MAX_HISTORY, until=cursor)
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@stats_bp.route('/api/range')
+@login_required
+def get_range():
+    """
+    Return the persisted history of one metric over an arbitrary time range, downsampled
+    server-side into min/max/avg buckets.
+
+    Query parameters:
+    - metric: Required. e.g. cpu.usage, memory.used, disk.free, net.eth0.input, cpu.core.3,
+      disk_io.sda.write_bytes.
+    - from / to: Optional. UNIX timestamps (default: the last hour).
+    - max_points: Optional. Upper bound on returned points (default 1000, max 10000).
+    """
+    try:
+        metric = request.args.get('metric')
+        if not metric:
+            return jsonify({"error": "Missing metric parameter"}), 400
+        try:
+            end = float(request.args.get('to', time.time()))
+            start = float(request.args.get('from', end - 3600))
+            max_points = min(MAX_MAX_POINTS, max(1, int(request.args.get('max_points', DEFAULT_MAX_POINTS))))
+        except ValueError:
+            return jsonify({"error": "Invalid range parameters"}), 400
+        if start >= end:
+            return jsonify({"error": "from must be before to"}), 400
+        family = metric.split('.', 1)[0]
+        raw_interval = stats.sample_intervals.get('network' if family == 'net' else family)
+        return jsonify(query_range(metric, start, end, max_points, stats.rollups, raw_interval,
+                                   stats.chunks.pending))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@stats_bp.route('/api/export')
+@login_required
+def export_range():
+    """
+    Stream the persisted history of a raw series or rollup tier as a file download.
+
+    Query parameters:
+    - source: raw (default) or rollup.
+    - series: Raw series for source=raw, e.g. cpu, memory, disk, cpu_cores, network.eth0, disk_io.sda.
+    - tier: Rollup tier for source=rollup, e.g. 1m, 1h, 1d.
+    - metric: Optional GLOB filter on rollup metrics, e.g. net.eth0.*.
+    - from / to: Optional. UNIX timestamps (default: everything up to now).
+    - format: csv (default), ndjson or parquet (requires pyarrow).
+    """
+    try:
+        source = request.args.get('source', 'raw')
+        fmt = request.args.get('format', 'csv')
+        name = request.args.get('series') if source == 'raw' else request.args.get('tier')
+        try:
+            end = float(request.args.get('to', time.time()))
+            start = float(request.args.get('from', 0))
+        except ValueError:
+            return jsonify({"error": "Invalid range parameters"}), 400
+        try:
+            body = export_history(source, name, fmt, start, end, request.args.get('metric'),
+                                  [tier.name for tier in stats.rollups.tiers])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        response = Response(body, mimetype=MIME_TYPES[fmt])
+        response.headers['Content-Disposition'] = f'attachment; filename="{source}-{name}.{fmt}"'
+        return response
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @stats_bp.route('/api/processes')
 @login_required
 def get_processes():
+    """
+    Return a page of the process table from the background process sampler.
+
+    Query parameters:
+    - sort: cpu_percent (default), rss, io_rate, memory_percent, pid or name.
+    - order: desc (default) or asc.
+    - page / per_page: Pagination, 1-based (per_page defaults to 50, max 500).
+    """
     try:
-        processes = []
-        for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
-            try:
-                processes.append(proc.info)
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                pass
-        return jsonify(processes)
+        sort = request.args.get('sort', 'cpu_percent')
+        descending = request.args.get('order', 'desc') != 'asc'
+        try:
+            page = max(1, int(request.args.get('page', 1)))
+            per_page = min(500, max(1, int(request.args.get('per_page', 50))))
+        except ValueError:
+            return jsonify({"error": "Invalid pagination parameters"}), 400
+        try:
+            return jsonify(stats.process_sampler.page(sort, descending, page, per_page))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@stats_bp.route('/api/processes/top')
+@login_required
+def get_top_processes():
+    """
+    Return the top-N processes by CPU, resident memory and I/O throughput.
+    """
+    try:
+        return jsonify(stats.process_sampler.top_consumers())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@stats_bp.route('/api/processes/<int:pid>/history')
+@login_required
+def get_process_history(pid):
+    """
+    Return the recorded CPU/RSS/IO history of a process that is or was recently a top consumer.
+    """
+    try:
+        history = stats.process_sampler.process_history(pid)
+        if history is None:
+            return jsonify({"error": "No history recorded for this process"}), 404
+        return jsonify(history)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500 
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+@stats_bp.route('/api/collector')
+@login_required
+def get_collector_stats():
+    """
+    Return collector internals: sampler timings, stream subscribers, retention sweeps,
+    rollup tiers (including late samples that were dropped), the DB writer's queue and
+    commit gauges and the warm start snapshot.
+    """
+    try:
+        return jsonify({
+            'scheduler': stats.scheduler.stats() if stats.scheduler is not None else None,
+            'stream': stats.stream_hub.stats(),
+            'retention': stats.retention.stats(),
+            'rollups': stats.rollups.stats(),
+            'db_writer': stats.db_writer.stats(),
+            'warm_start': stats.warm_start.stats()
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@stats_bp.route('/api/storage')
+@login_required
+def get_storage_stats():
+    """
+    Return the metrics database size (file, WAL, free pages) and the maintenance job's progress.
+    """
+    try:
+        storage = storage_stats()
+        storage['maintenance'] = stats.maintenance.stats()
+        return jsonify(storage)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
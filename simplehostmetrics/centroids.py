@@ -0,0 +1,147 @@
+# simplehostmetrics/centroids.py
+# This module provides the country centroid index used as the location fallback for GeoIP
+# lookups without city coordinates (RTAD enrichment, map endpoints).
+# The centroids come from country_centroids.yml. The YAML is compiled once into a small binary
+# cache file (ISO codes plus a float64 coordinate array) that is rebuilt whenever the YAML
+# changes, and loaded into one shared in-memory dict, so a lookup is a dict access.
+
+import logging
+import os
+import struct
+import threading
+from array import array
+
+import yaml
+
+CENTROIDS_PATH = 'country_centroids.yml'
+CACHE_SUFFIX = '.bin'
+
+# Cache header: magic, YAML mtime (ns), YAML size, number of countries, length of the code blob.
+CACHE_HEADER = struct.Struct('<8sqqII')
+CACHE_MAGIC = b'SHMCENT1'
+
+
+def parse_centroids(path):
+    """
+    Read {ISO code: (lat, lon)} from the YAML file. Keys are read as plain strings, so
+    codes such as NO (Norway) are not turned into booleans by YAML 1.1.
+    """
+    with open(path, 'r') as f:
+        raw = yaml.load(f, Loader=yaml.BaseLoader) or {}
+    centroids = {}
+    for key, value in raw.items():
+        code = str(key).strip().upper()
+        try:
+            if not isinstance(value, list) or len(value) != 2:
+                raise ValueError("expected [lat, lon]")
+            centroids[code] = (float(value[0]), float(value[1]))
+        except ValueError as e:
+            logging.error("Invalid centroid for %s: %s (%s)", code, value, e)
+    return centroids
+
+
+def write_cache(path, stat, centroids):
+    codes = sorted(centroids)
+    blob = '\n'.join(codes).encode('ascii')
+    coordinates = array('d')
+    for code in codes:
+        coordinates.extend(centroids[code])
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(CACHE_HEADER.pack(CACHE_MAGIC, stat.st_mtime_ns, stat.st_size, len(codes), len(blob)))
+        f.write(blob)
+        f.write(coordinates.tobytes())
+    os.replace(temp_path, path)
+
+
+def read_cache(path, stat):
+    """
+    Return the cached centroids, or None if the cache is missing or was built from another
+    version of the YAML file.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    try:
+        magic, mtime_ns, size, count, blob_size = CACHE_HEADER.unpack_from(data)
+    except struct.error:
+        return None
+    if magic != CACHE_MAGIC or mtime_ns != stat.st_mtime_ns or size != stat.st_size:
+        return None
+    offset = CACHE_HEADER.size
+    codes = data[offset:offset + blob_size].decode('ascii').split('\n') if count else []
+    coordinates = array('d')
+    coordinates.frombytes(data[offset + blob_size:offset + blob_size + 16 * count])
+    if len(codes) != count or len(coordinates) != 2 * count:
+        return None
+    return {code: (coordinates[2 * i], coordinates[2 * i + 1]) for i, code in enumerate(codes)}
+
+
+class CentroidIndex:
+    """
+    Country code -> (lat, lon) lookup table.
+    """
+
+    def __init__(self, centroids=None):
+        self.centroids = dict(centroids or {})
+
+    def __len__(self):
+        return len(self.centroids)
+
+    def __contains__(self, code):
+        return bool(code) and code.upper() in self.centroids
+
+    def get(self, code, default=None):
+        """
+        Return (lat, lon) for an ISO country code (any case), or `default`.
+        """
+        if not code or code == "Unknown":
+            return default
+        return self.centroids.get(code.upper(), default)
+
+    @classmethod
+    def load(cls, path=CENTROIDS_PATH, cache_path=None):
+        """
+        Load the index from the compiled cache, compiling it from the YAML file first if
+        the cache is missing or outdated. A cache that cannot be written is not an error.
+        """
+        cache_path = cache_path or path + CACHE_SUFFIX
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            logging.error("Error loading country centroids from %s: %s", path, e)
+            return cls()
+        centroids = read_cache(cache_path, stat)
+        if centroids is None:
+            try:
+                centroids = parse_centroids(path)
+            except (OSError, yaml.YAMLError) as e:
+                logging.error("Error loading country centroids from %s: %s", path, e)
+                return cls()
+            try:
+                write_cache(cache_path, stat, centroids)
+            except OSError as e:
+                logging.warning("Could not write centroid cache %s: %s", cache_path, e)
+        return cls(centroids)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Return the shared index, loading it on first use.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = CentroidIndex.load()
+    return _index
+
+
+def get_centroid(country_code, default=None):
+    return get_index().get(country_code, default)
@@ -0,0 +1,197 @@
+# simplehostmetrics/chunk_store.py
+# This module implements the compact on-disk format for raw metric samples.
+# Instead of one row per sample, all samples of a series within one CHUNK_SPAN window are packed
+# into a single metric_chunks row: timestamps as uint32 millisecond offsets from the chunk start
+# and values as float32, stored column by column. Readers decode only the column they need,
+# straight from the BLOB through a memoryview.
+
+import math
+import threading
+from array import array
+from bisect import bisect_left
+
+# Seconds covered by one chunk; chunks are aligned to multiples of the span.
+CHUNK_SPAN = 60
+
+INSERT_CHUNK_SQL = """INSERT INTO metric_chunks (series, timestamp, end_timestamp, count, fields, timestamps, data)
+                      VALUES (?, ?, ?, ?, ?, ?, ?)"""
+
+
+def encode_chunk(series, fields, timestamps, columns):
+    """
+    Pack samples into a metric_chunks row:
+    (series, start, end, count, fields, timestamp offsets BLOB, float32 values BLOB).
+    """
+    start = timestamps[0]
+    offsets = array('I', (round((ts - start) * 1000) for ts in timestamps))
+    values = array('f')
+    for column in columns:
+        values.extend(column)
+    return (series, start, timestamps[-1], len(timestamps), ','.join(fields),
+            offsets.tobytes(), values.tobytes())
+
+
+class Chunk:
+    """
+    A decoded view of one metric_chunks row. Columns are decoded lazily from the BLOB.
+    """
+    __slots__ = ('start', 'count', 'fields', '_offsets', '_data')
+
+    def __init__(self, start, count, fields, offsets, data):
+        self.start = start
+        self.count = count
+        self.fields = tuple(fields.split(',')) if isinstance(fields, str) else tuple(fields)
+        self._offsets = offsets
+        self._data = data
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row['timestamp'], row['count'], row['fields'], row['timestamps'], row['data'])
+
+    def offsets(self):
+        """
+        Return the sample timestamps as uint32 millisecond offsets from `start` (no copy).
+        """
+        return memoryview(self._offsets).cast('I')
+
+    def index(self, timestamp, lo=0, hi=None):
+        """
+        Position of the first sample at or after `timestamp`, found by bisecting the offsets.
+        """
+        # Rounded to the microsecond first so a boundary that is exactly on a sample is not
+        # pushed past it by float noise.
+        threshold = math.ceil(round((timestamp - self.start) * 1000, 3))
+        return bisect_left(self.offsets(), max(threshold, 0), lo, self.count if hi is None else hi)
+
+    def timestamp(self, index):
+        return self.start + self.offsets()[index] / 1000
+
+    def timestamps(self):
+        return [self.start + offset / 1000 for offset in self.offsets()]
+
+    def column(self, field):
+        """
+        Return the float32 values of one field as a memoryview into the BLOB (no copy).
+        """
+        index = self.fields.index(field)
+        size = 4 * self.count
+        return memoryview(self._data)[index * size:(index + 1) * size].cast('f')
+
+    def samples(self, field):
+        """
+        Yield (timestamp, value) pairs of one field.
+        """
+        return zip(self.timestamps(), self.column(field))
+
+
+class OpenChunk:
+    """
+    Samples of one series in the current, not yet written window.
+    """
+    __slots__ = ('slot', 'fields', 'timestamps', 'columns')
+
+    def __init__(self, slot, fields):
+        self.slot = slot
+        self.fields = tuple(fields)
+        self.timestamps = array('d')
+        self.columns = [array('f') for _ in self.fields]
+
+    def as_chunk(self):
+        _, start, _, count, fields, offsets, data = encode_chunk(None, self.fields, self.timestamps, self.columns)
+        return Chunk(start, count, fields, offsets, data)
+
+
+class ChunkWriter:
+    """
+    Collects samples per series and hands finished chunks to `sink(rows)` (e.g. a queued
+    executemany of INSERT_CHUNK_SQL) once their window has passed.
+    """
+
+    def __init__(self, sink, span=CHUNK_SPAN):
+        self.sink = sink
+        self.span = span
+        self.lock = threading.Lock()
+        self.open = {}
+
+    def append(self, series, fields, timestamp, values):
+        slot = int(timestamp // self.span)
+        sealed = None
+        with self.lock:
+            chunk = self.open.get(series)
+            if chunk is not None and (chunk.slot != slot or chunk.fields != tuple(fields)):
+                sealed = self._encode(series, chunk)
+                chunk = None
+            if chunk is None:
+                chunk = self.open[series] = OpenChunk(slot, fields)
+            chunk.timestamps.append(timestamp)
+            for column, value in zip(chunk.columns, values):
+                column.append(value)
+        if sealed is not None:
+            self.sink([sealed])
+
+    def seal_expired(self, now):
+        """
+        Write the chunks whose window has ended (e.g. of series that stopped reporting).
+        """
+        slot = int(now // self.span)
+        with self.lock:
+            expired = [series for series, chunk in self.open.items() if chunk.slot < slot]
+            rows = [self._encode(series, self.open.pop(series)) for series in expired]
+        if rows:
+            self.sink(rows)
+
+    def flush(self):
+        """
+        Write all open chunks, e.g. on shutdown.
+        """
+        with self.lock:
+            rows = [self._encode(series, chunk) for series, chunk in self.open.items()]
+            self.open = {}
+        if rows:
+            self.sink(rows)
+
+    def pending(self, series):
+        """
+        Return the not yet written samples of a series as a Chunk, or None.
+        """
+        with self.lock:
+            chunk = self.open.get(series)
+            return chunk.as_chunk() if chunk is not None else None
+
+    @staticmethod
+    def _encode(series, chunk):
+        return encode_chunk(series, chunk.fields, chunk.timestamps, chunk.columns)
+
+
+def read_chunks(cursor, series, start=None, end=None, span=CHUNK_SPAN):
+    """
+    Yield the stored chunks of a series overlapping [start, end), oldest first.
+    Rows are fetched and decoded one at a time.
+    """
+    sql = "SELECT timestamp, count, fields, timestamps, data FROM metric_chunks WHERE series = ?"
+    params = [series]
+    if start is not None:
+        # Chunks never span more than one window, so older chunks cannot overlap the range.
+        sql += " AND timestamp > ? AND end_timestamp >= ?"
+        params += [start - span, start]
+    if end is not None:
+        sql += " AND timestamp < ?"
+        params.append(end)
+    for row in cursor.execute(sql + " ORDER BY timestamp", params):
+        yield Chunk.from_row(row)
+
+
+def read_latest_chunks(cursor, series, samples):
+    """
+    Return the newest chunks of a series holding at least `samples` samples, oldest first.
+    """
+    chunks = []
+    total = 0
+    for row in cursor.execute(
+            "SELECT timestamp, count, fields, timestamps, data FROM metric_chunks "
+            "WHERE series = ? ORDER BY timestamp DESC", (series,)):
+        chunks.append(Chunk.from_row(row))
+        total += row['count']
+        if total >= samples:
+            break
+    return chunks[::-1]
@@ -0,0 +1,118 @@
+# simplehostmetrics/cpu_sampler.py
+# This module owns the process-wide CPU utilization baseline.
+# psutil.cpu_percent() keeps a single hidden baseline per process, so independent callers
+# reset each other's measurements, and cpu_percent(interval=1) blocks its caller for a second.
+# CpuSampler computes utilization from its own cpu_times() deltas on the collector cadence and
+# every consumer (collector, API endpoints) reads the latest value without blocking.
+# Times are read per core, so a single pegged core stays visible next to the aggregate.
+
+import logging
+import sys
+import threading
+import time
+from array import array
+
+import psutil
+
+# How often the (comparatively expensive) CPU frequency is refreshed, in seconds.
+FREQUENCY_REFRESH_INTERVAL = 10.0
+
+
+def _total_time(times):
+    total = sum(times)
+    if sys.platform.startswith('linux'):
+        # guest time is already accounted for in user/nice on Linux.
+        total -= getattr(times, 'guest', 0) + getattr(times, 'guest_nice', 0)
+    return total
+
+
+def _busy_time(times):
+    return _total_time(times) - times.idle - getattr(times, 'iowait', 0)
+
+
+def sum_times(per_core):
+    """
+    Aggregate per-core cpu_times() samples into one, as cpu_times() itself would return.
+    """
+    return type(per_core[0])._make(map(sum, zip(*per_core)))
+
+
+def utilization(previous, current):
+    """
+    CPU utilization in percent between two cpu_times() samples.
+    """
+    total = _total_time(current) - _total_time(previous)
+    if total <= 0:
+        return 0.0
+    busy = _busy_time(current) - _busy_time(previous)
+    return round(min(100.0, max(0.0, busy / total * 100)), 1)
+
+
+class CpuSampler:
+    """
+    Shared CPU sampling service. sample() is called by the collector; readers use
+    percent / snapshot() and never touch psutil's CPU baseline themselves.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.previous_times = None
+        self.previous_per_core = None
+        self.percent = 0.0
+        # Utilization per logical core (float32, core order as reported by psutil)
+        self.per_core = array('f')
+        self.timestamp = None
+        self.cores = psutil.cpu_count()
+        self.physical_cores = psutil.cpu_count(logical=False)
+        self.frequency = None
+        self.frequency_updated = 0.0
+
+    def sample(self, now=None):
+        """
+        Take a new measurement and return the aggregate utilization since the previous one.
+        """
+        now = time.time() if now is None else now
+        per_core = psutil.cpu_times(percpu=True)
+        current = sum_times(per_core)
+        with self.lock:
+            # Like psutil, the first call only establishes the baseline.
+            if self.previous_times is not None:
+                self.percent = utilization(self.previous_times, current)
+            # A changed core count (CPU hotplug) restarts the per-core baseline.
+            if self.previous_per_core is not None and len(self.previous_per_core) == len(per_core):
+                self.per_core = array('f', map(utilization, self.previous_per_core, per_core))
+            else:
+                self.per_core = array('f', bytes(4 * len(per_core)))
+            self.previous_times = current
+            self.previous_per_core = per_core
+            self.timestamp = now
+            if now - self.frequency_updated >= FREQUENCY_REFRESH_INTERVAL:
+                self.frequency_updated = now
+                self.frequency = self._read_frequency()
+            return self.percent
+
+    @staticmethod
+    def _read_frequency():
+        try:
+            freq = psutil.cpu_freq()
+            return freq._asdict() if freq else None
+        except Exception as e:
+            logging.debug("CPU frequency not available: %s", e)
+            return None
+
+    def snapshot(self):
+        """
+        Return the latest measurement with core count and frequency.
+        """
+        with self.lock:
+            return {
+                'percent': self.percent,
+                'per_core': [round(value, 1) for value in self.per_core],
+                'cores': self.cores,
+                'physical_cores': self.physical_cores,
+                'frequency': self.frequency,
+                'timestamp': self.timestamp
+            }
+
+
+cpu_sampler = CpuSampler()
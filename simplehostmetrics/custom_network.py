@@ -2,15 +2,16 @@ from flask import Blueprint, request, jsonify
 import logging
 import psutil
 import json
-from database import get_db_connection
+from database import get_settings_connection
 
 custom_network_bp = Blueprint('custom_network', __name__, url_prefix='/custom_network')
 
 def load_custom_network_graphs():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, graph_name, interfaces FROM custom_network_graphs")
-    rows = cursor.fetchall()
+    conn = get_settings_connection()
+    try:
+        rows = conn.execute("SELECT id, graph_name, interfaces FROM custom_network_graphs").fetchall()
+    finally:
+        conn.close()
     graphs = []
     for row in rows:
         graphs.append({
@@ -18,23 +19,23 @@ def load_custom_network_graphs():
             "graph_name": row["graph_name"],
             "interfaces": json.loads(row["interfaces"]) if row["interfaces"] else []
         })
-    conn.close()
     return graphs
 
 def add_custom_network_graphs(new_graphs):
     """
     Adds or updates new graphs without deleting existing configuration.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    for graph in new_graphs:
-        interfaces_json = json.dumps(graph.get("interfaces", []))
-        cursor.execute(
-            "INSERT OR REPLACE INTO custom_network_graphs (id, graph_name, interfaces) VALUES (?, ?, ?)",
-            (graph.get("id"), graph.get("graph_name"), interfaces_json)
-        )
-    conn.commit()
-    conn.close()
+    conn = get_settings_connection()
+    try:
+        with conn:
+            for graph in new_graphs:
+                interfaces_json = json.dumps(graph.get("interfaces", []))
+                conn.execute(
+                    "INSERT OR REPLACE INTO custom_network_graphs (id, graph_name, interfaces) VALUES (?, ?, ?)",
+                    (graph.get("id"), graph.get("graph_name"), interfaces_json)
+                )
+    finally:
+        conn.close()
 
 @custom_network_bp.route('/config', methods=['GET'])
 def get_config():
@@ -83,9 +84,10 @@ def delete_custom_network_graph(graph_id):
     """
     Delete a custom network graph by its ID.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM custom_network_graphs WHERE id = ?", (graph_id,))
-    conn.commit()
-    conn.close()
+    conn = get_settings_connection()
+    try:
+        with conn:
+            conn.execute("DELETE FROM custom_network_graphs WHERE id = ?", (graph_id,))
+    finally:
+        conn.close()
     return jsonify({'status': 'success', 'deleted': graph_id})
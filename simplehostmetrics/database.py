@@ -1,165 +1,452 @@
+import logging
 import sqlite3
 from sqlite3 import Row
+import threading
 import time
 import os
+from array import array
+from itertools import groupby
 
-def get_db_connection():
-    conn = sqlite3.connect("stats.db", check_same_thread=False)
+import yaml
+
+from centroids import get_centroid
+from chunk_store import CHUNK_SPAN, INSERT_CHUNK_SQL, encode_chunk, read_latest_chunks
+from rollup import load_tier_spec, parse_interval
+
+# The metrics tables live in their own database file, separate from the SQLAlchemy
+# auth/session store (stats.db), so history writes never take the lock a login needs.
+DEFAULT_DB_PATH = "metrics.db"
+AUTH_DB_PATH = "stats.db"
+
+# Tables that were kept in the auth database before it was split off, copied into a new
+# metrics database on first start. User configuration (custom_network_graphs) stays in the
+# auth database.
+LEGACY_METRICS_TABLES = (
+    'cpu_history', 'memory_history', 'disk_history_basic', 'net_history', 'cpu_core_history',
+    'disk_io_history', 'metric_rollups', 'metric_chunks',
+)
+
+CREATE_NETWORK_GRAPHS_SQL = "CREATE TABLE IF NOT EXISTS custom_network_graphs (id INTEGER PRIMARY KEY, graph_name TEXT, interfaces TEXT)"
+
+def load_stats_config():
+    """
+    Return the stats section of config.yml ({} if it cannot be read).
+    """
+    try:
+        with open('config.yml', 'r') as f:
+            config = yaml.safe_load(f) or {}
+    except OSError:
+        return {}
+    return config.get('stats', {}) or {}
+
+def load_db_path():
+    """
+    Return the metrics database file from stats.database in config.yml.
+    """
+    return load_stats_config().get('database') or DEFAULT_DB_PATH
+
+DB_PATH = load_db_path()
+
+# Connection tuning. WAL lets request handlers read while the DB worker writes, and
+# synchronous=NORMAL only fsyncs at WAL checkpoints instead of on every commit.
+BUSY_TIMEOUT_MS = 5000
+WRITER_CACHE_KB = 16384           # Page cache of writable connections (PRAGMA cache_size, KiB)
+READER_CACHE_KB = 2048            # Page cache of each pooled read-only connection
+MMAP_SIZE = 64 * 1024 * 1024      # Bytes of the database file read through mmap
+
+# Per-thread pooled connections, keyed by mode ('read' / 'write').
+_pool = threading.local()
+
+def configure_connection(conn, read_only=False):
+    """
+    Apply the per-connection pragmas. journal_mode=WAL is persistent and set once in
+    initialize_database().
+    """
     conn.row_factory = Row
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{READER_CACHE_KB if read_only else WRITER_CACHE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    if read_only:
+        # Any write through this connection fails with "attempt to write a readonly database".
+        conn.execute("PRAGMA query_only = ON")
     return conn
 
+def get_db_connection(read_only=False):
+    """
+    Open a new connection (writable unless read_only). Owned by the caller, who closes it
+    (e.g. the DB worker thread keeps one for its lifetime).
+    """
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    return configure_connection(conn, read_only)
+
+def get_pooled_connection(read_only=True):
+    """
+    Return the calling thread's pooled connection, opening it on first use.
+    Pooled connections stay open for the thread's lifetime and must not be closed
+    by the caller; writers should use them as a context manager to commit or roll back.
+    """
+    mode = 'read' if read_only else 'write'
+    conn = getattr(_pool, mode, None)
+    if conn is None:
+        conn = configure_connection(sqlite3.connect(DB_PATH), read_only)
+        setattr(_pool, mode, conn)
+    return conn
+
+def get_read_connection():
+    """
+    Return the calling thread's pooled read-only connection, for request handlers.
+    """
+    return get_pooled_connection(read_only=True)
+
+def get_settings_connection():
+    """
+    Open a new connection to the auth database (stats.db), which also holds user
+    configuration such as the custom network graphs. Owned by the caller, who closes it.
+    """
+    conn = sqlite3.connect(AUTH_DB_PATH, check_same_thread=False)
+    conn.row_factory = Row
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    return conn
+
+# Per-row history tables replaced by metric_chunks in schema version 2:
+# table -> (series name or key column, value columns)
+LEGACY_HISTORY_TABLES = {
+    'cpu_history': ('cpu', ('usage',)),
+    'memory_history': ('memory', ('free', 'used', 'cached')),
+    'disk_history_basic': ('disk', ('total', 'used', 'free')),
+    'net_history': ('interface', ('input', 'output')),
+    'disk_io_history': ('device', ('read_bytes', 'write_bytes', 'read_ops', 'write_ops', 'busy')),
+}
+
+def convert_legacy_history(conn):
+    """
+    Pack the rows of the per-row history tables into metric_chunks and empty the old tables.
+    """
+    def chunk_rows(series, fields, rows):
+        for _, window in groupby(rows, key=lambda row: int(row[0] // CHUNK_SPAN)):
+            window = list(window)
+            columns = [[row[1 + i] for row in window] for i in range(len(fields))]
+            yield encode_chunk(series, fields, [row[0] for row in window], columns)
+
+    for table, (key, fields) in LEGACY_HISTORY_TABLES.items():
+        columns = ', '.join(fields)
+        if key in ('interface', 'device'):
+            prefix = 'network' if key == 'interface' else 'disk_io'
+            names = [row[0] for row in conn.execute(f"SELECT DISTINCT {key} FROM {table}")]
+            for name in names:
+                rows = conn.execute(f"SELECT timestamp, {columns} FROM {table} WHERE {key} = ? ORDER BY timestamp",
+                                    (name,)).fetchall()
+                conn.executemany(INSERT_CHUNK_SQL, chunk_rows(f"{prefix}.{name}", fields, rows))
+        else:
+            rows = conn.execute(f"SELECT timestamp, {columns} FROM {table} ORDER BY timestamp").fetchall()
+            conn.executemany(INSERT_CHUNK_SQL, chunk_rows(key, fields, rows))
+        conn.execute(f"DELETE FROM {table}")
+
+    # Per-core rows hold all cores as one float32 BLOB; a core count change starts a new chunk.
+    rows = [(row[0],) + tuple(array('f', row[1]))
+            for row in conn.execute("SELECT timestamp, usage FROM cpu_core_history ORDER BY timestamp")]
+    for _, same_width in groupby(rows, key=len):
+        same_width = list(same_width)
+        fields = tuple(str(core) for core in range(len(same_width[0]) - 1))
+        conn.executemany(INSERT_CHUNK_SQL, chunk_rows('cpu_cores', fields, same_width))
+    conn.execute("DELETE FROM cpu_core_history")
+
+# Aggregate tables of the former hard-coded 24h/7d charts, replaced by metric_rollups:
+# table -> (rollup metric, value column, bucket width of the rows in seconds)
+LEGACY_AGGREGATE_TABLES = {
+    'cpu_history_24h': ('cpu.usage', 'usage', 3600),
+    'memory_history_24h': ('memory.used', 'usage', 3600),
+    'disk_history_details': ('disk.used', 'used', 21600),
+}
+
+def convert_legacy_aggregates(conn, schema='main'):
+    """
+    Fold the rows of the old aggregate tables in `schema` into metric_rollups, each into the
+    finest configured tier whose interval is a multiple of the rows' bucket width. Buckets
+    the rollup engine has already written are kept. Tables in the main schema are dropped.
+    """
+    tiers = sorted((parse_interval(spec['interval']), str(spec['name']))
+                   for spec in load_tier_spec(load_stats_config()))
+    tables = {row[0] for row in conn.execute(f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table'")}
+    for table, (metric, column, width) in LEGACY_AGGREGATE_TABLES.items():
+        if table not in tables:
+            continue
+        target = next(((interval, name) for interval, name in tiers if interval % width == 0), None)
+        if target is None:
+            logging.warning("No rollup tier fits the %ds buckets of %s; its history is dropped", width, table)
+        else:
+            interval, tier = target
+            conn.execute(
+                f"""INSERT INTO main.metric_rollups (metric, tier, timestamp, min, max, avg, count, last)
+                    SELECT ?, ?, bucket, MIN({column}), MAX({column}), AVG({column}), COUNT(*),
+                           (SELECT {column} FROM {schema}.{table}
+                            WHERE timestamp >= bucket AND timestamp < bucket + ?
+                            ORDER BY timestamp DESC LIMIT 1)
+                    FROM (SELECT CAST(timestamp AS INTEGER) - CAST(timestamp AS INTEGER) % ? AS bucket, {column}
+                          FROM {schema}.{table})
+                    WHERE bucket NOT IN (SELECT timestamp FROM main.metric_rollups WHERE metric = ? AND tier = ?)
+                    GROUP BY bucket""",
+                (metric, tier, interval, interval, metric, tier)
+            )
+        if schema == 'main':
+            conn.execute(f"DROP TABLE {table}")
+
+def return_network_graphs(conn):
+    """
+    Move the custom network graphs that were copied into the metrics database back to the
+    auth database and drop them here. The metrics copy is the one edited since the split,
+    so it replaces the auth database's rows.
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'custom_network_graphs'").fetchone() is None:
+        return
+    if os.path.exists(AUTH_DB_PATH) and os.path.samefile(DB_PATH, AUTH_DB_PATH):
+        return
+    rows = conn.execute("SELECT id, graph_name, interfaces FROM custom_network_graphs").fetchall()
+    settings = get_settings_connection()
+    try:
+        with settings:
+            settings.execute(CREATE_NETWORK_GRAPHS_SQL)
+            settings.execute("DELETE FROM custom_network_graphs")
+            settings.executemany("INSERT INTO custom_network_graphs (id, graph_name, interfaces) VALUES (?, ?, ?)",
+                                 [tuple(row) for row in rows])
+    finally:
+        settings.close()
+    conn.execute("DROP TABLE custom_network_graphs")
+
+# Schema migrations, applied in order on top of the base tables created by initialize_database().
+# PRAGMA user_version stores the number of the last migration applied to the database file.
+# A migration step is either an SQL statement or a callable taking the connection.
+MIGRATIONS = [
+    (1, "time indexes for the history tables", [
+        "CREATE INDEX IF NOT EXISTS idx_cpu_history_timestamp ON cpu_history (timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_cpu_core_history_timestamp ON cpu_core_history (timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_memory_history_timestamp ON memory_history (timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_disk_history_basic_timestamp ON disk_history_basic (timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_disk_io_history_device_timestamp ON disk_io_history (device, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_net_history_interface_timestamp ON net_history (interface, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_metric_rollups_metric_tier_timestamp ON metric_rollups (metric, tier, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_metric_rollups_tier_timestamp ON metric_rollups (tier, timestamp)",
+    ]),
+    (2, "chunked storage of raw samples", [
+        """CREATE TABLE IF NOT EXISTS metric_chunks (
+            series TEXT,
+            timestamp REAL,
+            end_timestamp REAL,
+            count INTEGER,
+            fields TEXT,
+            timestamps BLOB,
+            data BLOB
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_metric_chunks_series_timestamp ON metric_chunks (series, timestamp)",
+        convert_legacy_history,
+    ]),
+    (3, "persistent RTAD log offsets", [
+        """CREATE TABLE IF NOT EXISTS log_offsets (
+            path TEXT PRIMARY KEY,
+            device INTEGER,
+            inode INTEGER,
+            fingerprint TEXT,
+            fingerprint_size INTEGER,
+            offset INTEGER,
+            updated REAL
+        )""",
+    ]),
+    (4, "convert the legacy 24h/7d aggregate tables into rollups", [
+        convert_legacy_aggregates,
+    ]),
+    (5, "drop the country_centroids table (centroids come from country_centroids.yml)", [
+        "DROP TABLE IF EXISTS country_centroids",
+    ]),
+    (6, "move custom_network_graphs back to the auth database", [
+        return_network_graphs,
+    ]),
+]
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """
+    Upgrade the database in place to the latest schema version.
+    Each migration runs in its own transaction together with its user_version bump,
+    so an interrupted upgrade resumes at the first migration that did not complete.
+    """
+    version = get_schema_version(conn)
+    for target, description, statements in MIGRATIONS:
+        if target <= version:
+            continue
+        logging.info("Migrating database schema to version %d: %s", target, description)
+        conn.execute("BEGIN")
+        try:
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        version = target
+
+def import_legacy_metrics(conn, legacy_path):
+    """
+    Copy the metrics tables of the pre-split database into a freshly created metrics database.
+    The tables are left untouched in the auth database.
+    """
+    conn.execute("ATTACH DATABASE ? AS legacy", (legacy_path,))
+    try:
+        legacy_tables = {row[0] for row in conn.execute("SELECT name FROM legacy.sqlite_master WHERE type = 'table'")}
+        conn.execute("BEGIN")
+        for table in LEGACY_METRICS_TABLES:
+            if table not in legacy_tables:
+                continue
+            main_columns = [row[1] for row in conn.execute(f"PRAGMA main.table_info({table})")]
+            legacy_columns = {row[1] for row in conn.execute(f"PRAGMA legacy.table_info({table})")}
+            columns = ', '.join(column for column in main_columns if column in legacy_columns)
+            conn.execute(f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM legacy.{table}")
+        # Rows of the per-row history tables (older legacy schema) are packed into chunks,
+        # those of the old aggregate tables folded into rollups.
+        convert_legacy_history(conn)
+        convert_legacy_aggregates(conn, 'legacy')
+        conn.commit()
+        logging.info("Imported metrics history from %s into %s", legacy_path, DB_PATH)
+    except Exception as e:
+        conn.rollback()
+        logging.error("Importing metrics history from %s failed: %s", legacy_path, e)
+    finally:
+        conn.execute("DETACH DATABASE legacy")
+
 def initialize_database():
+    created = not os.path.exists(DB_PATH)
     conn = get_db_connection()
     cursor = conn.cursor()
+    # Freed pages are returned to the file system in small steps by the maintenance job
+    # (see maintenance.py). On a new file this takes effect before the first table exists.
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode = WAL")
 
     # Core Tabellen erstellen
     cursor.execute("CREATE TABLE IF NOT EXISTS cpu_history (timestamp REAL, usage REAL)")
-    cursor.execute("CREATE TABLE IF NOT EXISTS cpu_history_24h (timestamp REAL, usage REAL)")
     cursor.execute("CREATE TABLE IF NOT EXISTS memory_history (timestamp REAL, free REAL, used REAL, cached REAL)")
-    cursor.execute("CREATE TABLE IF NOT EXISTS memory_history_24h (timestamp REAL, usage REAL)")
     cursor.execute("CREATE TABLE IF NOT EXISTS disk_history_basic (timestamp REAL, total REAL, used REAL, free REAL)")
-    cursor.execute("CREATE TABLE IF NOT EXISTS disk_history_details (timestamp REAL, used REAL)")
     cursor.execute("CREATE TABLE IF NOT EXISTS net_history (interface TEXT, timestamp REAL, input REAL, output REAL)")
-    cursor.execute("CREATE TABLE IF NOT EXISTS custom_network_graphs (id INTEGER PRIMARY KEY, graph_name TEXT, interfaces TEXT)")
-
-    # Create table for country centroids
+    # usage holds all cores of one tick as a packed float32 array
+    cursor.execute("CREATE TABLE IF NOT EXISTS cpu_core_history (timestamp REAL, usage BLOB)")
     cursor.execute("""
-        CREATE TABLE IF NOT EXISTS country_centroids (
-            country_code TEXT PRIMARY KEY,
-            lat REAL,
-            lon REAL
+        CREATE TABLE IF NOT EXISTS disk_io_history (
+            device TEXT,
+            timestamp REAL,
+            read_bytes REAL,
+            write_bytes REAL,
+            read_ops REAL,
+            write_ops REAL,
+            busy REAL
         )
     """)
-
-    # Insert statements for country centroids (no placeholders, single multi-value insert).
-    # Extend as needed for more countries. 'INSERT OR IGNORE' ensures no duplicates if table already populated.
     cursor.execute("""
-        INSERT OR IGNORE INTO country_centroids (country_code, lat, lon)
-        VALUES
-        ('US', 37.0902, -95.7129),
-        ('CN', 35.8617, 104.1954),
-        ('NL', 52.1326, 5.2913),
-        ('GB', 55.3781, -3.4360),
-        ('DE', 51.1657, 10.4515),
-        ('FR', 46.2276, 2.2137),
-        ('RU', 61.5240, 105.3188),
-        ('CA', 56.1304, -106.3468),
-        ('BR', -14.2350, -51.9253),
-        ('AU', -25.2744, 133.7751),
-        ('JP', 36.2048, 138.2529),
-        ('IN', 20.5937, 78.9629),
-        ('SG', 1.3521, 103.8198),
-        ('KR', 35.9078, 127.7669),
-        ('ZA', -30.5595, 22.9375),
-        ('SE', 60.1282, 18.6435),
-        ('CH', 46.8182, 8.2275),
-        ('AT', 47.5162, 14.5501),
-        ('BE', 50.5039, 4.4699),
-        ('DK', 56.2639, 9.5018)
+        CREATE TABLE IF NOT EXISTS metric_rollups (
+            metric TEXT,
+            tier TEXT,
+            timestamp REAL,
+            min REAL,
+            max REAL,
+            avg REAL,
+            count INTEGER,
+            last REAL
+        )
     """)
 
     conn.commit()
+    migrate(conn)
+    initialize_settings_database()
+    if created and os.path.exists(AUTH_DB_PATH) and not os.path.samefile(DB_PATH, AUTH_DB_PATH):
+        import_legacy_metrics(conn, AUTH_DB_PATH)
+    maintenance_config = load_stats_config().get('maintenance', {}) or {}
+    enable_incremental_vacuum(conn, bool(maintenance_config.get('vacuum_on_start', False)))
     conn.close()
 
-def load_history(cached_data):
-    from datetime import datetime
-    import psutil
+def initialize_settings_database():
+    """
+    Create the user configuration tables in the auth database.
+    """
+    conn = get_settings_connection()
+    try:
+        with conn:
+            conn.execute(CREATE_NETWORK_GRAPHS_SQL)
+    finally:
+        conn.close()
 
-    MAX_HISTORY = 30
-    MAX_HISTORY_EXT_CPU = 24
-    MAX_HISTORY_EXT_DISK = 28
+def enable_incremental_vacuum(conn, vacuum=False):
+    """
+    Switch an existing database to auto_vacuum=INCREMENTAL. New files get the mode when they are
+    created; on a database that already has tables it only changes with a full VACUUM, which
+    rewrites the whole file and blocks startup. That VACUUM is only run when asked for
+    (stats.maintenance.vacuum_on_start); otherwise it is logged as pending.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return
+    if not vacuum:
+        logging.warning("Incremental vacuum is not enabled on %s; freed pages stay in the file until a "
+                        "one-time VACUUM runs (set stats.maintenance.vacuum_on_start and restart)", DB_PATH)
+        return
+    logging.info("Enabling incremental vacuum on %s (one-time VACUUM)", DB_PATH)
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
 
+def load_series(cursor, series, target):
+    """
+    Fill a TimeSeries with the newest stored samples of a series (up to its capacity).
+    Chunks written with a different field layout (e.g. another core count) are skipped.
+    """
+    target.clear()
+    for chunk in read_latest_chunks(cursor, series, target.capacity):
+        if chunk.fields != target.fields:
+            continue
+        columns = [chunk.column(field) for field in target.fields]
+        for i, timestamp in enumerate(chunk.timestamps()):
+            target.append(timestamp, *(column[i] for column in columns))
+
+def load_history(cached_data):
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    # CPU basic
-    cursor.execute("SELECT timestamp, usage FROM cpu_history ORDER BY timestamp DESC LIMIT ?", (MAX_HISTORY,))
-    rows = cursor.fetchall()[::-1]
-    cached_data['cpu_history'].clear()
-    cached_data['cpu_history']['time'] = [datetime.fromtimestamp(r['timestamp']).strftime('%H:%M:%S') for r in rows]
-    cached_data['cpu_history']['usage'] = [r['usage'] for r in rows]
-
-    # Memory basic
-    cursor.execute("SELECT timestamp, free, used, cached FROM memory_history ORDER BY timestamp DESC LIMIT ?", (MAX_HISTORY,))
-    rows = cursor.fetchall()[::-1]
-    cached_data['memory_history_basic'].clear()
-    cached_data['memory_history_basic']['time'] = [datetime.fromtimestamp(r['timestamp']).strftime('%H:%M:%S') for r in rows]
-    cached_data['memory_history_basic']['free'] = [r['free'] for r in rows]
-    cached_data['memory_history_basic']['used'] = [r['used'] for r in rows]
-    cached_data['memory_history_basic']['cached'] = [r['cached'] for r in rows]
-
-    # Disk basic
-    cursor.execute("SELECT timestamp, total, used, free FROM disk_history_basic ORDER BY timestamp DESC LIMIT ?", (MAX_HISTORY,))
-    rows = cursor.fetchall()[::-1]
-    cached_data['disk_history_basic'].clear()
-    cached_data['disk_history_basic']['time'] = [datetime.fromtimestamp(r['timestamp']).strftime('%H:%M:%S') for r in rows]
-    cached_data['disk_history_basic']['total'] = [r['total'] for r in rows]
-    cached_data['disk_history_basic']['used'] = [r['used'] for r in rows]
-    cached_data['disk_history_basic']['free'] = [r['free'] for r in rows]
-
-    # CPU extended
-    cursor.execute("SELECT timestamp, usage FROM cpu_history_24h ORDER BY timestamp DESC LIMIT ?", (MAX_HISTORY_EXT_CPU,))
-    rows = cursor.fetchall()[::-1]
-    cached_data['cpu_history_24h'].clear()
-    if rows:
-        cached_data['cpu_history_24h'].extend([{'time': r['timestamp'], 'usage': r['usage']} for r in rows])
-    else:
-        current_usage = psutil.cpu_percent()
-        cached_data['cpu_history_24h'].append({'time': time.time(), 'usage': current_usage})
-    if len(cached_data['cpu_history_24h']) > MAX_HISTORY_EXT_CPU:
-        cached_data['cpu_history_24h'] = cached_data['cpu_history_24h'][-MAX_HISTORY_EXT_CPU:]
-
-    # Memory extended
-    cursor.execute("SELECT timestamp, usage FROM memory_history_24h ORDER BY timestamp DESC LIMIT ?", (MAX_HISTORY_EXT_CPU,))
-    rows = cursor.fetchall()[::-1]
-    cached_data['memory_history_24h'].clear()
-    cached_data['memory_history_24h'].extend([{'time': r['timestamp'], 'usage': r['usage']} for r in rows])
-    if len(cached_data['memory_history_24h']) > MAX_HISTORY_EXT_CPU:
-        cached_data['memory_history_24h'] = cached_data['memory_history_24h'][-MAX_HISTORY_EXT_CPU:]
-
-    # Disk extended
-    cursor.execute("SELECT timestamp, used FROM disk_history_details ORDER BY timestamp DESC LIMIT ?", (MAX_HISTORY_EXT_DISK,))
-    rows = cursor.fetchall()[::-1]
-    cached_data['disk_history'].clear()
-    if rows:
-        cached_data['disk_history'].extend([{'time': r['timestamp'], 'used': r['used']} for r in rows])
-    else:
-        disk = psutil.disk_usage('/')
-        cached_data['disk_history'].append({'time': time.time(), 'used': disk.used})
-    if len(cached_data['disk_history']) > MAX_HISTORY_EXT_DISK:
-        cached_data['disk_history'] = cached_data['disk_history'][-MAX_HISTORY_EXT_DISK:]
-
-    # Network basic
-    cursor.execute("SELECT interface, timestamp, input, output FROM net_history ORDER BY timestamp DESC LIMIT ?", (MAX_HISTORY,))
-    rows = cursor.fetchall()
-    cached_data['network_history'].clear()
-    for row in rows:
-        iface = row['interface']
-        if iface not in cached_data['network_history']:
-            cached_data['network_history'][iface] = []
-        cached_data['network_history'][iface].append({
-            'time': datetime.fromtimestamp(row['timestamp']).strftime('%H:%M:%S'),
-            'input': row['input'],
-            'output': row['output']
-        })
-        if len(cached_data['network_history'][iface]) > MAX_HISTORY:
-            cached_data['network_history'][iface] = cached_data['network_history'][iface][-MAX_HISTORY:]
+    # Raw samples, stored as chunks per series
+    stores = {'disk_io': cached_data['disk_io_history'], 'network': cached_data['network_history']}
+    for store in stores.values():
+        store.clear()
+    fixed = {
+        'cpu': cached_data['cpu_history'],
+        'memory': cached_data['memory_history_basic'],
+        'disk': cached_data['disk_history_basic'],
+        'cpu_cores': cached_data['cpu_core_history'],
+    }
+    for (series,) in cursor.execute("SELECT DISTINCT series FROM metric_chunks").fetchall():
+        if series in fixed:
+            load_series(cursor, series, fixed[series])
+            continue
+        prefix, _, key = series.partition('.')
+        if prefix in stores and key:
+            load_series(cursor, series, stores[prefix].get(key))
+
+    # Rollup tiers (extended views)
+    rollups = cached_data['rollups']
+    for tier in rollups.tiers:
+        cursor.execute(
+            """SELECT metric, timestamp, min, max, avg, count, last FROM metric_rollups
+               WHERE tier = ? AND timestamp >= ? ORDER BY timestamp""",
+            (tier.name, time.time() - tier.retention)
+        )
+        for r in cursor.fetchall():
+            rollups.restore(tier.name, r['metric'], r['timestamp'], r['min'], r['max'],
+                            r['avg'], r['count'], r['last'])
     conn.close()
 
 def get_country_centroid(country_code):
     """
-    Returns (lat, lon) for the given country_code from the country_centroids table.
-    If the country is not in the table, returns (None, None).
+    Returns (lat, lon) for the given country_code from the shared centroid index.
+    If the country is unknown, returns (None, None).
     """
-    if not country_code or country_code == "Unknown":
-        return (None, None)
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    row = cursor.execute(
-        "SELECT lat, lon FROM country_centroids WHERE country_code = ?",
-        (country_code.upper(),)
-    ).fetchone()
-    conn.close()
-    if row:
-        return (row["lat"], row["lon"])
-    return (None, None)
+    return get_centroid(country_code, (None, None))
@@ -0,0 +1,252 @@
+# simplehostmetrics/db_writer.py
+# This module implements the single SQLite writer thread used by the collector.
+# Producers enqueue statements without blocking; the writer collects them for up to
+# flush_interval seconds, groups identical SQL into one executemany() call and commits the
+# whole batch in a single transaction. The queue is bounded so lock contention cannot make
+# memory grow without limit, and pending writes are flushed on interpreter exit.
+
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+
+DROP_POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+
+class DBWriter:
+    """
+    Bounded write queue plus the thread that drains it.
+
+    Items are (sql, params) for one row, (sql, [params, ...]) for many rows, or a callable
+    that is run as func(cursor). Within a batch, statements are grouped by SQL text, so
+    writes with different SQL may be reordered relative to each other; callables are
+    ordering barriers and run after everything queued before them.
+    When the queue is full, `drop_policy` decides: drop the new item, drop the oldest
+    queued item, or block the producer (up to `block_timeout` seconds, then drop).
+    """
+
+    def __init__(self, connect, max_queue=10000, batch_size=1000, flush_interval=1.0,
+                 drop_policy='drop_newest', block_timeout=1.0):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unsupported drop policy: {drop_policy}")
+        self.connect = connect
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+        self.block_timeout = block_timeout
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stopping = False
+        self.busy = False
+        # Gauges and counters
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.last_commit_latency = 0.0
+        self.max_commit_latency = 0.0
+        self.total_commit_latency = 0.0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def execute(self, sql, params=()):
+        return self._put((sql, params))
+
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        if not rows:
+            return True
+        return self._put((sql, rows))
+
+    def submit(self, func):
+        """
+        Queue a callable that is run on the writer thread as func(cursor), inside the batch transaction.
+        """
+        return self._put(func)
+
+    def _put(self, item):
+        """
+        Enqueue an item. Returns False if it (or, with drop_oldest, an older item) was dropped.
+        """
+        with self.condition:
+            accepted = True
+            if len(self.queue) >= self.max_queue:
+                if self.drop_policy == 'block':
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self.queue) >= self.max_queue and not self.stopping:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self.condition.wait(remaining)
+                if len(self.queue) >= self.max_queue:
+                    self.dropped += 1
+                    if self.drop_policy != 'drop_oldest':
+                        return False
+                    self.queue.popleft()
+                    accepted = False
+            self.queue.append(item)
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, len(self.queue))
+            self.condition.notify_all()
+            return accepted
+
+    def _take_batch(self):
+        """
+        Wait for the first item, then keep collecting until flush_interval has passed since
+        it arrived or batch_size items are queued. Returns [] once stopped and drained.
+        """
+        with self.condition:
+            while not self.queue and not self.stopping:
+                self.condition.wait()
+            deadline = time.monotonic() + self.flush_interval
+            while len(self.queue) < self.batch_size and not self.stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+            self.busy = bool(batch)
+            # Wake producers blocked on a full queue.
+            self.condition.notify_all()
+            return batch
+
+    def _run(self):
+        conn = self.connect()
+        try:
+            while True:
+                batch = self._take_batch()
+                if not batch:
+                    break
+                self._write(conn, batch)
+                with self.condition:
+                    self.busy = False
+                    self.condition.notify_all()
+        finally:
+            conn.close()
+
+    def _write(self, conn, batch):
+        started = time.perf_counter()
+        cursor = conn.cursor()
+        written = 0
+        try:
+            conn.execute("BEGIN")
+            groups = {}
+            for item in batch:
+                if callable(item):
+                    written += self._execute_groups(cursor, groups)
+                    groups = {}
+                    try:
+                        item(cursor)
+                    except Exception as e:
+                        self.errors += 1
+                        logging.error("DB task %s failed: %s", getattr(item, '__name__', item), e)
+                    continue
+                sql, params = item
+                rows = groups.setdefault(sql, [])
+                if isinstance(params, list):
+                    rows.extend(params)
+                else:
+                    rows.append(params)
+            written += self._execute_groups(cursor, groups)
+            conn.commit()
+        except Exception as e:
+            self.errors += 1
+            logging.error("DB batch of %d items failed: %s", len(batch), e)
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            return
+        latency = time.perf_counter() - started
+        with self.condition:
+            self.written += written
+            self.batches += 1
+            self.last_commit_latency = latency
+            self.max_commit_latency = max(self.max_commit_latency, latency)
+            self.total_commit_latency += latency
+
+    def _execute_groups(self, cursor, groups):
+        written = 0
+        for sql, rows in groups.items():
+            try:
+                cursor.executemany(sql, rows)
+                written += len(rows)
+            except Exception as e:
+                self.errors += 1
+                logging.error("DB operation failed: %s; SQL: %s; Rows: %d", e, sql, len(rows))
+        return written
+
+    def flush(self, timeout=None):
+        """
+        Wait until everything queued so far has been committed. Returns False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            self.condition.notify_all()
+            while self.queue or self.busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def close(self, timeout=10.0):
+        """
+        Skip the flush delay, write everything still queued and stop the thread.
+        """
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            if self.thread.is_alive():
+                logging.warning("DB writer did not finish within %.1fs; %d items not written",
+                                timeout, len(self.queue))
+
+    def idle(self):
+        """
+        True if nothing is queued or being written.
+        """
+        with self.condition:
+            return not self.queue and not self.busy
+
+    def stats(self):
+        with self.condition:
+            return {
+                'queue_depth': len(self.queue),
+                'max_queue': self.max_queue,
+                'max_depth': self.max_depth,
+                'drop_policy': self.drop_policy,
+                'enqueued': self.enqueued,
+                'dropped': self.dropped,
+                'written': self.written,
+                'batches': self.batches,
+                'errors': self.errors,
+                'last_commit_latency': round(self.last_commit_latency, 6),
+                'max_commit_latency': round(self.max_commit_latency, 6),
+                'avg_commit_latency': round(self.total_commit_latency / self.batches, 6) if self.batches else 0.0
+            }
+
+
+def create_db_writer(connect, config):
+    """
+    Build the writer from the stats.db_writer section of config.yml.
+    """
+    try:
+        return DBWriter(connect,
+                        max_queue=int(config.get('max_queue', 10000)),
+                        batch_size=int(config.get('batch_size', 1000)),
+                        flush_interval=float(config.get('flush_interval', 1.0)),
+                        drop_policy=config.get('drop_policy', 'drop_newest'),
+                        block_timeout=float(config.get('block_timeout', 1.0)))
+    except (TypeError, ValueError) as e:
+        logging.error("Invalid stats.db_writer configuration: %s", e)
+        return DBWriter(connect)
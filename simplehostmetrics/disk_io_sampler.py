@@ -0,0 +1,78 @@
+# simplehostmetrics/disk_io_sampler.py
+# This module samples per-device disk I/O counters on the collector cadence.
+# psutil only exposes cumulative counters, so throughput, IOPS and busy time are computed
+# from the deltas between two ticks, like the network rates in stats.py.
+
+import logging
+import threading
+
+import psutil
+
+# Per-device rates recorded on every tick, in this order.
+DISK_IO_FIELDS = ('read_bytes', 'write_bytes', 'read_ops', 'write_ops', 'busy')
+
+# Pseudo devices that are never interesting on the dashboard.
+IGNORED_DEVICE_PREFIXES = ('loop', 'ram')
+
+
+class DiskIoSampler:
+    """
+    Keeps the previous disk_io_counters(perdisk=True) sample and the latest per-device rates:
+    read/write bytes per second, read/write operations per second and busy time in percent.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.previous = None
+        self.previous_time = None
+        self.rates = {}
+        self.timestamp = None
+
+    def sample(self, now):
+        """
+        Read the counters and return {device: (values in DISK_IO_FIELDS order)}.
+        The first call only establishes the baseline and returns an empty dict.
+        """
+        try:
+            current = psutil.disk_io_counters(perdisk=True) or {}
+        except Exception as e:
+            logging.debug("Disk I/O counters not available: %s", e)
+            return {}
+        current = {device: counters for device, counters in current.items()
+                   if not device.startswith(IGNORED_DEVICE_PREFIXES)}
+
+        rates = {}
+        if self.previous is not None:
+            dt = now - self.previous_time
+            if dt > 0:
+                for device, counters in current.items():
+                    previous = self.previous.get(device)
+                    if previous is None:
+                        continue
+                    # busy_time (ms) is only reported on Linux and FreeBSD.
+                    busy_ms = getattr(counters, 'busy_time', 0) - getattr(previous, 'busy_time', 0)
+                    rates[device] = (
+                        max(0, counters.read_bytes - previous.read_bytes) / dt,
+                        max(0, counters.write_bytes - previous.write_bytes) / dt,
+                        max(0, counters.read_count - previous.read_count) / dt,
+                        max(0, counters.write_count - previous.write_count) / dt,
+                        min(100.0, max(0.0, busy_ms / (dt * 10)))
+                    )
+
+        with self.lock:
+            self.previous = current
+            self.previous_time = now
+            self.rates = rates
+            self.timestamp = now
+        return rates
+
+    def snapshot(self):
+        """
+        Return the latest rates as {'timestamp': ..., 'devices': {device: {field: value}}}.
+        """
+        with self.lock:
+            return {
+                'timestamp': self.timestamp,
+                'devices': {device: {field: round(value, 2) for field, value in zip(DISK_IO_FIELDS, values)}
+                            for device, values in self.rates.items()}
+            }
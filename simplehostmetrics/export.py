@@ -0,0 +1,190 @@
+# simplehostmetrics/export.py
+# This module streams persisted metric history out of the database for offline analysis.
+# A raw sample series (metric_chunks) or a rollup tier (metric_rollups) is read for a time range
+# in batches of `fetch_size` rows on its own read-only connection and encoded batch by batch as
+# CSV, NDJSON or Parquet (if pyarrow is installed), so memory use does not depend on the length
+# of the range. The reader never takes the write lock, so exports do not block the collector.
+
+import csv
+import io
+import json
+
+from chunk_store import read_chunks
+from database import get_db_connection
+from timeseries import _float32_list
+
+EXPORT_FORMATS = ('csv', 'ndjson', 'parquet')
+EXPORT_SOURCES = ('raw', 'rollup')
+FETCH_SIZE = 5000
+
+MIME_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# Column types for Parquet; every other column is a float.
+COLUMN_TYPES = {'metric': 'string', 'count': 'int64'}
+
+ROLLUP_COLUMNS = ('timestamp', 'metric', 'min', 'max', 'avg', 'count', 'last')
+
+
+def rollup_batches(cursor, tier, start, end, metric=None, fetch_size=FETCH_SIZE):
+    """
+    Yield (columns, rows) batches of a rollup tier's buckets in [start, end), oldest first.
+    `metric` is an optional GLOB pattern, e.g. 'net.eth0.*'.
+    """
+    sql = f"SELECT {', '.join(ROLLUP_COLUMNS)} FROM metric_rollups WHERE tier = ? AND timestamp >= ? AND timestamp < ?"
+    params = [tier, start, end]
+    if metric:
+        sql += " AND metric GLOB ?"
+        params.append(metric)
+    cursor.execute(sql + " ORDER BY timestamp", params)
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        yield ROLLUP_COLUMNS, [tuple(row) for row in rows]
+
+
+def raw_batches(cursor, series, start, end, fetch_size=FETCH_SIZE):
+    """
+    Yield (columns, rows) batches of a raw sample series in [start, end), oldest first.
+    Chunks are read one at a time; the columns follow the field layout of the first chunk
+    and chunks with another layout (e.g. after a core count change) are skipped.
+    """
+    columns = None
+    rows = []
+    for chunk in read_chunks(cursor, series, start, end):
+        if columns is None:
+            columns = ('timestamp',) + chunk.fields
+        elif chunk.fields != columns[1:]:
+            continue
+        values = [_float32_list(chunk.column(field)) for field in chunk.fields]
+        for i, timestamp in enumerate(chunk.timestamps()):
+            if start <= timestamp < end:
+                rows.append((timestamp,) + tuple(column[i] for column in values))
+        if len(rows) >= fetch_size:
+            yield columns, rows
+            rows = []
+    if rows:
+        yield columns, rows
+
+
+def encode_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header = False
+    for columns, rows in batches:
+        if not header:
+            writer.writerow(columns)
+            header = True
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def encode_ndjson(batches):
+    for columns, rows in batches:
+        yield ''.join(json.dumps(dict(zip(columns, row)), separators=(',', ':')) + '\n'
+                      for row in rows).encode('utf-8')
+
+
+class StreamSink:
+    """
+    Write-only file object that collects the bytes written by the Parquet writer until
+    they are taken with drain().
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def encode_parquet(batches):
+    """
+    Write each batch as one Parquet row group and yield the bytes as they are produced.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = StreamSink()
+    writer = None
+    try:
+        for columns, rows in batches:
+            if writer is None:
+                schema = pa.schema([(column, COLUMN_TYPES.get(column, 'float64')) for column in columns])
+                writer = pq.ParquetWriter(sink, schema)
+            arrays = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(arrays, schema)], schema=schema))
+            yield sink.drain()
+    finally:
+        if writer is not None:
+            writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {'csv': encode_csv, 'ndjson': encode_ndjson, 'parquet': encode_parquet}
+
+
+def export_history(source, name, fmt, start, end, metric=None, tiers=None, fetch_size=FETCH_SIZE):
+    """
+    Return a generator of encoded byte chunks for a raw series (`source='raw'`, `name` is the
+    series, e.g. 'cpu' or 'network.eth0') or a rollup tier (`source='rollup'`, `name` is the
+    tier, `metric` an optional GLOB filter). Invalid requests raise ValueError up front,
+    before anything is streamed.
+    """
+    if source not in EXPORT_SOURCES:
+        raise ValueError(f"Unsupported export source: {source}")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if not name:
+        raise ValueError("Missing series" if source == 'raw' else "Missing tier")
+    if source == 'rollup' and tiers is not None and name not in tiers:
+        raise ValueError(f"Unknown rollup tier: {name}")
+    if start >= end:
+        raise ValueError("from must be before to")
+    if fmt == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet export requires the pyarrow package")
+
+    def generate():
+        conn = get_db_connection(read_only=True)
+        try:
+            cursor = conn.cursor()
+            if source == 'raw':
+                batches = raw_batches(cursor, name, start, end, fetch_size)
+            else:
+                batches = rollup_batches(cursor, name, start, end, metric, fetch_size)
+            for data in ENCODERS[fmt](batches):
+                if data:
+                    yield data
+        finally:
+            conn.close()
+
+    return generate()
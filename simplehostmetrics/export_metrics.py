@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# simplehostmetrics/export_metrics.py
+# Command line export of the persisted metric history (see export.py), e.g.
+#   python export_metrics.py raw cpu --from 2024-01-01 --format csv -o cpu.csv
+#   python export_metrics.py rollup 1h --metric 'net.*' --format ndjson | gzip > net.ndjson.gz
+# Run it from the application directory so config.yml and the metrics database are found.
+
+import argparse
+import datetime
+import sys
+import time
+
+import yaml
+
+from export import EXPORT_FORMATS, EXPORT_SOURCES, export_history
+from rollup import load_tier_spec
+
+
+def parse_time(value):
+    """
+    Accept UNIX timestamps and ISO 8601 dates / date-times (local time).
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export metric history as CSV, NDJSON or Parquet.")
+    parser.add_argument('source', choices=EXPORT_SOURCES, help="raw sample series or rollup tier")
+    parser.add_argument('name', help="series (e.g. cpu, network.eth0) or tier (e.g. 1m, 1h)")
+    parser.add_argument('--metric', help="GLOB filter on rollup metrics, e.g. 'cpu.*'")
+    parser.add_argument('--from', dest='start', type=parse_time, default=0.0,
+                        help="start (UNIX timestamp or ISO date, default: oldest data)")
+    parser.add_argument('--to', dest='end', type=parse_time, default=None,
+                        help="end (UNIX timestamp or ISO date, default: now)")
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument('-o', '--output', help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    with open('config.yml', 'r') as f:
+        stats_config = (yaml.safe_load(f) or {}).get('stats', {}) or {}
+    tiers = [str(spec['name']) for spec in load_tier_spec(stats_config)]
+    end = time.time() if args.end is None else args.end
+    try:
+        chunks = export_history(args.source, args.name, args.format, args.start, end, args.metric, tiers)
+    except ValueError as e:
+        parser.error(str(e))
+
+    output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for data in chunks:
+            output.write(data)
+    finally:
+        if args.output:
+            output.close()
+        else:
+            output.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+# simplehostmetrics/history_query.py
+# This module answers historical range queries for a single metric.
+# It picks the finest persisted source (raw sample chunks or a rollup tier) that covers the
+# requested range and downsamples it into min/max/avg buckets, so a 7-day chart comes back as
+# ~max_points points. Rollup rows are bucketed inside SQLite (GROUP BY); raw chunks are read
+# one row at a time, bucket bounds are bisected on the chunk's uint32 offsets, and each bucket's
+# min/max/sum is taken over a slice of its float32 column, so the per-sample work happens in C
+# rather than in a Python loop.
+
+import math
+import time
+from itertools import chain
+
+from chunk_store import read_chunks
+from database import get_read_connection
+
+# Raw sample series: metric -> (series, field).
+# memory.used is not listed: the raw 'memory' series stores used memory without the page cache,
+# while the 'memory.used' rollup metric is total used memory, so it is served from the tiers only.
+RAW_SOURCES = {
+    'cpu.usage': ('cpu', 'usage'),
+    'memory.free': ('memory', 'free'),
+    'memory.cached': ('memory', 'cached'),
+    'disk.total': ('disk', 'total'),
+    'disk.used': ('disk', 'used'),
+    'disk.free': ('disk', 'free'),
+}
+
+# A source is only used if it returns at most this many rows per requested point,
+# or at most MIN_ROW_BUDGET rows in total (cheap enough for any request).
+MAX_ROWS_PER_POINT = 20
+MIN_ROW_BUDGET = 7200
+
+DEFAULT_MAX_POINTS = 1000
+MAX_MAX_POINTS = 10000
+
+
+def raw_source(metric):
+    """
+    Return (series, field) of a metric's raw samples, or None.
+    Besides RAW_SOURCES this covers net.<iface>.input|output, cpu.core.<n>
+    and disk_io.<device>.<field>.
+    """
+    if metric in RAW_SOURCES:
+        return RAW_SOURCES[metric]
+    family, _, rest = metric.partition('.')
+    key, _, field = rest.rpartition('.')
+    if family == 'net' and key and field in ('input', 'output'):
+        return f'network.{key}', field
+    if family == 'disk_io' and key and field:
+        return f'disk_io.{key}', field
+    if family == 'cpu' and key == 'core' and field.isdigit():
+        return 'cpu_cores', field
+    return None
+
+
+def oldest_raw_timestamp(cursor, series):
+    """
+    Start of the oldest stored chunk of a series (an index lookup).
+    """
+    row = cursor.execute("SELECT MIN(timestamp) FROM metric_chunks WHERE series = ?", (series,)).fetchone()
+    return row[0] if row else None
+
+
+def has_rollups_before(cursor, metric, tier, timestamp):
+    row = cursor.execute(
+        "SELECT 1 FROM metric_rollups WHERE metric = ? AND tier = ? AND timestamp < ? LIMIT 1",
+        (metric, tier.name, timestamp)
+    ).fetchone()
+    return row is not None
+
+
+def choose_source(cursor, metric, start, end, max_points, rollups, raw_interval):
+    """
+    Return ('raw', resolution) or ('tier', RollupTier) for the finest source covering
+    [start, end) without scanning more rows than the budget allows.
+    """
+    span = end - start
+    budget = max(max_points * MAX_ROWS_PER_POINT, MIN_ROW_BUDGET)
+    now = time.time()
+    source = raw_source(metric)
+    raw_oldest = None
+    if source is not None and raw_interval and span / raw_interval <= budget:
+        raw_oldest = oldest_raw_timestamp(cursor, source[0])
+        if raw_oldest is not None and raw_oldest <= start:
+            return 'raw', raw_interval
+    tier = next((tier for tier in rollups.tiers
+                 if span / tier.interval <= budget and now - tier.retention <= start),
+                # Nothing covers the whole range: use the coarsest tier (longest retention).
+                rollups.tiers[-1])
+    # Raw history only starts partway into the range; it is still the better source
+    # unless the tier actually holds older data (e.g. right after a fresh start).
+    if source is not None and raw_interval and span / raw_interval <= budget and \
+            not has_rollups_before(cursor, metric, tier, raw_oldest if raw_oldest is not None else end):
+        return 'raw', raw_interval
+    return 'tier', tier
+
+
+def _float32(value):
+    return float(format(value, '.7g'))
+
+
+def bucket_raw(chunks, field, start, end, width):
+    """
+    Fold the samples of `field` in [start, end) into buckets of `width` seconds.
+    `chunks` may be any iterable (it is consumed once). Samples within a chunk are in time
+    order, so each bucket is a contiguous slice of the chunk's column; its bounds are found
+    by bisecting the chunk's millisecond offsets, without a float timestamp per sample.
+    Returns [(bucket, min, max, avg, count)] ordered by bucket.
+    """
+    buckets = {}
+    for chunk in chunks:
+        if field not in chunk.fields:
+            continue
+        values = chunk.column(field)
+        i = chunk.index(start)
+        stop = chunk.index(end, i)
+        while i < stop:
+            index = int((chunk.timestamp(i) - start) // width)
+            j = max(i + 1, chunk.index(start + (index + 1) * width, i, stop))
+            window = values[i:j]
+            low, high, total = min(window), max(window), sum(window)
+            bucket = buckets.get(index)
+            if bucket is None:
+                buckets[index] = [low, high, total, j - i]
+            else:
+                bucket[0] = min(bucket[0], low)
+                bucket[1] = max(bucket[1], high)
+                bucket[2] += total
+                bucket[3] += j - i
+            i = j
+    # Samples are float32; report them without the noise of the widening to float64.
+    return [(index, _float32(low), _float32(high), _float32(total / count), count)
+            for index, (low, high, total, count) in sorted(buckets.items())]
+
+
+def query_range(metric, start, end, max_points, rollups, raw_interval=None, pending=None):
+    """
+    Return downsampled history of `metric` between start and end (UNIX seconds) as
+    {'metric', 'source', 'resolution', 'bucket', 'timestamp', 'min', 'max', 'avg', 'count'}.
+    Each output point aggregates one bucket of width `bucket` seconds.
+    `pending(series)` may return the not yet written chunk of a series, which is included.
+    """
+    cursor = get_read_connection().cursor()
+    try:
+        kind, source = choose_source(cursor, metric, start, end, max_points, rollups, raw_interval)
+        resolution = source if kind == 'raw' else source.interval
+        width = max(resolution, math.ceil((end - start) / max_points))
+        if kind == 'raw':
+            series, field = raw_source(metric)
+            chunks = read_chunks(cursor, series, start, end)
+            open_chunk = pending(series) if pending is not None else None
+            if open_chunk is not None:
+                chunks = chain(chunks, [open_chunk])
+            rows = bucket_raw(chunks, field, start, end, width)
+            source_name = f"raw:{series}"
+        else:
+            rows = cursor.execute("""
+                SELECT CAST((timestamp - ?) / ? AS INTEGER) AS bucket,
+                       MIN(min), MAX(max), SUM(avg * count) / SUM(count), SUM(count)
+                FROM metric_rollups
+                WHERE metric = ? AND tier = ? AND timestamp >= ? AND timestamp < ?
+                GROUP BY bucket ORDER BY bucket
+            """, (start, width, metric, source.name, start, end)).fetchall()
+            source_name = f"rollup:{source.name}"
+    finally:
+        cursor.close()
+
+    return {
+        'metric': metric,
+        'source': source_name,
+        'resolution': resolution,
+        'bucket': width,
+        'from': start,
+        'to': end,
+        'timestamp': [start + row[0] * width for row in rows],
+        'min': [row[1] for row in rows],
+        'max': [row[2] for row in rows],
+        'avg': [row[3] for row in rows],
+        'count': [row[4] for row in rows]
+    }
@@ -0,0 +1,269 @@
+# simplehostmetrics/log_backfill.py
+# This module imports the history kept in rotated proxy log archives (access.log.1,
+# access.log.2.gz, ...) into the RTAD event store, e.g. after a fresh install.
+# Every archive is parsed as one task in a process pool, so the lines of a file stay in file
+# order and the work spreads across cores. The pool uses the forkserver start method: the web
+# process runs threads, and forking it could copy a lock held by one of them into a worker.
+# Workers therefore import this module, which only pulls in the side-effect-free line parser
+# (log_parsing), instead of inheriting the web process. Workers write their events to
+# temporary files; the per-file streams are then merged by timestamp (heapq.merge) and stored
+# oldest first. Archives are recorded in the log offset table once imported and skipped by
+# later runs.
+
+import gzip
+import heapq
+import logging
+import multiprocessing
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from operator import itemgetter
+
+from log_offsets import identify, is_same_file
+from log_parsing import parse_http_error_line, parse_log_timestamp
+from log_tailer import read_line_batches
+
+# access.log.1, access.log.2.gz, ... -> rotation number
+ARCHIVE_PATTERN = re.compile(r"\.(\d+)(\.gz)?$")
+
+EVENT_BATCH_SIZE = 10000  # Events per pickled record in a worker's result file
+MAX_ERRORS = 20           # Error messages kept in the progress report
+
+
+def archive_number(path):
+    match = ARCHIVE_PATTERN.search(path)
+    return int(match.group(1)) if match else 0
+
+
+def discover_archives(path):
+    """
+    Return the rotated archives of a configured log path, oldest first. For a file these are
+    path.N and path.N.gz, for a directory every rotated file in it.
+    """
+    if os.path.isdir(path):
+        candidates = [os.path.join(path, name) for name in os.listdir(path) if ARCHIVE_PATTERN.search(name)]
+    else:
+        directory = os.path.dirname(path) or '.'
+        base = os.path.basename(path)
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return []
+        candidates = [os.path.join(directory, name) for name in names
+                      if name.startswith(base) and ARCHIVE_PATTERN.fullmatch(name[len(base):])]
+    archives = [candidate for candidate in candidates if os.path.isfile(candidate)]
+    # Higher rotation numbers are older; within a number, by name.
+    return sorted(archives, key=lambda archive: (-archive_number(archive), archive))
+
+
+def open_archive(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def parse_archive(path, proxy_type, parse_all, output_path):
+    """
+    Process pool task: parse one archive and write its events, in file order, as pickled
+    lists of (timestamp, proxy_type, error_code, url, ip_address, domain) to output_path.
+    Lines without a readable timestamp get the time of the previous event (the file's mtime
+    before the first one). Return (lines, events).
+    """
+    last_timestamp = os.path.getmtime(path)
+    lines_read = events = 0
+    batch = []
+    with open_archive(path) as f, open(output_path, 'wb') as output:
+        for lines, _ in read_line_batches(f, final=True):
+            lines_read += len(lines)
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
+                parsed = parse_http_error_line(line, proxy_type)
+                if parsed is None:
+                    continue
+                ip_address, url, error_code, domain, timestamp = parsed
+                if not parse_all and error_code < 400:
+                    continue
+                timestamp = parse_log_timestamp(timestamp)
+                if timestamp is None:
+                    timestamp = last_timestamp
+                last_timestamp = timestamp
+                batch.append((timestamp, proxy_type, error_code, url, ip_address, domain))
+            if len(batch) >= EVENT_BATCH_SIZE:
+                pickle.dump(batch, output, pickle.HIGHEST_PROTOCOL)
+                events += len(batch)
+                batch = []
+        if batch:
+            pickle.dump(batch, output, pickle.HIGHEST_PROTOCOL)
+            events += len(batch)
+    return lines_read, events
+
+
+def read_events(path):
+    """
+    Yield the events of a result file written by parse_archive.
+    """
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                batch = pickle.load(f)
+            except EOFError:
+                return
+            yield from batch
+
+
+class LogBackfill:
+    """
+    One backfill at a time, run in a background thread; progress() reports its state.
+    `store(proxy_type, error_code, url, ip_address, domain, timestamp)` receives the events in
+    timestamp order, `finish()` (optional) is called once all events of a run have been stored,
+    and `tracker` (a FileOffsetTracker) remembers the imported archives.
+    """
+
+    def __init__(self, store, tracker=None, workers=None, finish=None):
+        self.store = store
+        self.finish = finish
+        self.tracker = tracker
+        self.workers = workers or os.cpu_count() or 1
+        self.lock = threading.Lock()
+        self.thread = None
+        self.state = {'status': 'idle'}
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, log_configs, parse_all=False):
+        """
+        Start a backfill of the archives of the given log configurations ({path, proxy_type}).
+        Return False if one is already running.
+        """
+        with self.lock:
+            if self.running():
+                return False
+            self.state = {'status': 'running', 'phase': 'discovering', 'started': time.time()}
+            self.thread = threading.Thread(target=self.run, args=(log_configs, parse_all), daemon=True)
+            self.thread.start()
+        return True
+
+    def update(self, **values):
+        with self.lock:
+            self.state.update(values)
+
+    def add_error(self, message):
+        logging.error("Log backfill: %s", message)
+        with self.lock:
+            errors = self.state.setdefault('errors', [])
+            if len(errors) < MAX_ERRORS:
+                errors.append(message)
+
+    def progress(self):
+        """
+        Return a copy of the current state, with the share of the work done in `percent`.
+        """
+        with self.lock:
+            state = dict(self.state)
+        if state.get('bytes_total'):
+            parsed = state.get('bytes_done', 0) / state['bytes_total']
+            stored = state.get('stored', 0) / state['events'] if state.get('events') else 1.0
+            state['percent'] = round(100 * (0.5 * parsed + 0.5 * stored), 1)
+        return state
+
+    def pending_archives(self, log_configs):
+        """
+        Return [(path, proxy_type, size)] of the archives not imported yet.
+        """
+        if self.tracker is not None:
+            # Rotated logs finished by the live reader, possibly in the ingestion process,
+            # are recorded there; pick them up so they are not imported twice.
+            self.tracker.reload()
+        pending = []
+        for log_config in log_configs:
+            path = log_config.get('path')
+            if not path:
+                continue
+            for archive in discover_archives(path):
+                try:
+                    with open(archive, 'rb') as f:
+                        stat = os.fstat(f.fileno())
+                        state = self.tracker.get(archive) if self.tracker else None
+                        if is_same_file(f, stat, state) and state.offset >= stat.st_size:
+                            continue
+                except OSError as e:
+                    self.add_error(f"{archive}: {e}")
+                    continue
+                pending.append((archive, log_config.get('proxy_type'), stat.st_size))
+        return pending
+
+    def mark_imported(self, archive):
+        if self.tracker is None:
+            return
+        try:
+            with open(archive, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                self.tracker.update(archive, identify(f, stat, stat.st_size))
+        except OSError as e:
+            self.add_error(f"{archive}: {e}")
+
+    def run(self, log_configs, parse_all):
+        try:
+            self.backfill(log_configs, parse_all)
+            self.update(status='finished', phase='done')
+        except Exception as e:
+            logging.exception("Log backfill failed")
+            self.update(status='failed', error=str(e))
+        finally:
+            self.update(finished=time.time())
+
+    def backfill(self, log_configs, parse_all):
+        archives = self.pending_archives(log_configs)
+        self.update(phase='parsing', files_total=len(archives), files_done=0,
+                    bytes_total=sum(size for _, _, size in archives), bytes_done=0,
+                    lines=0, events=0, stored=0, workers=self.workers)
+        if not archives:
+            return
+        temp_dir = tempfile.mkdtemp(prefix='rtad-backfill-')
+        try:
+            results = {}
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(archives)),
+                                     mp_context=multiprocessing.get_context('forkserver')) as executor:
+                # Largest archives first, so one big file does not finish last on its own.
+                futures = {}
+                for index, (archive, proxy_type, size) in enumerate(sorted(archives, key=itemgetter(2), reverse=True)):
+                    output_path = os.path.join(temp_dir, f"{index}.events")
+                    future = executor.submit(parse_archive, archive, proxy_type, parse_all, output_path)
+                    futures[future] = (archive, size, output_path)
+                for future in as_completed(futures):
+                    archive, size, output_path = futures[future]
+                    try:
+                        lines, events = future.result()
+                        results[archive] = output_path
+                    except Exception as e:
+                        self.add_error(f"{archive}: {e}")
+                        lines = events = 0
+                    with self.lock:
+                        self.state['files_done'] += 1
+                        self.state['bytes_done'] += size
+                        self.state['lines'] += lines
+                        self.state['events'] += events
+
+            self.update(phase='storing')
+            streams = [read_events(output_path) for output_path in results.values()]
+            stored = 0
+            for timestamp, proxy_type, error_code, url, ip_address, domain in heapq.merge(*streams, key=itemgetter(0)):
+                self.store(proxy_type, error_code, url, ip_address, domain, timestamp)
+                stored += 1
+                if stored % EVENT_BATCH_SIZE == 0:
+                    self.update(stored=stored)
+            self.update(stored=stored)
+            if self.finish is not None:
+                self.finish()
+            for archive in results:
+                self.mark_imported(archive)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
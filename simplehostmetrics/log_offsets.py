@@ -0,0 +1,248 @@
+# simplehostmetrics/log_offsets.py
+# This module remembers how far every RTAD log file has been read, across restarts.
+# A position is stored per configured path together with the identity of the file it belongs
+# to: device and inode, plus a fingerprint (SHA-1) of the file's first bytes that tells a reused
+# inode apart from the original file. When a log is rotated by renaming (access.log ->
+# access.log.1, or a dateext name such as access.log-20240101), the old identity is found again
+# under the rotated name, so the reader can finish the old file's tail before it starts on the
+# new one. A rotation that compresses right away (access.log.1.gz without delaycompress) gives
+# the file a new inode and is not found; its lines are only picked up by the archive backfill.
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+
+FINGERPRINT_SIZE = 1024
+# Names a rotated log is looked for under, relative to the original path: the numbered name
+# first, then any uncompressed name with a rotation number or date appended (dateext).
+ROTATED_SUFFIXES = ('.1',)
+ROTATED_NAME_PATTERN = re.compile(r"[-._]\d[\d_-]*")
+# Seconds changed positions are collected before they are written to the database.
+# 0 writes each position as soon as it is stored, i.e. once per parsed batch.
+CHECKPOINT_INTERVAL = 0
+
+LogOffset = namedtuple('LogOffset', ['device', 'inode', 'fingerprint', 'fingerprint_size', 'offset'])
+
+
+def fingerprint(f, size=FINGERPRINT_SIZE):
+    """
+    Return (SHA-1 hex digest, length) of the first `size` bytes of an open binary file.
+    Files shorter than `size` are fingerprinted over what they have so far.
+    """
+    f.seek(0)
+    head = f.read(size)
+    return hashlib.sha1(head).hexdigest(), len(head)
+
+
+def is_same_file(f, stat, state):
+    """
+    True if the open file `f` (with os.fstat result `stat`) is the file `state` was recorded for.
+    """
+    if state is None or (stat.st_dev, stat.st_ino) != (state.device, state.inode):
+        return False
+    return fingerprint(f, state.fingerprint_size) == (state.fingerprint, state.fingerprint_size)
+
+
+def start_offset(f, stat, state):
+    """
+    Return where reading `f` has to resume: the stored offset if it is the same file and
+    was not truncated, 0 otherwise.
+    """
+    if is_same_file(f, stat, state) and stat.st_size >= state.offset:
+        return state.offset
+    return 0
+
+
+def identify(f, stat, offset):
+    """
+    Return the LogOffset of the open file `f` at `offset`.
+    """
+    digest, size = fingerprint(f)
+    return LogOffset(stat.st_dev, stat.st_ino, digest, size, offset)
+
+
+def rotated_candidates(path):
+    """
+    Return the names a rotated `path` may have, most likely first.
+    """
+    candidates = [path + suffix for suffix in ROTATED_SUFFIXES]
+    directory = os.path.dirname(path) or '.'
+    base = os.path.basename(path)
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return candidates
+    dated = [os.path.join(directory, name) for name in names
+             if name.startswith(base) and ROTATED_NAME_PATTERN.fullmatch(name[len(base):])]
+    dated = [candidate for candidate in dated if candidate not in candidates]
+
+    def mtime(candidate):
+        try:
+            return os.path.getmtime(candidate)
+        except OSError:
+            return 0
+
+    return candidates + sorted(dated, key=mtime, reverse=True)
+
+
+def find_rotated(path, state):
+    """
+    Return the name the file recorded in `state` was rotated to, or None.
+    """
+    for candidate in rotated_candidates(path):
+        try:
+            with open(candidate, 'rb') as f:
+                if is_same_file(f, os.fstat(f.fileno()), state):
+                    return candidate
+        except OSError:
+            continue
+    return None
+
+
+class FileOffsetTracker:
+    """
+    Read positions per log path, kept in memory and checkpointed to the log_offsets table
+    through one connection from `connect()` (opened on first use). Without `connect`
+    positions are only kept in memory.
+    With `checkpoint_interval` 0 (the default) every update is written right away, in the
+    same step that hands the batch's events on, so a crash re-reads at most one batch.
+    A positive interval coalesces checkpoints instead: changed paths are written together,
+    in one transaction, at most every `checkpoint_interval` seconds (and by flush(), e.g. at
+    exit), so reading a log never waits for a commit, and after a crash up to that many
+    seconds of lines are read again.
+    """
+
+    def __init__(self, connect=None, checkpoint_interval=CHECKPOINT_INTERVAL):
+        self.connect = connect
+        self.checkpoint_interval = checkpoint_interval
+        self.conn = None
+        self.offsets = None
+        self.dirty = {}  # path -> LogOffset, or None for a reset, not written yet
+        self.timer = None
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+
+    def _load(self):
+        self.offsets = {}
+        if self.connect is None:
+            return
+        try:
+            self.conn = self.connect()
+            for row in self.conn.execute(
+                    "SELECT path, device, inode, fingerprint, fingerprint_size, offset FROM log_offsets"):
+                self.offsets[row[0]] = LogOffset(*row[1:])
+        except Exception as e:
+            logging.error("Failed to load log offsets: %s", e)
+
+    def reload(self):
+        """
+        Re-read the stored positions, e.g. those written by another process (the RTAD
+        ingestion process). Positions this tracker has not checkpointed yet are kept.
+        """
+        with self.write_lock, self.lock:
+            if self.offsets is None:
+                self._load()
+                return
+            if self.conn is None:
+                return
+            try:
+                offsets = {row[0]: LogOffset(*row[1:]) for row in self.conn.execute(
+                    "SELECT path, device, inode, fingerprint, fingerprint_size, offset FROM log_offsets")}
+            except Exception as e:
+                logging.error("Failed to reload log offsets: %s", e)
+                return
+            for path, state in self.dirty.items():
+                if state is None:
+                    offsets.pop(path, None)
+                else:
+                    offsets[path] = state
+            self.offsets = offsets
+
+    def get(self, path):
+        """
+        Return the stored LogOffset for a path, or None.
+        """
+        with self.lock:
+            if self.offsets is None:
+                self._load()
+            return self.offsets.get(path)
+
+    def update(self, path, state):
+        """
+        Store a new position for a path; it is checkpointed with the next flush if it changed.
+        """
+        with self.lock:
+            if self.offsets is None:
+                self._load()
+            if self.offsets.get(path) == state:
+                return
+            self.offsets[path] = state
+            self.dirty[path] = state
+            flush_now = self._schedule()
+        if flush_now:
+            self.flush()
+
+    def reset(self, path):
+        """
+        Forget the position of a path.
+        """
+        with self.lock:
+            if self.offsets is None:
+                self._load()
+            if self.offsets.pop(path, None) is None:
+                return
+            self.dirty[path] = None
+            flush_now = self._schedule()
+        if flush_now:
+            self.flush()
+
+    def _schedule(self):
+        """
+        Arrange for the pending checkpoints to be written (called with the lock held).
+        Returns True if they have to be written right away.
+        """
+        if self.conn is None:
+            self.dirty.clear()
+            return False
+        if self.checkpoint_interval <= 0:
+            return True
+        if self.timer is None:
+            self.timer = threading.Timer(self.checkpoint_interval, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+        return False
+
+    def flush(self):
+        """
+        Write all pending checkpoints in one transaction.
+        """
+        with self.write_lock:
+            with self.lock:
+                dirty, self.dirty = self.dirty, {}
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+            if not dirty or self.conn is None:
+                return
+            now = time.time()
+            try:
+                with self.conn:
+                    self.conn.executemany(
+                        """INSERT OR REPLACE INTO log_offsets
+                           (path, device, inode, fingerprint, fingerprint_size, offset, updated)
+                           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                        [(path,) + tuple(state) + (now,) for path, state in dirty.items() if state is not None]
+                    )
+                    self.conn.executemany("DELETE FROM log_offsets WHERE path = ?",
+                                          [(path,) for path, state in dirty.items() if state is None])
+            except Exception as e:
+                logging.error("Failed to store %d log offsets: %s", len(dirty), e)
+                with self.lock:
+                    # Retry with the next flush, unless a newer position came in meanwhile.
+                    for path, state in dirty.items():
+                        self.dirty.setdefault(path, state)
+                    self._schedule()
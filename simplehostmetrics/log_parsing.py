@@ -0,0 +1,60 @@
+# simplehostmetrics/log_parsing.py
+# This module parses single proxy log lines (npm, zoraxy) into HTTP error events.
+# It only depends on the standard library and has no import-time side effects, so both the
+# live RTAD reader (rtad_manager) and the backfill's pool workers (log_backfill) can use it
+# without loading the configuration, the GeoIP database or the offset store.
+
+import re
+from datetime import datetime
+
+# Precompiled regex for proxy events for different log formats.
+# Regex for 'zoraxy' proxy logs
+REGEX_ZORAXY = re.compile(
+    r"\[(?P<timestamp>[^\]]+)\]\s+\[[^\]]+\]\s+\[origin:(?P<origin>[^\]]*)\]\s+\[client\s+(?P<ip>\d+\.\d+\.\d+\.\d+)\]\s+(?P<method>[A-Z]+)\s+(?P<url>\S+)\s+(?P<code>\d{3})"
+)
+# Regex for 'npm' proxy logs
+REGEX_NPM = re.compile(
+    r'^\[(?P<timestamp>[^\]]+)\]\s+(?P<code>\d{3})\s+-\s+(?P<method>[A-Z]+|-)\s+(?P<protocol>\S+)\s+(?P<host>\S+)\s+"(?P<url>[^"]+)"\s+\[Client\s+(?P<ip>\d{1,3}(?:\.\d{1,3}){3})\]'
+)
+
+# Timestamp formats of the supported proxy logs (npm, zoraxy).
+LOG_TIMESTAMP_FORMATS = (
+    '%d/%b/%Y:%H:%M:%S %z',
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y/%m/%d %H:%M:%S',
+)
+
+
+def parse_http_error_line(line, proxy_type):
+    """
+    Parse one proxy log line with the regex of its proxy type.
+    Return (ip_address, url, error_code, domain, timestamp string) or None if it does not match.
+    """
+    if proxy_type == "zoraxy":
+        match = REGEX_ZORAXY.search(line)
+        if not match:
+            return None
+        domain = match.group("origin")
+    else:
+        match = REGEX_NPM.search(line)
+        if not match:
+            return None
+        domain = match.group("host")
+    return match.group("ip"), match.group("url"), int(match.group("code")), domain, match.group("timestamp")
+
+
+def parse_log_timestamp(value):
+    """
+    Return the UNIX timestamp of a proxy log timestamp string, or None if it is not in one
+    of LOG_TIMESTAMP_FORMATS. Times without a zone are taken as local time.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    for fmt in LOG_TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            continue
+    return None
@@ -0,0 +1,55 @@
+# simplehostmetrics/log_tailer.py
+# This module reads appended log lines in constant memory for the RTAD parsers.
+# The file is read in large binary chunks, each chunk is decoded and split once, and the
+# complete lines are handed out in batches together with the byte offset just after the
+# batch. An incomplete trailing line is carried over into the next read, or left in the file
+# for the next call if it is still being written, so a line is never parsed in two halves.
+# Files that are no longer written (rotated logs, archives) are read with final=True, which
+# hands out a last line without a line ending at EOF instead of leaving it behind.
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024          # Bytes per read()
+DEFAULT_MAX_BATCH_BYTES = 8 * 1024 * 1024  # Upper bound of the raw bytes held in one batch
+
+
+def read_line_batches(f, offset=0, chunk_size=DEFAULT_CHUNK_SIZE, max_batch_bytes=DEFAULT_MAX_BATCH_BYTES,
+                      encoding='utf-8', final=False):
+    """
+    Yield (lines, end_offset) batches of the complete lines of the binary file object `f`
+    starting at byte `offset`. Lines are decoded str without the line ending; end_offset is
+    where the next read has to start. At most about max_batch_bytes of the file are held at
+    once; a single line longer than that is handed out in pieces. With `final` the file is
+    complete, and text after the last line ending is handed out as a line too.
+    """
+    chunk_size = max(1, min(chunk_size, max_batch_bytes))
+    f.seek(offset)
+    pending = b''     # Incomplete last line of the previous read
+    lines = []
+    batch_bytes = 0
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        data = pending + chunk if pending else chunk
+        end = data.rfind(b'\n') + 1
+        if end == 0 and len(data) < max_batch_bytes:
+            pending = data
+            continue
+        if end == 0:
+            # Overlong line: emit what we have instead of growing without limit.
+            end = len(data)
+        pending = data[end:]
+        parts = data[:end].decode(encoding, errors='replace').split('\n')
+        if not parts[-1]:
+            parts.pop()
+        lines.extend(parts)
+        batch_bytes += end
+        offset += end
+        if batch_bytes >= max_batch_bytes:
+            yield lines, offset
+            lines = []
+            batch_bytes = 0
+    if final and pending:
+        lines.append(pending.decode(encoding, errors='replace'))
+        offset += len(pending)
+    if lines:
+        yield lines, offset
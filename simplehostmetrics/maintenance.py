@@ -0,0 +1,184 @@
+# simplehostmetrics/maintenance.py
+# This module keeps the metrics database compact and its query planner statistics fresh.
+# The database runs with auto_vacuum=INCREMENTAL, so pages freed by the retention sweeps go to
+# the freelist and are handed back to the file system a few at a time. Every maintenance step is
+# a small DB writer task (an incremental_vacuum of at most `vacuum_pages` pages, or an ANALYZE
+# of one table with a bounded analysis_limit) that is only queued while the writer is idle,
+# so maintenance never holds the write lock long enough to stall the collector.
+
+import logging
+import os
+import threading
+import time
+
+from database import DB_PATH, get_read_connection
+from rollup import parse_interval
+
+DEFAULT_INTERVAL = 30
+DEFAULT_VACUUM_PAGES = 256
+DEFAULT_ANALYZE_INTERVAL = 6 * 3600
+DEFAULT_ANALYSIS_LIMIT = 400
+
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+
+class DatabaseMaintenance:
+    """
+    Runs one maintenance step per call of run(): a round of per-table ANALYZE steps every
+    `analyze_interval` seconds, and incremental vacuum steps in between.
+    """
+
+    def __init__(self, db_writer, interval=DEFAULT_INTERVAL, vacuum_pages=DEFAULT_VACUUM_PAGES,
+                 analyze_interval=DEFAULT_ANALYZE_INTERVAL, analysis_limit=DEFAULT_ANALYSIS_LIMIT):
+        self.db_writer = db_writer
+        self.interval = interval
+        self.vacuum_pages = vacuum_pages
+        self.analyze_interval = analyze_interval
+        self.analysis_limit = analysis_limit
+        self.lock = threading.Lock()
+        self.queued = False
+        self.analyze_queue = None   # Tables left in the current ANALYZE round
+        self.last_analyze = None
+        # Counters
+        self.steps = 0
+        self.skipped = 0
+        self.vacuumed_pages = 0
+        self.analyzed_tables = 0
+        self.last_step = None
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+
+    def run(self, now):
+        """
+        Queue the next maintenance step unless the DB writer has work or a step is still queued.
+        """
+        with self.lock:
+            if self.queued or not self.db_writer.idle():
+                self.skipped += 1
+                return False
+            self.queued = True
+            if self.analyze_queue is None and (self.last_analyze is None
+                                               or now - self.last_analyze >= self.analyze_interval):
+                self.analyze_queue = []
+                self.last_analyze = now
+        if not self.db_writer.submit(self.step):
+            with self.lock:
+                self.queued = False
+            return False
+        return True
+
+    def step(self, cursor):
+        """
+        Run one maintenance step on the DB writer thread, inside its write transaction.
+        """
+        started = time.perf_counter()
+        try:
+            with self.lock:
+                analyze_queue = self.analyze_queue
+            if analyze_queue is not None:
+                self._analyze(cursor, analyze_queue)
+            else:
+                self._vacuum(cursor)
+        finally:
+            duration = time.perf_counter() - started
+            with self.lock:
+                self.queued = False
+                self.steps += 1
+                self.last_step = time.time()
+                self.last_duration = duration
+                self.max_duration = max(self.max_duration, duration)
+
+    def _vacuum(self, cursor):
+        free = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free:
+            return
+        # The pragma frees one page per statement step and the sqlite3 module steps
+        # row-less statements only once, so it is run once per page.
+        for _ in range(min(free, self.vacuum_pages)):
+            cursor.execute("PRAGMA incremental_vacuum(1)")
+        freed = free - cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        with self.lock:
+            self.vacuumed_pages += freed
+
+    def _analyze(self, cursor, analyze_queue):
+        if not analyze_queue:
+            # Start of a round: ANALYZE one table per step.
+            analyze_queue.extend(row[0] for row in cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"))
+            if not analyze_queue:
+                with self.lock:
+                    self.analyze_queue = None
+                return
+        table = analyze_queue.pop(0)
+        cursor.execute(f"PRAGMA analysis_limit = {int(self.analysis_limit)}")
+        try:
+            cursor.execute(f'ANALYZE "{table}"')
+        except Exception as e:
+            logging.error("ANALYZE of %s failed: %s", table, e)
+        with self.lock:
+            self.analyzed_tables += 1
+            if not analyze_queue:
+                self.analyze_queue = None
+
+    def stats(self):
+        with self.lock:
+            return {
+                'interval': self.interval,
+                'vacuum_pages': self.vacuum_pages,
+                'analyze_interval': self.analyze_interval,
+                'steps': self.steps,
+                'skipped': self.skipped,
+                'vacuumed_pages': self.vacuumed_pages,
+                'analyzed_tables': self.analyzed_tables,
+                'last_analyze': self.last_analyze,
+                'last_step': self.last_step,
+                'last_duration': round(self.last_duration, 6),
+                'max_duration': round(self.max_duration, 6)
+            }
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def storage_stats(db_path=DB_PATH):
+    """
+    Report the size of the metrics database: file and WAL size in bytes, page usage
+    and the vacuum mode.
+    """
+    conn = get_read_connection()
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    return {
+        'path': db_path,
+        'file_size': file_size(db_path),
+        'wal_size': file_size(f"{db_path}-wal"),
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_pages': freelist,
+        'free_bytes': freelist * page_size,
+        'auto_vacuum': AUTO_VACUUM_MODES.get(auto_vacuum, auto_vacuum),
+        # The one-time VACUUM switching an existing file to incremental mode has not run yet.
+        'vacuum_pending': auto_vacuum != 2
+    }
+
+
+def create_maintenance(db_writer, stats_config):
+    """
+    Build the maintenance job from the stats.maintenance section of config.yml.
+    """
+    config = stats_config.get('maintenance', {}) or {}
+    try:
+        return DatabaseMaintenance(db_writer,
+                                   interval=parse_interval(config.get('interval', DEFAULT_INTERVAL)),
+                                   vacuum_pages=int(config.get('vacuum_pages', DEFAULT_VACUUM_PAGES)),
+                                   analyze_interval=parse_interval(config.get('analyze_interval', DEFAULT_ANALYZE_INTERVAL)),
+                                   analysis_limit=int(config.get('analysis_limit', DEFAULT_ANALYSIS_LIMIT)))
+    except (TypeError, ValueError) as e:
+        logging.error("Invalid stats.maintenance configuration: %s", e)
+        return DatabaseMaintenance(db_writer)
@@ -0,0 +1,157 @@
+# simplehostmetrics/process_sampler.py
+# This module samples the process table in the background on the collector cadence.
+# Per-PID state is kept across ticks, so CPU usage and I/O throughput are real deltas
+# (psutil's per-process cpu_percent() is always 0 on the first call of a fresh Process object).
+# Requests are served from the last published table instead of walking /proc themselves.
+
+import heapq
+import logging
+import threading
+from operator import itemgetter
+
+import psutil
+
+from timeseries import SeriesStore
+
+PROCESS_ATTRS = ['pid', 'name', 'username', 'status', 'create_time',
+                 'cpu_times', 'memory_info', 'memory_percent', 'io_counters']
+
+# Sort keys accepted by sorted_rows(); the first three also get top-N lists, which are
+# recomputed from the full table on every tick (heapq.nlargest, O(n log N)). Every process's
+# CPU and I/O rate change on every tick, so an incrementally kept ranking would have to
+# re-key all n entries anyway.
+TOP_KEYS = ('cpu_percent', 'rss', 'io_rate')
+SORT_KEYS = TOP_KEYS + ('memory_percent', 'pid', 'name')
+
+
+class ProcessSampler:
+    """
+    Keeps the latest process table plus per-PID baselines and top-N rankings.
+    """
+
+    def __init__(self, top_n=10, history_capacity=120, history_retention=600):
+        self.top_n = top_n
+        self.history_retention = history_retention
+        self.lock = threading.Lock()
+        # (pid, create_time) -> (cpu_seconds, io_bytes, timestamp) from the previous tick
+        self.baselines = {}
+        self.rows = []
+        self.top = {key: [] for key in TOP_KEYS}
+        self.timestamp = None
+        self.version = 0
+        self._sorted_cache = {}
+        # Per-process history (cpu %, rss MB, io MB/s) for processes in any top-N list.
+        self.history = SeriesStore(('cpu_percent', 'rss_mb', 'io_rate_mb'), history_capacity)
+
+    def sample(self, now):
+        """
+        Walk the process table once and publish a new snapshot.
+        """
+        baselines = {}
+        rows = []
+        for proc in psutil.process_iter(PROCESS_ATTRS, ad_value=None):
+            info = proc.info
+            key = (info['pid'], info['create_time'])
+            cpu_times = info['cpu_times']
+            cpu_seconds = (cpu_times.user + cpu_times.system) if cpu_times else None
+            io = info['io_counters']
+            io_bytes = (io.read_bytes + io.write_bytes) if io else None
+            memory_info = info['memory_info']
+
+            cpu_percent = 0.0
+            io_rate = 0.0
+            previous = self.baselines.get(key)
+            if previous is not None:
+                dt = now - previous[2]
+                if dt > 0:
+                    if cpu_seconds is not None and previous[0] is not None:
+                        cpu_percent = round(max(0.0, cpu_seconds - previous[0]) / dt * 100, 1)
+                    if io_bytes is not None and previous[1] is not None:
+                        io_rate = max(0.0, io_bytes - previous[1]) / dt
+            baselines[key] = (cpu_seconds, io_bytes, now)
+
+            rows.append({
+                'pid': info['pid'],
+                'name': info['name'] or '',
+                'username': info['username'],
+                'status': info['status'],
+                'cpu_percent': cpu_percent,
+                'memory_percent': round(info['memory_percent'] or 0.0, 2),
+                'rss': memory_info.rss if memory_info else 0,
+                'io_rate': round(io_rate, 1)
+            })
+
+        top = {key: heapq.nlargest(self.top_n, rows, key=itemgetter(key)) for key in TOP_KEYS}
+        top_pids = {row['pid'] for rows_for_key in top.values() for row in rows_for_key}
+        by_pid = {row['pid']: row for row in rows}
+
+        with self.lock:
+            self.baselines = baselines
+            self.rows = rows
+            self.top = top
+            self.timestamp = now
+            self.version += 1
+            self._sorted_cache = {}
+            for pid in top_pids:
+                row = by_pid[pid]
+                self.history.append(pid, now, row['cpu_percent'], row['rss'] / (1024 * 1024),
+                                     row['io_rate'] / (1024 * 1024))
+            # Forget histories of processes that exited or left the top lists long ago.
+            cutoff = now - self.history_retention
+            stale = [pid for pid, series in self.history.items()
+                     if pid not in by_pid or (pid not in top_pids and series.last_timestamp() < cutoff)]
+            for pid in stale:
+                del self.history.series[pid]
+
+    def sorted_rows(self, sort='cpu_percent', descending=True):
+        """
+        Return the current table sorted by `sort`. Sorted views are cached per snapshot.
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unsupported sort key: {sort}")
+        with self.lock:
+            cache_key = (sort, descending)
+            rows = self._sorted_cache.get(cache_key)
+            if rows is None:
+                rows = sorted(self.rows, key=lambda row: row[sort], reverse=descending)
+                self._sorted_cache[cache_key] = rows
+            return rows, self.timestamp
+
+    def page(self, sort='cpu_percent', descending=True, page=1, per_page=50):
+        rows, timestamp = self.sorted_rows(sort, descending)
+        start = (page - 1) * per_page
+        return {
+            'timestamp': timestamp,
+            'total': len(rows),
+            'page': page,
+            'per_page': per_page,
+            'sort': sort,
+            'order': 'desc' if descending else 'asc',
+            'processes': rows[start:start + per_page]
+        }
+
+    def top_consumers(self):
+        with self.lock:
+            return {'timestamp': self.timestamp, 'top': dict(self.top)}
+
+    def process_history(self, pid, limit=None):
+        """
+        Return the recorded history of a (currently or recently) top-N process, or None.
+        """
+        with self.lock:
+            if pid not in self.history:
+                return None
+            return self.history.get(pid).to_columns(limit, raw_timestamps=True)
+
+
+def create_process_sampler(config):
+    """
+    Build the sampler from the stats.processes section of config.yml.
+    """
+    try:
+        return ProcessSampler(top_n=int(config.get('top_n', 10)),
+                              history_capacity=int(config.get('history_capacity', 120)),
+                              history_retention=float(config.get('history_retention', 600)))
+    except (TypeError, ValueError) as e:
+        logging.error("Invalid stats.processes configuration: %s", e)
+        return ProcessSampler()
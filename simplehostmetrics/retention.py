@@ -0,0 +1,160 @@
+# simplehostmetrics/retention.py
+# This module trims the metrics tables by age in periodic, batched sweeps.
+# Sweeps run on the DB writer thread. Raw sample chunks and rollup buckets are deleted per
+# series / tier with LIMITed deletes on their (key, timestamp) indexes. Whole append-only tables
+# are written in time order, so their expired rows are always a rowid prefix; they are deleted by
+# rowid range ("rowid watermark") up to the first unexpired row, without a sort.
+
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from rollup import parse_interval
+
+# `where`/`params` restrict a policy to part of a table (e.g. one rollup tier). Tables with
+# such a filter are not append-only per policy and are trimmed by timestamp instead of rowid.
+RetentionPolicy = namedtuple('RetentionPolicy', ['table', 'retention', 'where', 'params'])
+
+# Default retention of raw samples per series (GLOB pattern over metric_chunks.series), used
+# for patterns missing from stats.retention.series. A chunk is removed once its start is older
+# than the retention, i.e. up to CHUNK_SPAN seconds early.
+DEFAULT_SERIES_RETENTION = {
+    'cpu': '24h',
+    'cpu_cores': '24h',
+    'memory': '24h',
+    'disk': '7d',
+    'disk_io.*': '24h',
+    'network.*': '24h',
+}
+DEFAULT_SWEEP_INTERVAL = 60
+DEFAULT_BATCH_SIZE = 10000
+
+
+class RetentionEngine:
+    """
+    Applies a list of RetentionPolicy objects. Each sweep deletes at most `batch_size` rows per
+    policy, so a single sweep never holds the write lock for long; a backlog (e.g. after the
+    retention was shortened) is worked off over the following sweeps.
+    """
+
+    def __init__(self, policies, interval=DEFAULT_SWEEP_INTERVAL, batch_size=DEFAULT_BATCH_SIZE):
+        self.policies = list(policies)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.sweeps = 0
+        self.last_sweep = None
+        self.last_duration = 0.0
+        self.total_duration = 0.0
+        self.deleted = {self.policy_name(policy): 0 for policy in self.policies}
+        self.last_deleted = dict(self.deleted)
+
+    @staticmethod
+    def policy_name(policy):
+        if policy.where is None:
+            return policy.table
+        return f"{policy.table}[{','.join(str(param) for param in policy.params)}]"
+
+    def sweep(self, cursor, now=None):
+        """
+        Delete expired rows for every policy using `cursor`. The caller commits.
+        Returns the number of rows deleted.
+        """
+        now = time.time() if now is None else now
+        started = time.perf_counter()
+        deleted = {}
+        for policy in self.policies:
+            cutoff = now - policy.retention
+            try:
+                if policy.where is None:
+                    deleted[self.policy_name(policy)] = self._trim_by_rowid(cursor, policy.table, cutoff)
+                else:
+                    deleted[self.policy_name(policy)] = self._trim_by_timestamp(cursor, policy, cutoff)
+            except Exception as e:
+                logging.error("Retention sweep of %s failed: %s", self.policy_name(policy), e)
+        duration = time.perf_counter() - started
+        with self.lock:
+            self.sweeps += 1
+            self.last_sweep = now
+            self.last_duration = duration
+            self.total_duration += duration
+            for name, count in deleted.items():
+                self.deleted[name] += count
+                self.last_deleted[name] = count
+        return sum(deleted.values())
+
+    def _trim_by_rowid(self, cursor, table, cutoff):
+        oldest = cursor.execute(f"SELECT MIN(rowid) FROM {table}").fetchone()[0]
+        if oldest is None:
+            return 0
+        # First row that is still within retention: one seek on the timestamp index.
+        row = cursor.execute(
+            f"SELECT rowid FROM {table} WHERE timestamp >= ? ORDER BY timestamp LIMIT 1", (cutoff,)
+        ).fetchone()
+        if row is None:
+            watermark = cursor.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] + 1
+        else:
+            watermark = row[0]
+        watermark = min(watermark, oldest + self.batch_size)
+        if watermark <= oldest:
+            return 0
+        cursor.execute(f"DELETE FROM {table} WHERE rowid < ?", (watermark,))
+        return cursor.rowcount
+
+    def _trim_by_timestamp(self, cursor, policy, cutoff):
+        cursor.execute(
+            f"""DELETE FROM {policy.table} WHERE rowid IN (
+                  SELECT rowid FROM {policy.table}
+                  WHERE {policy.where} AND timestamp < ?
+                  LIMIT ?
+                )""", tuple(policy.params) + (cutoff, self.batch_size)
+        )
+        return cursor.rowcount
+
+    def stats(self):
+        with self.lock:
+            return {
+                'interval': self.interval,
+                'batch_size': self.batch_size,
+                'sweeps': self.sweeps,
+                'last_sweep': self.last_sweep,
+                'last_duration': round(self.last_duration, 6),
+                'total_duration': round(self.total_duration, 6),
+                'policies': {self.policy_name(policy): {
+                    'retention': policy.retention,
+                    'deleted': self.deleted[self.policy_name(policy)],
+                    'last_deleted': self.last_deleted[self.policy_name(policy)]
+                } for policy in self.policies}
+            }
+
+
+def create_retention_engine(stats_config, rollup_tiers=()):
+    """
+    Build the engine from the stats.retention section of config.yml: `series` sets the raw
+    sample retention per series pattern, `tables` trims further append-only tables as a whole.
+    Rollup tiers are trimmed with their own configured retention (stats.rollups).
+    """
+    retention_config = stats_config.get('retention', {}) or {}
+    series = dict(DEFAULT_SERIES_RETENTION, **(retention_config.get('series', {}) or {}))
+    tables = retention_config.get('tables', {}) or {}
+    policies = []
+    for pattern, retention in sorted(series.items()):
+        try:
+            policies.append(RetentionPolicy('metric_chunks', parse_interval(retention), 'series GLOB ?', (pattern,)))
+        except (TypeError, ValueError) as e:
+            logging.error("Invalid retention for series %s: %s", pattern, e)
+    for table, retention in sorted(tables.items()):
+        try:
+            policies.append(RetentionPolicy(table, parse_interval(retention), None, ()))
+        except (TypeError, ValueError) as e:
+            logging.error("Invalid retention for %s: %s", table, e)
+    for tier in rollup_tiers:
+        policies.append(RetentionPolicy('metric_rollups', tier.retention, 'tier = ?', (tier.name,)))
+    try:
+        interval = parse_interval(retention_config.get('interval', DEFAULT_SWEEP_INTERVAL))
+        batch_size = int(retention_config.get('batch_size', DEFAULT_BATCH_SIZE))
+    except (TypeError, ValueError) as e:
+        logging.error("Invalid stats.retention configuration: %s", e)
+        interval, batch_size = DEFAULT_SWEEP_INTERVAL, DEFAULT_BATCH_SIZE
+    return RetentionEngine(policies, interval, batch_size)
@@ -0,0 +1,298 @@
+# simplehostmetrics/rollup.py
+# This module implements a generic multi-resolution rollup engine for metric samples.
+# Raw samples are folded into fixed-width buckets (e.g. 1m), finished buckets cascade into
+# the next coarser tier (1m -> 1h -> 1d) and every bucket keeps min/max/avg/count/last.
+
+import logging
+import threading
+
+from timeseries import SeriesStore, format_timestamp
+
+# Fields stored for every finished bucket.
+BUCKET_FIELDS = ('min', 'max', 'avg', 'count', 'last')
+
+INTERVAL_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+# Default tier spec, used when config.yml has no stats.rollups section.
+DEFAULT_TIERS = [
+    {'name': '1m', 'interval': '1m', 'retention': '24h'},
+    {'name': '1h', 'interval': '1h', 'retention': '7d'},
+    {'name': '1d', 'interval': '1d', 'retention': '365d'},
+]
+
+
+def parse_interval(value):
+    """
+    Convert an interval such as 60, '90s', '1m', '6h' or '7d' to seconds.
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    value = str(value).strip().lower()
+    if value and value[-1] in INTERVAL_UNITS:
+        return int(float(value[:-1]) * INTERVAL_UNITS[value[-1]])
+    return int(float(value))
+
+
+class Bucket:
+    """
+    Running aggregate for one metric within one time window.
+    """
+    __slots__ = ('start', 'min', 'max', 'sum', 'count', 'last')
+
+    def __init__(self, start, value):
+        self.start = start
+        self.min = value
+        self.max = value
+        self.sum = value
+        self.count = 1
+        self.last = value
+
+    def add(self, value):
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.sum += value
+        self.count += 1
+        self.last = value
+
+    def merge(self, other):
+        """
+        Fold a finished finer-grained bucket into this one.
+        """
+        if other.min < self.min:
+            self.min = other.min
+        if other.max > self.max:
+            self.max = other.max
+        self.sum += other.sum
+        self.count += other.count
+        self.last = other.last
+
+    @classmethod
+    def from_bucket(cls, start, other):
+        bucket = cls(start, other.last)
+        bucket.min = other.min
+        bucket.max = other.max
+        bucket.sum = other.sum
+        bucket.count = other.count
+        return bucket
+
+    @property
+    def avg(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def as_dict(self):
+        return {'min': self.min, 'max': self.max, 'avg': self.avg, 'count': self.count, 'last': self.last}
+
+
+class RollupTier:
+    """
+    One resolution level: bucket width and how many finished buckets are retained.
+    """
+
+    def __init__(self, name, interval, retention):
+        self.name = str(name)
+        self.interval = parse_interval(interval)
+        self.retention = parse_interval(retention)
+        if self.interval <= 0:
+            raise ValueError(f"Rollup tier {self.name}: interval must be positive")
+        self.capacity = max(1, self.retention // self.interval)
+        # Finished buckets per metric, kept in ring buffers for the charts.
+        self.history = SeriesStore(BUCKET_FIELDS, self.capacity)
+        # Open bucket per metric.
+        self.open = {}
+
+    def bucket_start(self, timestamp):
+        return timestamp - (timestamp % self.interval)
+
+
+class RollupEngine:
+    """
+    Multi-resolution rollup engine.
+
+    add() feeds a raw sample into the first tier. When a bucket's window has passed it is
+    closed, recorded in the tier history, queued for storage and merged into the next tier.
+    roll() closes every expired bucket so sparse metrics are finalized on time, too.
+    A sample older than its metric's open bucket (clock step, late sampler tick) cannot be
+    added any more; it is dropped and counted in stats()['late_samples'].
+    """
+
+    def __init__(self, tiers=None):
+        specs = tiers or DEFAULT_TIERS
+        self.tiers = [RollupTier(spec['name'], spec['interval'], spec.get('retention', spec['interval']))
+                      for spec in specs]
+        self.tiers.sort(key=lambda tier: tier.interval)
+        self.lock = threading.Lock()
+        # Finished buckets waiting to be written: (metric, tier, timestamp, min, max, avg, count, last)
+        self.pending = []
+        # Dropped samples that were older than the open bucket, per metric.
+        self.late_samples = {}
+
+    def tier(self, name):
+        for tier in self.tiers:
+            if tier.name == name:
+                return tier
+        raise KeyError(name)
+
+    def tier_for(self, span, max_points):
+        """
+        Return the finest tier that covers `span` seconds with at most `max_points` buckets.
+        """
+        for tier in self.tiers:
+            if span / tier.interval <= max_points and tier.retention >= span:
+                return tier
+        return self.tiers[-1]
+
+    def add(self, metric, timestamp, value):
+        """
+        Add a raw sample for metric.
+        """
+        if value is None:
+            return
+        with self.lock:
+            tier = self.tiers[0]
+            start = tier.bucket_start(int(timestamp))
+            bucket = tier.open.get(metric)
+            if bucket is None:
+                tier.open[metric] = Bucket(start, value)
+            elif start == bucket.start:
+                bucket.add(value)
+            elif start > bucket.start:
+                self._close(0, metric, bucket)
+                tier.open[metric] = Bucket(start, value)
+            else:
+                if metric not in self.late_samples:
+                    logging.warning("Dropping %s sample at %s: older than the open %s bucket (%s)",
+                                    metric, timestamp, tier.name, bucket.start)
+                self.late_samples[metric] = self.late_samples.get(metric, 0) + 1
+
+    def roll(self, now):
+        """
+        Close all buckets whose window ended before `now`.
+        """
+        now = int(now)
+        with self.lock:
+            for index, tier in enumerate(self.tiers):
+                expired = [metric for metric, bucket in tier.open.items()
+                           if bucket.start + tier.interval <= now]
+                for metric in expired:
+                    self._close(index, metric, tier.open.pop(metric))
+
+    def _close(self, index, metric, bucket):
+        tier = self.tiers[index]
+        tier.history.append(metric, float(bucket.start), bucket.min, bucket.max,
+                            bucket.avg, bucket.count, bucket.last)
+        self.pending.append((metric, tier.name, float(bucket.start), bucket.min, bucket.max,
+                             bucket.avg, bucket.count, bucket.last))
+        if index + 1 >= len(self.tiers):
+            return
+        parent = self.tiers[index + 1]
+        start = parent.bucket_start(bucket.start)
+        open_bucket = parent.open.get(metric)
+        if open_bucket is None:
+            parent.open[metric] = Bucket.from_bucket(start, bucket)
+        elif start == open_bucket.start:
+            open_bucket.merge(bucket)
+        elif start > open_bucket.start:
+            self._close(index + 1, metric, parent.open.pop(metric))
+            parent.open[metric] = Bucket.from_bucket(start, bucket)
+
+    def _partial(self, index, metric):
+        """
+        Return the in-progress bucket of a tier, including data still held in the open
+        buckets of finer tiers, or None if there is no data for the current window.
+        """
+        tier = self.tiers[index]
+        partial = None
+        for finer in reversed(self.tiers[:index + 1]):
+            bucket = finer.open.get(metric)
+            if bucket is None:
+                continue
+            if partial is None:
+                partial = Bucket.from_bucket(tier.bucket_start(bucket.start), bucket)
+            elif tier.bucket_start(bucket.start) == partial.start:
+                partial.merge(bucket)
+        return partial
+
+    def stats(self):
+        with self.lock:
+            return {
+                'tiers': [{'name': tier.name, 'interval': tier.interval, 'retention': tier.retention,
+                           'open': len(tier.open)} for tier in self.tiers],
+                'pending': len(self.pending),
+                'late_samples': sum(self.late_samples.values()),
+                'late_by_metric': dict(self.late_samples)
+            }
+
+    def drain(self):
+        """
+        Return and forget all finished buckets that have not been stored yet.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, []
+        return pending
+
+    def restore(self, tier_name, metric, timestamp, min_value, max_value, avg, count, last):
+        """
+        Re-insert a stored bucket into the in-memory tier history (used at startup).
+        """
+        tier = self.tier(tier_name)
+        tier.history.append(metric, timestamp, min_value, max_value, avg, count, last)
+
+    def open_buckets(self):
+        """
+        Return the open buckets of all tiers as [tier, metric, start, min, max, sum, count, last] lists.
+        """
+        with self.lock:
+            return [[tier.name, metric, bucket.start, bucket.min, bucket.max, bucket.sum, bucket.count, bucket.last]
+                    for tier in self.tiers for metric, bucket in tier.open.items()]
+
+    def restore_open(self, buckets):
+        """
+        Re-open buckets saved by open_buckets() (used at startup); buckets of unknown tiers are ignored.
+        """
+        tiers = {tier.name: tier for tier in self.tiers}
+        with self.lock:
+            for tier_name, metric, start, min_value, max_value, total, count, last in buckets:
+                tier = tiers.get(tier_name)
+                if tier is None:
+                    continue
+                bucket = Bucket(start, last)
+                bucket.min, bucket.max, bucket.sum, bucket.count = min_value, max_value, total, count
+                tier.open[metric] = bucket
+
+    def history(self, tier_name, metric, limit=None, time_format='%H:%M', include_open=True):
+        """
+        Return a metric's buckets for a tier as a list of
+        {'time', 'min', 'max', 'avg', 'count', 'last'} dicts, oldest first.
+        The still-open bucket is appended unless include_open is False.
+        """
+        tier = self.tier(tier_name)
+        with self.lock:
+            records = []
+            if metric in tier.history:
+                records = tier.history.get(metric).to_records(limit, time_format)
+            bucket = self._partial(self.tiers.index(tier), metric) if include_open else None
+            if bucket is not None:
+                record = {'time': format_timestamp(float(bucket.start), time_format)}
+                record.update(bucket.as_dict())
+                records.append(record)
+                if limit is not None and len(records) > limit:
+                    records = records[-limit:]
+        return records
+
+
+def load_tier_spec(stats_config):
+    """
+    Read the rollup tier spec from the stats section of config.yml, falling back to DEFAULT_TIERS.
+    """
+    specs = stats_config.get('rollups') or DEFAULT_TIERS
+    valid = []
+    for spec in specs:
+        try:
+            parse_interval(spec['interval'])
+            parse_interval(spec.get('retention', spec['interval']))
+            valid.append(spec)
+        except (KeyError, TypeError, ValueError) as e:
+            logging.error("Invalid rollup tier %s: %s", spec, e)
+    return valid or DEFAULT_TIERS
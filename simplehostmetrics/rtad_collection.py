@@ -2,6 +2,7 @@ import threading
 import time
 import logging
 import rtad_manager
+import rtad_ingest
 import os
 
 def rtad_main():
@@ -15,12 +16,9 @@ def rtad_main():
         # Create a log parser instance
         log_parser = rtad_manager.LogParser()
         
-        # Initial parse of all log files
+        # Initial parse of all log files (the parser watches for changes from here on)
         log_parser.parse_log_files()
         
-        # Setup file watching
-        log_parser.setup_watchdog()
-        
         # Start a thread to update country information
         country_info_thread = threading.Thread(
             target=rtad_manager.update_country_info_job,
@@ -42,4 +40,23 @@ def rtad_main():
         print(f"Error in RTAD main thread: {str(e)}")
         # Keep the thread running even if there's an error
         time.sleep(60)
-        rtad_main()  # Restart the function 
\ No newline at end of file
+        rtad_main()  # Restart the function 
+
+def start_rtad():
+    """
+    Start RTAD ingestion: in a supervised process of its own if rtad.ingest_process is set
+    in config.yml, otherwise as a thread of the web process.
+    """
+    rtad_config = rtad_manager.config.get('rtad', {}) or {}
+    if rtad_config.get('ingest_process', False):
+        rtad_ingest.start_ingest_process()
+        # Events arrive enriched; this only covers events stored here (archive backfill).
+        country_info_thread = threading.Thread(
+            target=rtad_manager.update_country_info_job,
+            daemon=True
+        )
+        country_info_thread.start()
+    else:
+        rtad_thread = threading.Thread(target=rtad_main)
+        rtad_thread.daemon = True
+        rtad_thread.start()
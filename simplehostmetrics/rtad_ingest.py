@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# simplehostmetrics/rtad_ingest.py
+# This module runs the RTAD ingestion pipeline (log tailing, parsing, GeoIP enrichment) in a
+# process of its own, so a log flood does not compete with the web workers for the GIL.
+# The web process starts this file as a child process (rtad.ingest_process in config.yml) and
+# supervises it: the child sends its enriched events in batches through a pipe, together with
+# a heartbeat, and the web process adds them to its event caches. A child that exits or stops
+# sending heartbeats is replaced, with exponential backoff. The child exits when the web
+# process goes away (its stdin is closed).
+
+import argparse
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Connection
+
+import rtad_manager
+
+FORWARD_INTERVAL = 0.25    # Seconds events are collected before a batch is sent
+MAX_BATCH = 500            # Events per batch
+HEARTBEAT_INTERVAL = 1.0   # Seconds between heartbeats when no batch was sent
+HEARTBEAT_TIMEOUT = 30.0   # Seconds without a message before the child is restarted
+MAX_BACKOFF = 60.0         # Upper bound of the delay between restarts
+STABLE_RUNTIME = 60.0      # A child running this long resets the backoff
+RATE_WINDOW = 10.0         # Seconds the event rate is averaged over
+BACKLOG_INTERVAL = 10.0    # Seconds between measurements of the unread log bytes
+BTMP_INTERVAL = 60         # Seconds between parses of /var/log/btmp
+
+
+def backlog_bytes(log_configs):
+    """
+    Return how many bytes of the configured live logs have not been read yet.
+    """
+    backlog = 0
+    for log_config in log_configs:
+        path = log_config.get('path')
+        if not path:
+            continue
+        for file_path in rtad_manager.get_log_files(path):
+            state = rtad_manager.offset_tracker.get(file_path)
+            try:
+                size = os.path.getsize(file_path)
+            except OSError:
+                continue
+            backlog += max(0, size - (state.offset if state else 0))
+    return backlog
+
+
+#######################
+# Ingestion process
+#######################
+class EventForwarder:
+    """
+    Collects the events stored in the ingestion process (rtad_manager.event_sink), enriches
+    them and sends them to the web process as messages:
+    {'events': [(kind, entry), ...], 'oldest': time the oldest event not sent before this
+     message was stored, or None, 'sent': time, 'backlog_bytes': unread bytes of the live logs}.
+    Heartbeats (messages without events) are sent from their own thread, so a slow lookup
+    shows up as growing lag rather than as a dead process. The backlog is measured every
+    BACKLOG_INTERVAL seconds by another thread and sent as last measured.
+    """
+
+    def __init__(self, conn, log_configs):
+        self.conn = conn
+        self.log_configs = log_configs
+        self.queue = queue.Queue()
+        self.send_lock = threading.Lock()
+        self.in_flight = None  # Store time of the oldest event of the batch being enriched
+        self.last_send = 0.0
+        self.backlog = None
+
+    def put(self, kind, entry):
+        self.queue.put((time.time(), kind, entry))
+
+    def oldest_pending(self):
+        if self.in_flight is not None:
+            return self.in_flight
+        try:
+            return self.queue.queue[0][0]
+        except IndexError:
+            return None
+
+    def send(self, events, oldest):
+        with self.send_lock:
+            try:
+                self.conn.send({
+                    'events': events,
+                    'oldest': oldest,
+                    'sent': time.time(),
+                    'backlog_bytes': self.backlog,
+                })
+            except OSError:
+                # The web process is gone.
+                os._exit(1)
+            self.last_send = time.time()
+
+    def next_batch(self):
+        batch = [self.queue.get()]
+        deadline = batch[0][0] + FORWARD_INTERVAL
+        while len(batch) < MAX_BATCH:
+            try:
+                batch.append(self.queue.get(timeout=max(0.0, deadline - time.time())))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            self.in_flight = batch[0][0]
+            for _, _, entry in batch:
+                try:
+                    rtad_manager.enrich_event(entry)
+                except Exception as e:
+                    logging.error("Error enriching RTAD event: %s", e)
+            self.send([(kind, entry) for _, kind, entry in batch], batch[0][0])
+            self.in_flight = None
+
+    def heartbeat(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            if time.time() - self.last_send >= HEARTBEAT_INTERVAL:
+                self.send([], self.oldest_pending())
+
+    def refresh_backlog(self):
+        try:
+            self.backlog = backlog_bytes(self.log_configs)
+        except Exception as e:
+            logging.error("Error measuring the RTAD log backlog: %s", e)
+
+    def measure_backlog(self):
+        while True:
+            self.refresh_backlog()
+            time.sleep(BACKLOG_INTERVAL)
+
+
+def exit_with_parent():
+    """
+    Block until the web process closes our stdin, then exit.
+    """
+    sys.stdin.buffer.read()
+    os._exit(0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RTAD ingestion process (started by the web process).")
+    parser.add_argument('--fd', type=int, required=True, help="pipe to send events to")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s rtad-ingest %(levelname)s %(message)s')
+
+    forwarder = EventForwarder(Connection(args.fd, readable=False), rtad_manager.config.get('logfiles', []))
+    rtad_manager.event_sink = forwarder.put
+    threading.Thread(target=exit_with_parent, daemon=True).start()
+    threading.Thread(target=forwarder.run, daemon=True).start()
+    threading.Thread(target=forwarder.heartbeat, daemon=True).start()
+    threading.Thread(target=forwarder.measure_backlog, daemon=True).start()
+
+    log_parser = rtad_manager.LogParser()
+    log_parser.parse_log_files()
+    while True:
+        time.sleep(BTMP_INTERVAL)
+        try:
+            log_parser.parse_btmp_file()
+        except Exception as e:
+            logging.error("Error parsing btmp file: %s", e)
+
+
+#######################
+# Web process side
+#######################
+class IngestSupervisor:
+    """
+    Starts the ingestion process, adds the events it sends with `apply(kind, entry)`, and
+    restarts it when it exits or stops sending heartbeats.
+    """
+
+    def __init__(self, apply=rtad_manager.add_ingested_event, heartbeat_timeout=HEARTBEAT_TIMEOUT, command=None):
+        self.apply = apply
+        self.heartbeat_timeout = heartbeat_timeout
+        self.command = command or [sys.executable, os.path.abspath(__file__)]
+        self.stopping = threading.Event()
+        self.thread = None
+        self.process = None
+        self.lock = threading.Lock()
+        self.restarts = 0
+        self.started = None
+        self.last_message = None
+        self.events = 0
+        self.lag = None
+        self.backlog = None
+        self.recent = deque()  # (time, events) of the messages within RATE_WINDOW
+
+    def start(self):
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.supervise, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(10)
+
+    def launch(self):
+        read_fd, write_fd = os.pipe()
+        try:
+            process = subprocess.Popen(self.command + ['--fd', str(write_fd)],
+                                       stdin=subprocess.PIPE, pass_fds=(write_fd,))
+        except Exception:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+        return process, Connection(read_fd, writable=False)
+
+    @staticmethod
+    def terminate(process):
+        if process.stdin:
+            process.stdin.close()
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    def supervise(self):
+        backoff = 1.0
+        while not self.stopping.is_set():
+            started = time.time()
+            try:
+                process, conn = self.launch()
+            except OSError as e:
+                logging.error("Could not start the RTAD ingestion process: %s", e)
+                self.stopping.wait(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                continue
+            with self.lock:
+                self.process = process
+                self.started = started
+            try:
+                self.receive(process, conn)
+            finally:
+                conn.close()
+                self.terminate(process)
+            if self.stopping.is_set():
+                break
+            if time.time() - started >= STABLE_RUNTIME:
+                backoff = 1.0
+            with self.lock:
+                self.restarts += 1
+            logging.error("RTAD ingestion process exited (code %s), restarting in %.0fs",
+                          process.returncode, backoff)
+            self.stopping.wait(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF)
+
+    def receive(self, process, conn):
+        """
+        Handle the child's messages until it exits, closes the pipe or stops sending heartbeats.
+        """
+        last = time.time()
+        while not self.stopping.is_set():
+            if conn.poll(1.0):
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                last = time.time()
+                self.handle(message)
+            elif process.poll() is not None:
+                return
+            elif time.time() - last > self.heartbeat_timeout:
+                logging.error("RTAD ingestion process sent no heartbeat for %.0fs", self.heartbeat_timeout)
+                return
+
+    def handle(self, message):
+        for kind, entry in message['events']:
+            self.apply(kind, entry)
+        now = time.time()
+        with self.lock:
+            self.last_message = now
+            self.events += len(message['events'])
+            self.lag = now - (message['oldest'] if message['oldest'] is not None else message['sent'])
+            self.backlog = message['backlog_bytes']
+            self.recent.append((now, len(message['events'])))
+            while self.recent and self.recent[0][0] < now - RATE_WINDOW:
+                self.recent.popleft()
+
+    def stats(self):
+        """
+        Return the state of the ingestion process: pid, uptime, restarts, events received,
+        events per second, lag (age of the oldest event the child had not delivered at its
+        last message) and the unread bytes of the live logs.
+        """
+        now = time.time()
+        with self.lock:
+            alive = self.process is not None and self.process.poll() is None
+            recent = sum(count for timestamp, count in self.recent if timestamp >= now - RATE_WINDOW)
+            return {
+                'running': alive,
+                'pid': self.process.pid if alive else None,
+                'uptime': now - self.started if alive and self.started else None,
+                'restarts': self.restarts,
+                'events': self.events,
+                'events_per_second': round(recent / RATE_WINDOW, 2),
+                'lag': round(self.lag, 3) if self.lag is not None else None,
+                'backlog_bytes': self.backlog,
+                'last_message_age': now - self.last_message if self.last_message else None,
+            }
+
+
+supervisor = None
+
+
+def start_ingest_process():
+    """
+    Start the supervised ingestion process (once).
+    """
+    global supervisor
+    if supervisor is None:
+        supervisor = IngestSupervisor()
+        supervisor.start()
+    return supervisor
+
+
+def get_ingest_status():
+    """
+    Return how RTAD ingestion runs ('process' or 'thread') and, for the process, its stats.
+    """
+    if supervisor is None:
+        return {'mode': 'thread'}
+    return dict(supervisor.stats(), mode='process')
+
+
+if __name__ == '__main__':
+    main()
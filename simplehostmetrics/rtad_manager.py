@@ -3,6 +3,7 @@
 # It includes features like file offset tracking for efficient log reading,
 # debounced file watching for real-time log parsing, and caching of geo-information.
 
+import atexit                         # For writing the last log offsets on shutdown.
 import yaml                           # For loading configuration files in YAML format.
 import os                             # For interacting with the operating system (files, paths).
 import logging                        # For logging debug and error messages.
@@ -16,23 +17,19 @@ from datetime import datetime         # For working with dates and times.
 from concurrent.futures import ThreadPoolExecutor  # For concurrently processing log files.
 from watchdog.observers import Observer            # For monitoring file system changes.
 from watchdog.events import FileSystemEventHandler # For handling file system events.
-from threading import Timer           # For debouncing events.
+from threading import Timer           # For coalescing file change events.
 from collections import deque         # For efficient FIFO queues with fixed max length.
+from centroids import get_centroid     # Shared country centroid index (GeoIP fallback).
+from log_tailer import read_line_batches, DEFAULT_CHUNK_SIZE, DEFAULT_MAX_BATCH_BYTES  # Chunked log reading.
+from log_offsets import CHECKPOINT_INTERVAL, FileOffsetTracker, find_rotated, identify, start_offset  # Persistent read positions.
+from database import get_db_connection  # Connection for the offset checkpoints.
+from log_backfill import LogBackfill     # Import of rotated log archives.
+from log_parsing import parse_http_error_line, parse_log_timestamp  # Proxy log line parsing.
 
 # Global counters for diff-based updates
 login_attempt_counter = 0             # Counter to uniquely identify login attempts.
 http_error_log_counter = 0            # Counter to uniquely identify HTTP error logs.
 
-# Precompiled regex for proxy events for different log formats.
-# Regex for 'zoraxy' proxy logs
-REGEX_ZORAXY = re.compile(
-    r"\[[^\]]+\]\s+\[[^\]]+\]\s+\[origin:(?P<origin>[^\]]*)\]\s+\[client\s+(?P<ip>\d+\.\d+\.\d+\.\d+)\]\s+(?P<method>[A-Z]+)\s+(?P<url>\S+)\s+(?P<code>\d{3})"
-)
-# Regex for 'npm' proxy logs
-REGEX_NPM = re.compile(
-    r'^\[(?P<timestamp>[^\]]+)\]\s+(?P<code>\d{3})\s+-\s+(?P<method>[A-Z]+|-)\s+(?P<protocol>\S+)\s+(?P<host>\S+)\s+"(?P<url>[^"]+)"\s+\[Client\s+(?P<ip>\d{1,3}(?:\.\d{1,3}){3})\]'
-)
-
 # Instead of normal lists, use deques to maintain a stable FIFO queue with a maximum length.
 # Caches for login attempts and HTTP error logs (max 1000 entries each).
 login_attempts_cache = deque(maxlen=1000)
@@ -42,6 +39,10 @@ http_error_logs_cache = deque(maxlen=1000)
 login_attempts_lock = threading.Lock()
 http_error_logs_lock = threading.Lock()
 
+# Optional callback(kind, entry) called for every stored event ('login' or 'http_error').
+# Set by the ingestion process to forward its events to the web process (see rtad_ingest.py).
+event_sink = None
+
 # Global cache for IP geo-information with a Time-To-Live (TTL) mechanism.
 ip_country_cache = {}
 ip_country_cache_lock = threading.Lock()
@@ -89,6 +90,13 @@ def parse_timezone(tz_str):
             logging.error("Invalid timezone: %s", tz_str)
             return pytz.utc
 
+# Log reading: bytes per read and upper bound of the bytes parsed per batch.
+rtad_config = config.get('rtad', {}) or {}
+TAILER_CHUNK_SIZE = int(rtad_config.get('chunk_size', DEFAULT_CHUNK_SIZE))
+TAILER_MAX_BATCH_BYTES = int(rtad_config.get('max_batch_bytes', DEFAULT_MAX_BATCH_BYTES))
+# Seconds file change events are collected before the changed logs are parsed.
+DISPATCH_DELAY = float(rtad_config.get('dispatch_delay', 1.0))
+
 # Retrieve timezone configuration from the config file.
 TIMEZONE_CONFIG = config.get("timezone", "UTC")
 TIMEZONE = parse_timezone(TIMEZONE_CONFIG)
@@ -122,10 +130,15 @@ def get_formatted_timestamp(ts=None):
     """
     return normalize_timestamp(ts)
 
+# Rotated copies of a log (access.log.1, access.log.2.gz); their new lines are read by
+# following the rotation of the live file instead.
+ROTATED_LOG_PATTERN = re.compile(r"\.\d+(\.gz)?$")
+
 def get_log_files(path):
     """
     Return a list of log file paths.
-    If 'path' is a file, return it as a list. If it's a directory, list all files within it.
+    If 'path' is a file, return it as a list. If it's a directory, list all files within it
+    except rotated copies.
     """
     if os.path.isfile(path):
         return [path]
@@ -133,7 +146,7 @@ def get_log_files(path):
         return [
             os.path.join(path, filename)
             for filename in os.listdir(path)
-            if os.path.isfile(os.path.join(path, filename))
+            if os.path.isfile(os.path.join(path, filename)) and not ROTATED_LOG_PATTERN.search(filename)
         ]
     else:
         return []
@@ -235,126 +248,129 @@ def get_geo_info_cached(ip, ttl=3600):
 ##################################
 # Country-Centroid Fallback Logic
 ##################################
-def load_country_centroids(filepath="country_centroids.yml"):
-    """
-    Load country centroid coordinates from a YAML file.
-    Returns a dictionary mapping country codes to (latitude, longitude) tuples.
-    """
-    try:
-        with open(filepath, 'r') as f:
-            centroids = yaml.safe_load(f)
-            result = {}
-            for k, v in centroids.items():
-                # Convert the key to uppercase string
-                key_str = str(k).upper()
-                # Expect the value to be a list or tuple of two coordinates.
-                if isinstance(v, (list, tuple)) and len(v) == 2:
-                    result[key_str] = tuple(v)
-                else:
-                    logging.error("Invalid centroid value for key %s: expected list/tuple of length 2, got %s", key_str, v)
-            return result
-    except Exception as e:
-        logging.error("Error loading country centroids from %s: %s", filepath, e)
-        return {}
-
-COUNTRY_CENTROIDS = load_country_centroids()
-
 def get_country_centroid(country_code):
     """
     Return the approximate centroid (latitude, longitude) for the given country_code.
     If the country code is unknown, return (0,0).
     """
-    if not country_code or country_code == "Unknown":
-        return (0, 0)
-    return COUNTRY_CENTROIDS.get(country_code.upper(), (0, 0))
+    return get_centroid(country_code, (0, 0))
 
 ##################################
 # File Offset Tracking
 ##################################
-class FileOffsetTracker:
-    """
-    Tracks file offsets to ensure only new log lines are processed.
-    If a file is rotated or truncated, the offset is reset to 0.
-    """
-    def __init__(self):
-        # Dictionary mapping file_path -> (inode, offset)
-        self.file_offsets = {}
-        self.lock = threading.Lock()
-
-    def get_offset(self, path):
-        """
-        Get the current (inode, offset) for a given file path.
-        """
-        with self.lock:
-            return self.file_offsets.get(path, (None, 0))
-
-    def update_offset(self, path, inode, offset):
-        """
-        Update the stored inode and offset for a file.
-        """
-        with self.lock:
-            self.file_offsets[path] = (inode, offset)
-
-    def reset_offset(self, path):
-        """
-        Reset the offset tracking for a file.
-        """
-        with self.lock:
-            if path in self.file_offsets:
-                del self.file_offsets[path]
-
-# Instantiate a global FileOffsetTracker.
-offset_tracker = FileOffsetTracker()
-
-def read_new_lines_from_file(file_path):
-    """
-    Reads only new lines from the file since the last stored offset.
-    If the file was rotated or truncated, the offset is reset.
-    Returns a list of new lines.
+# Read positions of all log files, persisted in the log_offsets table (see log_offsets.py).
+# A position is checkpointed after each parsed batch, or, with a positive
+# offset_checkpoint_interval, together with the other changes every that many seconds.
+offset_tracker = FileOffsetTracker(get_db_connection,
+                                   float(rtad_config.get('offset_checkpoint_interval', CHECKPOINT_INTERVAL)))
+atexit.register(offset_tracker.flush)
+
+def read_file_batches(key, file_path, state, final=False):
+    """
+    Yield line batches of file_path from the position stored in `state` (or from the start if
+    it belongs to another file), checkpointing the position under `key` after each batch.
+    `final` marks a file that is no longer written, whose last line may lack a line ending.
+    """
+    with open(file_path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        offset = start_offset(f, stat, state)
+        position = identify(f, stat, offset)
+        for lines, offset in read_line_batches(f, offset, TAILER_CHUNK_SIZE, TAILER_MAX_BATCH_BYTES,
+                                               final=final):
+            yield lines
+            position = position._replace(offset=offset)
+            offset_tracker.update(key, position)
+    # Record the file's identity even if nothing was read, so a later rotation is recognized.
+    offset_tracker.update(key, position)
+
+def read_new_line_batches(file_path):
+    """
+    Yield batches of the lines appended to the file since the last stored offset.
+    If the file was rotated (renamed to file_path.1 or a dateext name and recreated), the rest
+    of the rotated file is read first, including a last line without a line ending; if it was
+    truncated or replaced, reading restarts at 0. The offset is stored after each batch has
+    been processed, so memory stays bounded on large files and a restart resumes where the
+    last batch ended.
     """
     if not os.path.isfile(file_path):
-        return []
-
-    inode = os.stat(file_path).st_ino
-    old_inode, old_offset = offset_tracker.get_offset(file_path)
-
-    # Check for file rotation or truncation.
-    size = os.path.getsize(file_path)
-    if inode != old_inode or size < old_offset:
-        old_offset = 0
-
-    new_lines = []
-    with open(file_path, 'r') as f:
-        f.seek(old_offset)
-        while True:
-            line = f.readline()
-            if not line:
-                break
-            new_lines.append(line.rstrip('\n'))
-
-        new_offset = f.tell()
-    offset_tracker.update_offset(file_path, inode, new_offset)
-    return new_lines
+        return
+    state = offset_tracker.get(file_path)
+    if state is not None:
+        try:
+            stat = os.stat(file_path)
+            replaced = (stat.st_dev, stat.st_ino) != (state.device, state.inode)
+        except OSError:
+            return
+        if replaced:
+            rotated = find_rotated(file_path, state)
+            if rotated is not None:
+                logging.debug("Finishing rotated log %s before %s", rotated, file_path)
+                yield from read_file_batches(file_path, rotated, state, final=True)
+                # The rotated file has been read to its end; a backfill must not import it again.
+                offset_tracker.update(rotated, offset_tracker.get(file_path))
+            state = None
+    try:
+        yield from read_file_batches(file_path, file_path, state)
+    except FileNotFoundError:
+        return
 
 ##################################
 # Log Parsing Classes & Methods
 ##################################
+def store_http_error_log(proxy_type, error_code, url, ip_address, domain, timestamp=None):
+    """
+    Store an HTTP error log in the http_error_logs_cache.
+    Updates a global counter and uses a lock for thread-safety.
+    """
+    global http_error_log_counter
+    ts = normalize_timestamp(timestamp)
+    with http_error_logs_lock:
+        http_error_log_counter += 1
+        entry = {
+            "id": http_error_log_counter,
+            "proxy_type": proxy_type,
+            "error_code": error_code,
+            "timestamp": ts,
+            "url": url,
+            "ip_address": ip_address,
+            "domain": domain,
+            "country": "Unknown",
+            "city": "Unknown",
+            "lat": None,
+            "lon": None
+        }
+        http_error_logs_cache.append(entry)
+    if event_sink is not None:
+        event_sink("http_error", entry)
+    logging.debug("Stored HTTP error log (ID %s): Proxy %s, Code %s, URL %s, IP %s, Domain %s, Timestamp: %s",
+                  http_error_log_counter, proxy_type, error_code, url, ip_address, domain, ts)
+
 class LogParser:
     def __init__(self):
         # Load proxy log configurations from the config file.
         self.proxy_logs = config.get('logfiles', [])
         logging.debug("LogParser initialized with proxy logs: %s", self.proxy_logs)
-        self.debounce_timer = None  # Timer to debounce file system events.
-        self.debounce_lock = threading.Lock()  # Lock for thread-safe debounce timer management.
+        # Watched log files and directories -> proxy_type, for dispatching events per file.
+        self.watched_files = {}
+        self.watched_dirs = {}
+        for log_config in self.proxy_logs:
+            path = log_config.get('path')
+            if not path:
+                continue
+            target = self.watched_dirs if os.path.isdir(path) else self.watched_files
+            target[os.path.abspath(path)] = log_config.get('proxy_type')
+        self.pending_files = {}  # Changed files waiting to be parsed: path -> proxy_type.
+        self.dispatch_timer = None  # Timer that coalesces events before parsing.
+        self.dispatch_lock = threading.Lock()  # Guards pending_files and dispatch_timer.
+        self.parse_lock = threading.Lock()  # Only one dispatch parses at a time.
         self.setup_watchdog()  # Initialize file system watchdog.
 
     def process_log_file(self, file_path, line_processor):
         """
         Process a single log file, reading only new lines and applying the provided line_processor function.
         """
-        new_lines = read_new_lines_from_file(file_path)
-        if new_lines:
-            for line in new_lines:
+        for lines in read_new_line_batches(file_path):
+            for line in lines:
                 line = line.strip()
                 if line:
                     line_processor(line)
@@ -377,15 +393,17 @@ class LogParser:
         Processes proxy logs for HTTP error events and the /var/log/btmp file for failed login attempts.
         """
         logging.debug("Starting parse_log_files")
-        # Process proxy logs.
-        for log_config in self.proxy_logs:
-            path = log_config.get('path')
-            proxy_type = log_config.get('proxy_type')
-            if not os.path.exists(path):
-                logging.warning("Proxy log path does not exist: %s", path)
-                continue
-            files = get_log_files(path)
-            self.process_files_concurrently(files, lambda line: self.process_http_error_log(line, proxy_type))
+        # Process proxy logs (exclusive with event dispatches, so no file is read twice at once).
+        with self.parse_lock:
+            for log_config in self.proxy_logs:
+                path = log_config.get('path')
+                proxy_type = log_config.get('proxy_type')
+                if not os.path.exists(path):
+                    logging.warning("Proxy log path does not exist: %s", path)
+                    continue
+                files = get_log_files(path)
+                self.process_files_concurrently(files, lambda line, proxy_type=proxy_type:
+                                                self.process_http_error_log(line, proxy_type))
 
         # Process failed login attempts from /var/log/btmp.
         self.parse_btmp_file()
@@ -395,32 +413,19 @@ class LogParser:
         Process a single line from an HTTP error log.
         Uses different regex patterns depending on the proxy type.
         """
-        if proxy_type == "zoraxy":
-            match = REGEX_ZORAXY.search(line)
-            if match:
-                ip_address = match.group("ip")
-                url = match.group("url")
-                error_code = int(match.group("code"))
-                domain = match.group("origin")
-            else:
-                logging.debug("No match in zoraxy HTTP error log for line: %s", line)
-                return
-        else:
-            match = REGEX_NPM.search(line)
-            if match:
-                ip_address = match.group("ip")
-                url = match.group("url")
-                error_code = int(match.group("code"))
-                domain = match.group("host") if "host" in match.groupdict() else None
-            else:
-                logging.debug("No match in npm HTTP error log for line: %s", line)
-                return
+        parsed = parse_http_error_line(line, proxy_type)
+        if parsed is None:
+            logging.debug("No match in %s HTTP error log for line: %s", proxy_type, line)
+            return
+        ip_address, url, error_code, domain, timestamp = parsed
 
         parse_all = config.get('parse_all_logs', False)
         if parse_all or error_code >= 400:
             logging.debug("HTTP error log detected: IP %s, Domain %s, URL %s, Code %s, Proxy %s",
                           ip_address, domain, url, error_code, proxy_type)
-            self.store_http_error_log(proxy_type, error_code, url, ip_address, domain)
+            # The time the request was logged, not when the line was read (falls back to now).
+            self.store_http_error_log(proxy_type, error_code, url, ip_address, domain,
+                                      parse_log_timestamp(timestamp))
         else:
             logging.debug("Line does not meet criteria (code < 400 and parse_all_logs is false): %s", line)
 
@@ -441,21 +446,15 @@ class LogParser:
             logging.warning("/var/log/btmp does not exist.")
             return
 
-        # Check file rotation/truncation.
-        inode = os.stat(btmp_path).st_ino
-        old_inode, old_offset = offset_tracker.get_offset(btmp_path)
-        size = os.path.getsize(btmp_path)
-        if inode != old_inode or size < old_offset:
-            old_offset = 0
-
-        # Read the file from the last offset in binary mode.
+        # Read the file from the last offset in binary mode (from 0 after rotation/truncation).
         new_records = []
         with open(btmp_path, "rb") as fd:
-            fd.seek(old_offset)
+            stat = os.fstat(fd.fileno())
+            fd.seek(start_offset(fd, stat, offset_tracker.get(btmp_path)))
             buf = fd.read()
-            new_offset = fd.tell()
+            position = identify(fd, stat, fd.tell())
 
-        offset_tracker.update_offset(btmp_path, inode, new_offset)
+        offset_tracker.update(btmp_path, position)
 
         # Parse the newly read bytes as utmp records.
         try:
@@ -483,7 +482,7 @@ class LogParser:
         ts = normalize_timestamp(timestamp)
         with login_attempts_lock:
             login_attempt_counter += 1
-            login_attempts_cache.append({
+            entry = {
                 "id": login_attempt_counter,
                 "user": user,
                 "ip_address": ip_address,
@@ -493,72 +492,180 @@ class LogParser:
                 "city": "Unknown",
                 "lat": None,
                 "lon": None
-            })
+            }
+            login_attempts_cache.append(entry)
+        if event_sink is not None:
+            event_sink("login", entry)
         logging.debug("Stored failed login attempt (ID %s): User %s, IP %s, Host %s, Timestamp: %s",
                       login_attempt_counter, user, ip_address, host, ts)
 
     def store_http_error_log(self, proxy_type, error_code, url, ip_address, domain, timestamp=None):
         """
         Store an HTTP error log in the http_error_logs_cache.
-        Updates a global counter and uses a lock for thread-safety.
         """
-        global http_error_log_counter
-        ts = normalize_timestamp(timestamp)
-        with http_error_logs_lock:
-            http_error_log_counter += 1
-            http_error_logs_cache.append({
-                "id": http_error_log_counter,
-                "proxy_type": proxy_type,
-                "error_code": error_code,
-                "timestamp": ts,
-                "url": url,
-                "ip_address": ip_address,
-                "domain": domain,
-                "country": "Unknown",
-                "city": "Unknown",
-                "lat": None,
-                "lon": None
-            })
-        logging.debug("Stored HTTP error log (ID %s): Proxy %s, Code %s, URL %s, IP %s, Domain %s, Timestamp: %s",
-                      http_error_log_counter, proxy_type, error_code, url, ip_address, domain, ts)
+        store_http_error_log(proxy_type, error_code, url, ip_address, domain, timestamp)
 
     def setup_watchdog(self):
         """
         Setup a file system watchdog to monitor configured log directories.
-        When a change is detected, a debounced event triggers log parsing.
+        Changes are dispatched per file (see on_modified).
         """
         logging.debug("Setting up Watchdog Observer")
         event_handler = FileSystemEventHandler()
         event_handler.on_modified = self.on_modified
+        event_handler.on_created = self.on_modified
         observer = Observer()
+        directories = set()
         for log_config in self.proxy_logs:
             path = log_config.get('path')
             if os.path.exists(path):
                 # If path is a file, watch its containing directory.
                 directory = path if os.path.isdir(path) else os.path.dirname(path)
+                if directory in directories:
+                    continue
+                directories.add(directory)
                 logging.debug("Scheduling Watchdog for directory: %s", directory)
                 observer.schedule(event_handler, directory, recursive=False)
             else:
                 logging.warning("Watchdog could not schedule non-existent path: %s", path)
         observer.start()
 
+    def resolve_log(self, file_path):
+        """
+        Return (True, proxy_type) if file_path is a configured log or a live log file in a
+        configured directory, (False, None) for any other file.
+        """
+        file_path = os.path.abspath(file_path)
+        if file_path in self.watched_files:
+            return True, self.watched_files[file_path]
+        directory = os.path.dirname(file_path)
+        if directory in self.watched_dirs and not ROTATED_LOG_PATTERN.search(os.path.basename(file_path)):
+            return True, self.watched_dirs[directory]
+        return False, None
+
     def on_modified(self, event):
         """
-        Callback for file system modifications.
-        Uses a debounce timer to avoid processing too frequently.
+        Callback for file system modifications and new files.
+        Marks the changed log for parsing; events within DISPATCH_DELAY seconds are coalesced
+        per file, so a busy log is parsed at most once per delay and other logs are not touched.
         """
         if event.is_directory:
             return
+        watched, proxy_type = self.resolve_log(event.src_path)
+        if not watched:
+            return
         logging.debug("Watchdog: Detected change in file: %s", event.src_path)
-        with self.debounce_lock:
-            if self.debounce_timer is not None:
-                self.debounce_timer.cancel()
-            self.debounce_timer = Timer(1.0, self.parse_log_files)
-            self.debounce_timer.start()
+        with self.dispatch_lock:
+            self.pending_files[os.path.abspath(event.src_path)] = proxy_type
+            if self.dispatch_timer is None:
+                self.dispatch_timer = Timer(DISPATCH_DELAY, self.dispatch_pending)
+                self.dispatch_timer.daemon = True
+                self.dispatch_timer.start()
+
+    def dispatch_pending(self):
+        """
+        Parse the new lines of every file that changed since the last dispatch.
+        """
+        with self.parse_lock:
+            with self.dispatch_lock:
+                pending, self.pending_files = self.pending_files, {}
+                self.dispatch_timer = None
+            for file_path, proxy_type in pending.items():
+                try:
+                    self.process_log_file(file_path, lambda line, proxy_type=proxy_type:
+                                          self.process_http_error_log(line, proxy_type))
+                except Exception as e:
+                    logging.error("Error parsing log file %s: %s", file_path, e)
+
+##################################
+# Archive Backfill
+##################################
+# Archived events are older than anything read live. They are collected here during a backfill
+# (only the newest ones that fit the cache are kept) and then put in front of the live events,
+# into the room the live events leave, so a backfill never evicts a live event.
+backfilled_http_error_logs = deque(maxlen=http_error_logs_cache.maxlen)
+
+def store_backfilled_http_error_log(proxy_type, error_code, url, ip_address, domain, timestamp=None):
+    """
+    Collect one archived HTTP error log for merge_backfilled_http_error_logs().
+    """
+    backfilled_http_error_logs.append({
+        "proxy_type": proxy_type,
+        "error_code": error_code,
+        "timestamp": normalize_timestamp(timestamp),
+        "url": url,
+        "ip_address": ip_address,
+        "domain": domain,
+        "country": "Unknown",
+        "city": "Unknown",
+        "lat": None,
+        "lon": None
+    })
+
+def merge_backfilled_http_error_logs():
+    """
+    Put the collected archived events in front of the live events in http_error_logs_cache,
+    keeping as many of the newest as there is room for.
+    """
+    global http_error_log_counter
+    entries = list(backfilled_http_error_logs)
+    backfilled_http_error_logs.clear()
+    with http_error_logs_lock:
+        room = http_error_logs_cache.maxlen - len(http_error_logs_cache)
+    entries = entries[max(0, len(entries) - room):] if room > 0 else []
+    for entry in entries:
+        try:
+            enrich_event(entry)
+        except Exception as e:
+            logging.error("Error enriching backfilled HTTP error log: %s", e)
+    with http_error_logs_lock:
+        # Live events that arrived meanwhile take precedence.
+        room = http_error_logs_cache.maxlen - len(http_error_logs_cache)
+        entries = entries[max(0, len(entries) - room):] if room > 0 else []
+        for entry in entries:
+            http_error_log_counter += 1
+            entry["id"] = http_error_log_counter
+        http_error_logs_cache.extendleft(reversed(entries))
+    logging.info("Added %d backfilled HTTP error logs", len(entries))
+
+# Worker processes for parsing archives (0 = one per CPU core).
+backfill = LogBackfill(store_backfilled_http_error_log, offset_tracker,
+                       int(rtad_config.get('backfill_workers', 0)) or None,
+                       finish=merge_backfilled_http_error_logs)
+
+def start_backfill():
+    """
+    Start importing the rotated archives of all configured proxy logs in the background.
+    Return False if a backfill is already running.
+    """
+    return backfill.start(config.get('logfiles', []), config.get('parse_all_logs', False))
+
+def get_backfill_progress():
+    """
+    Return the state of the current or last backfill.
+    """
+    return backfill.progress()
 
 #######################
 # Public Fetch Methods
 #######################
+def add_ingested_event(kind, entry):
+    """
+    Add an event received from the ingestion process ('login' or 'http_error') to its cache
+    under a new local ID, so IDs stay increasing when the ingestion process is restarted.
+    """
+    global login_attempt_counter, http_error_log_counter
+    if kind == "login":
+        with login_attempts_lock:
+            login_attempt_counter += 1
+            entry["id"] = login_attempt_counter
+            login_attempts_cache.append(entry)
+    else:
+        with http_error_logs_lock:
+            http_error_log_counter += 1
+            entry["id"] = http_error_log_counter
+            http_error_logs_cache.append(entry)
+
 def fetch_login_attempts():
     """
     Return a copy of the login attempts cache.
@@ -576,6 +683,22 @@ def fetch_http_error_logs():
 ########################
 # Country Info Updater
 ########################
+def enrich_event(entry):
+    """
+    Set country, city, latitude and longitude of a stored event from the GeoIP DB.
+    If the location is missing, fall back to the country's centroid.
+    """
+    info = get_geo_info_cached(entry["ip_address"].strip())
+    if info["lat"] is None or info["lon"] is None:
+        # Fallback to country centroid if detailed location info is missing.
+        lat, lon = get_country_centroid(info["country"])
+        info["lat"] = lat
+        info["lon"] = lon
+    entry["country"] = info["country"]
+    entry["city"] = info["city"]
+    entry["lat"] = info["lat"]
+    entry["lon"] = info["lon"]
+
 def update_missing_country_info():
     """
     For each login attempt or HTTP error log,
@@ -584,31 +707,11 @@ def update_missing_country_info():
     """
     with login_attempts_lock:
         for attempt in login_attempts_cache:
-            ip = attempt["ip_address"].strip()
-            info = get_geo_info_cached(ip)
-            if info["lat"] is None or info["lon"] is None:
-                # Fallback to country centroid if detailed location info is missing.
-                lat, lon = get_country_centroid(info["country"])
-                info["lat"] = lat
-                info["lon"] = lon
-            attempt["country"] = info["country"]
-            attempt["city"] = info["city"]
-            attempt["lat"] = info["lat"]
-            attempt["lon"] = info["lon"]
+            enrich_event(attempt)
 
     with http_error_logs_lock:
         for log in http_error_logs_cache:
-            ip = log["ip_address"].strip()
-            info = get_geo_info_cached(ip)
-            if info["lat"] is None or info["lon"] is None:
-                # Fallback to country centroid if detailed location info is missing.
-                lat, lon = get_country_centroid(info["country"])
-                info["lat"] = lat
-                info["lon"] = lon
-            log["country"] = info["country"]
-            log["city"] = info["city"]
-            log["lat"] = info["lat"]
-            log["lon"] = info["lon"]
+            enrich_event(log)
 
 def update_country_info_job():
     """
@@ -0,0 +1,126 @@
+# simplehostmetrics/scheduler.py
+# This module provides a single-threaded, fixed-rate scheduler for metric samplers.
+# Every sampler has its own interval; due times are derived from a monotonic clock so
+# ticks never drift, and ticks that could not run on time are counted instead of queued.
+
+import logging
+import threading
+import time
+
+
+class Sampler:
+    """
+    A periodic job with its own interval and run statistics.
+    """
+
+    def __init__(self, name, interval, func):
+        if interval <= 0:
+            raise ValueError(f"Sampler {name}: interval must be positive")
+        self.name = name
+        self.interval = float(interval)
+        self.func = func
+        self.next_due = None
+        self.runs = 0
+        self.missed = 0
+        self.errors = 0
+        self.last_run = None
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+
+    def as_dict(self):
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'missed': self.missed,
+            'errors': self.errors,
+            'last_run': self.last_run,
+            'last_duration': round(self.last_duration, 6),
+            'max_duration': round(self.max_duration, 6)
+        }
+
+
+class SamplerScheduler:
+    """
+    Runs all registered samplers from one worker thread.
+
+    Due times advance in whole intervals from the scheduler start (fixed-rate), so the time
+    spent sampling does not shift later ticks. If a sampler falls behind by one or more
+    intervals the skipped ticks are counted in `missed` and it resumes at the next slot.
+    After every wake-up that ran at least one sampler, on_tick(now) is called once.
+    """
+
+    def __init__(self, on_tick=None, clock=time.monotonic, wall_clock=time.time):
+        self.samplers = []
+        self.on_tick = on_tick
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self.stop_event = threading.Event()
+        self.ticks = 0
+        self.started = None
+
+    def add(self, name, interval, func):
+        sampler = Sampler(name, interval, func)
+        self.samplers.append(sampler)
+        return sampler
+
+    def run_due(self, now_mono):
+        """
+        Run every sampler that is due at `now_mono`. Returns True if any sampler ran.
+        """
+        wall_now = self.wall_clock()
+        ran = False
+        for sampler in self.samplers:
+            if sampler.next_due is None:
+                sampler.next_due = now_mono
+            if sampler.next_due > now_mono:
+                continue
+            started = self.clock()
+            try:
+                sampler.func(wall_now)
+            except Exception as e:
+                sampler.errors += 1
+                logging.error("Sampler %s failed: %s", sampler.name, e)
+            sampler.last_duration = self.clock() - started
+            sampler.max_duration = max(sampler.max_duration, sampler.last_duration)
+            sampler.last_run = wall_now
+            sampler.runs += 1
+            ran = True
+            # Advance on the fixed grid; count slots that already passed as missed.
+            sampler.next_due += sampler.interval
+            if sampler.next_due <= now_mono:
+                behind = int((now_mono - sampler.next_due) // sampler.interval) + 1
+                sampler.missed += behind
+                sampler.next_due += behind * sampler.interval
+        if ran:
+            self.ticks += 1
+            if self.on_tick is not None:
+                try:
+                    self.on_tick(wall_now)
+                except Exception as e:
+                    logging.error("Scheduler tick handler failed: %s", e)
+        return ran
+
+    def run_forever(self):
+        """
+        Run samplers until stop() is called.
+        """
+        self.started = self.wall_clock()
+        while not self.stop_event.is_set():
+            self.run_due(self.clock())
+            due = [s.next_due for s in self.samplers if s.next_due is not None]
+            if not due:
+                self.stop_event.wait(1.0)
+                continue
+            delay = min(due) - self.clock()
+            if delay > 0:
+                self.stop_event.wait(delay)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stats(self):
+        return {
+            'started': self.started,
+            'ticks': self.ticks,
+            'samplers': {s.name: s.as_dict() for s in self.samplers}
+        }
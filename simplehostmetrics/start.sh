@@ -2,5 +2,6 @@
 killall "gunicorn: master"
 mkdir /usr/share/GeoIP/ -p
 
-# Run Gunicorn with forwarded headers settings for proxy
-gunicorn --workers 1 --bind 0.0.0.0:5000 --forwarded-allow-ips="*" app:app
+# Run Gunicorn with forwarded headers settings for proxy.
+# Threaded worker: each open /stats/api/stream (Server-Sent Events) connection holds one thread.
+gunicorn --workers 1 --worker-class gthread --threads 64 --bind 0.0.0.0:5000 --forwarded-allow-ips="*" app:app
@@ -1,104 +1,207 @@
 // simplehostmetrics.refac/static/stats.js
 
 function updateStats() {
-  // Use relative URL to avoid protocol issues with HTTPS - without trailing slash
-  fetch("/stats")
+  // Pre-encoded snapshot; the browser revalidates it with If-None-Match
+  fetch("/stats/api/snapshot")
+    .then((r) => r.json())
+    .then(renderStats)
+    .catch((err) => console.error("Error fetching stats:", err));
+}
+
+// Live chart histories. They are loaded once from /stats/api/history; after that every
+// stats event carries the samples added since the previous event (data.history), which are
+// appended directly. Only when events were missed is /stats/api/history asked for the
+// points since our cursor, and only a resync (restart, evicted cursor) reloads everything.
+const HISTORY_FAMILIES = "cpu,memory,disk,network";
+const liveHistory = {
+  cursor: null,
+  epoch: null,
+  maxPoints: 30,
+  series: {}, // cpu, memory, disk, network.<iface> -> {time: [...], field: [...]}
+  pending: false,
+};
+
+function recordsToColumns(records, fields) {
+  const columns = { time: records.map((e) => e.time) };
+  fields.forEach((field) => {
+    columns[field] = records.map((e) => e[field]);
+  });
+  return columns;
+}
+
+function loadFullHistory() {
+  return fetch("/stats/api/history")
     .then((r) => r.json())
     .then((data) => {
-      window.cachedStats = data;
-      const system = data.system || {};
-      
-      // Check if system detail view is visible
-      const systemDetailViewVisible = document.getElementById("system-detail-view").style.display === "block";
-
-      // CPU
-      cpuOverlay.textContent = Math.round(system.cpu || 0) + "%";
-      if (system.cpu_history && system.cpu_history.usage) {
-        cpuChart.data.labels = system.cpu_history.time;
-        cpuChart.data.datasets[0].data = system.cpu_history.usage;
-        cpuChart.update();
-      }
-      if (system.cpu_details && system.cpu_details.history24h && systemDetailViewVisible) {
-        cpuDetailChart.data.labels = system.cpu_details.history24h.map(
-          (e) => e.time,
-        );
-        cpuDetailChart.data.datasets[0].data =
-          system.cpu_details.history24h.map((e) => e.usage);
-        cpuDetailChart.update();
-      }
+      liveHistory.cursor = data.cursor;
+      liveHistory.epoch = data.epoch;
+      liveHistory.maxPoints = data.max_points || liveHistory.maxPoints;
+      liveHistory.series = {
+        cpu: data.cpu_history,
+        memory: data.memory_history_basic,
+        disk: data.disk_history_basic,
+      };
+      Object.entries(data.network_history || {}).forEach(([iface, records]) => {
+        liveHistory.series["network." + iface] = recordsToColumns(records, ["input", "output"]);
+      });
+    });
+}
 
-      // Memory
-      if (system.memory_history) {
-        memoryBasicChart.data.labels = system.memory_history.time;
-        memoryBasicChart.data.datasets[0].data = system.memory_history.free;
-        memoryBasicChart.data.datasets[1].data = system.memory_history.used.map(val => Math.abs(val));
-        memoryBasicChart.data.datasets[2].data = system.memory_history.cached;
-        if (system.memory && system.memory.total) {
-          memoryBasicChart.options.scales.y.max = system.memory.total;
-        }
-        memoryBasicChart.update();
-      }
-      if (system.memory) {
-        memoryOverlay.textContent = Math.abs(system.memory.used || 0).toFixed(2) + " GB";
-      }
-      if (system.memory_details && system.memory_details.history24h && systemDetailViewVisible) {
-        memoryDetailChart.data.labels = system.memory_details.history24h.map(
-          (e) => e.time,
-        );
-        memoryDetailChart.data.datasets[0].data =
-          system.memory_details.history24h.map((e) => Math.abs(e.usage));
-        memoryDetailChart.update();
-      }
+function appendHistory(name, points, after) {
+  // Samples are identified by their sequence number; those up to our cursor are already here.
+  const keep = [];
+  points.seq.forEach((seq, index) => {
+    if (seq > after) keep.push(index);
+  });
+  if (!keep.length) return;
+  let local = liveHistory.series[name];
+  if (!local) {
+    local = liveHistory.series[name] = {};
+    Object.keys(points).forEach((field) => {
+      if (field !== "seq" && field !== "timestamp") local[field] = [];
+    });
+  }
+  Object.keys(local).forEach((field) => {
+    if (!points[field]) return;
+    keep.forEach((index) => local[field].push(points[field][index]));
+    if (local[field].length > liveHistory.maxPoints) {
+      local[field].splice(0, local[field].length - liveHistory.maxPoints);
+    }
+  });
+}
 
-      // Disk
-      if (system.disk_history_basic) {
-        diskBasicChart.data.labels = system.disk_history_basic.time;
-        diskBasicChart.data.datasets[0].data = system.disk_history_basic.used;
-        diskBasicChart.data.datasets[1].data = system.disk_history_basic.free;
-        if (system.disk && system.disk.total) {
-          diskBasicChart.options.scales.y.max = system.disk.total;
-        }
-        diskBasicChart.update();
-      }
-      if (system.disk) {
-        diskOverlay.textContent = (system.disk.used || 0).toFixed(2) + " GB";
-      }
-      if (system.disk_details && system.disk_details.history && systemDetailViewVisible) {
-        diskHistoryChart.data.labels = system.disk_details.history.map(
-          (e) => e.time,
-        );
-        diskHistoryChart.data.datasets[0].data =
-          system.disk_details.history.map((e) => e.used);
-        diskHistoryChart.update();
-      }
+function applyHistory(data) {
+  const after = liveHistory.cursor;
+  Object.entries(data.series || {}).forEach(([name, points]) => appendHistory(name, points, after));
+  liveHistory.cursor = Math.max(after, data.cursor);
+}
 
-      // Network
-      if (data.network && data.network.interfaces) {
-        const interfaces = data.network.interfaces;
-        let mainIface = null;
-        Object.keys(interfaces).forEach((k) => {
-          if (/^e/.test(k) && !mainIface) mainIface = k;
-        });
-        if (!mainIface) {
-          mainIface = Object.keys(interfaces)[0] || null;
-        }
-        if (
-          mainIface &&
-          interfaces[mainIface] &&
-          interfaces[mainIface].length
-        ) {
-          const arr = interfaces[mainIface];
-          networkChart.data.labels = arr.map((e) => e.time);
-          networkChart.data.datasets[0].data = arr.map((e) => e.input);
-          networkChart.data.datasets[1].data = arr.map((e) => e.output);
-          networkChart.update();
-        }
-      }
+function fetchHistorySince() {
+  const params = new URLSearchParams({
+    since: liveHistory.cursor,
+    epoch: liveHistory.epoch,
+    series: HISTORY_FAMILIES,
+  });
+  return fetch("/stats/api/history?" + params)
+    .then((r) => r.json())
+    .then((data) => (data.resync ? loadFullHistory() : applyHistory(data)));
+}
 
-      // Update Docker data
-      updateDockerData();
-    })
-    .catch((err) => console.error("Error fetching stats:", err));
+function updateHistory(increment) {
+  if (liveHistory.pending) return;
+  let request = null;
+  if (liveHistory.cursor === null || !increment || increment.epoch !== liveHistory.epoch || increment.resync) {
+    request = loadFullHistory();
+  } else if (increment.since > liveHistory.cursor) {
+    // Missed events (e.g. polling slower than the collector): ask for the gap.
+    request = fetchHistorySince();
+  } else {
+    applyHistory(increment);
+    renderHistoryCharts();
+    return;
+  }
+  liveHistory.pending = true;
+  request
+    .then(renderHistoryCharts)
+    .catch((err) => console.error("Error fetching history:", err))
+    .finally(() => {
+      liveHistory.pending = false;
+    });
+}
+
+function renderHistoryCharts() {
+  const system = (window.cachedStats && window.cachedStats.system) || {};
+  const series = liveHistory.series;
+
+  if (series.cpu && series.cpu.usage) {
+    cpuChart.data.labels = series.cpu.time;
+    cpuChart.data.datasets[0].data = series.cpu.usage;
+    cpuChart.update();
+  }
+
+  if (series.memory) {
+    memoryBasicChart.data.labels = series.memory.time;
+    memoryBasicChart.data.datasets[0].data = series.memory.free;
+    memoryBasicChart.data.datasets[1].data = series.memory.used.map(val => Math.abs(val));
+    memoryBasicChart.data.datasets[2].data = series.memory.cached;
+    if (system.memory && system.memory.total) {
+      memoryBasicChart.options.scales.y.max = system.memory.total;
+    }
+    memoryBasicChart.update();
+  }
+
+  if (series.disk) {
+    diskBasicChart.data.labels = series.disk.time;
+    diskBasicChart.data.datasets[0].data = series.disk.used;
+    diskBasicChart.data.datasets[1].data = series.disk.free;
+    if (system.disk && system.disk.total) {
+      diskBasicChart.options.scales.y.max = system.disk.total;
+    }
+    diskBasicChart.update();
+  }
+
+  const interfaces = Object.keys(series)
+    .filter((name) => name.startsWith("network."))
+    .map((name) => name.slice("network.".length));
+  const mainIface = interfaces.find((k) => /^e/.test(k)) || interfaces[0];
+  if (mainIface && series["network." + mainIface].time.length) {
+    const net = series["network." + mainIface];
+    networkChart.data.labels = net.time;
+    networkChart.data.datasets[0].data = net.input;
+    networkChart.data.datasets[1].data = net.output;
+    networkChart.update();
+  }
+}
+
+function renderStats(data) {
+  window.cachedStats = data;
+  const system = data.system || {};
+  
+  // Check if system detail view is visible
+  const systemDetailViewVisible = document.getElementById("system-detail-view").style.display === "block";
+
+  // CPU
+  cpuOverlay.textContent = Math.round(system.cpu || 0) + "%";
+  if (system.cpu_details && system.cpu_details.history24h && systemDetailViewVisible) {
+    cpuDetailChart.data.labels = system.cpu_details.history24h.map(
+      (e) => e.time,
+    );
+    cpuDetailChart.data.datasets[0].data =
+      system.cpu_details.history24h.map((e) => e.usage);
+    cpuDetailChart.update();
+  }
+
+  // Memory
+  if (system.memory) {
+    memoryOverlay.textContent = Math.abs(system.memory.used || 0).toFixed(2) + " GB";
+  }
+  if (system.memory_details && system.memory_details.history24h && systemDetailViewVisible) {
+    memoryDetailChart.data.labels = system.memory_details.history24h.map(
+      (e) => e.time,
+    );
+    memoryDetailChart.data.datasets[0].data =
+      system.memory_details.history24h.map((e) => Math.abs(e.usage));
+    memoryDetailChart.update();
+  }
+
+  // Disk
+  if (system.disk) {
+    diskOverlay.textContent = (system.disk.used || 0).toFixed(2) + " GB";
+  }
+  if (system.disk_details && system.disk_details.history && systemDetailViewVisible) {
+    diskHistoryChart.data.labels = system.disk_details.history.map(
+      (e) => e.time,
+    );
+    diskHistoryChart.data.datasets[0].data =
+      system.disk_details.history.map((e) => e.used);
+    diskHistoryChart.update();
+  }
+
+  // Live charts: append the samples this event carries
+  updateHistory(data.history);
+
+  // Update Docker data
+  updateDockerData();
 }
 
 // Function to fetch Docker container data from the new endpoint
@@ -184,6 +287,40 @@ function updateDockerData() {
     });
 }
 
-// Updated polling interval from 500ms to 1000ms
-setInterval(updateStats, 1000);
-updateStats();
+// Live updates: the server pushes one snapshot per collector tick over
+// Server-Sent Events. Fall back to polling every 1000ms if the stream is
+// unavailable (old browser, proxy buffering, subscriber limit reached).
+let statsPollInterval = null;
+
+function startStatsPolling() {
+  if (statsPollInterval) return;
+  statsPollInterval = setInterval(updateStats, 1000);
+  updateStats();
+}
+
+function startStatsStream() {
+  if (!window.EventSource) {
+    startStatsPolling();
+    return;
+  }
+  const source = new EventSource("/stats/api/stream");
+  let received = false;
+  source.addEventListener("stats", (event) => {
+    received = true;
+    try {
+      renderStats(JSON.parse(event.data));
+    } catch (err) {
+      console.error("Error handling stats event:", err);
+    }
+  });
+  source.onerror = () => {
+    // EventSource reconnects on its own once it was working; if the stream
+    // never delivered anything, give up and poll instead.
+    if (!received) {
+      source.close();
+      startStatsPolling();
+    }
+  };
+}
+
+startStatsStream();
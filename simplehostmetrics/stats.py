@@ -1,118 +1,172 @@
 # simplehostmetrics.refac/stats.py
+import atexit
 import time
 import threading
 import logging
+import gzip
+import json
 import psutil
-import datetime
+import yaml
+from array import array
+from collections import namedtuple
 from database import get_db_connection
-from queue import Queue, Empty
+from db_writer import create_db_writer
+from chunk_store import ChunkWriter, INSERT_CHUNK_SQL
+from timeseries import TimeSeries, SeriesStore
+from rollup import RollupEngine, load_tier_spec
+from retention import create_retention_engine
+from maintenance import create_maintenance
+from warm_start import create_warm_start
+from scheduler import SamplerScheduler
+from stats_stream import StreamHub, encode_event
+from cpu_sampler import cpu_sampler
+from disk_io_sampler import DiskIoSampler, DISK_IO_FIELDS
+from process_sampler import create_process_sampler
 
-MAX_HISTORY = 30
-MAX_HISTORY_EXT_CPU = 24   # 24h CPU-Graph
-MAX_HISTORY_EXT_DISK = 28  # 7d Disk-Graph (6h-Intervall)
-NETWORK_UPDATE_INTERVAL = 1.0  # seconds
+MAX_HISTORY = 30           # Points shown in the live dashboard charts
+DETAIL_SPAN_CPU = 24 * 3600      # 24h CPU/Memory detail graphs
+DETAIL_SPAN_DISK = 7 * 24 * 3600  # 7d Disk detail graph
+DETAIL_MAX_POINTS = 200          # Upper bound of buckets per detail graph
+ROLLUP_FLUSH_BATCH = 50        # Finished rollup buckets written per batch
+ROLLUP_FLUSH_INTERVAL = 60.0   # Max seconds finished buckets wait before being written
 
-# Global DB queue for offloading operations
-db_queue = Queue()
+# Load configuration from config.yml.
+with open('config.yml', 'r') as f:
+    config = yaml.safe_load(f) or {}
+
+stats_config = config.get('stats', {}) or {}
+
+# Ring buffer capacity (number of samples) kept in memory per series.
+DEFAULT_HISTORY_CAPACITY = 3600
+history_capacity = stats_config.get('history_capacity', {}) or {}
+
+def get_history_capacity(series):
+    """
+    Return the configured in-memory capacity for a series, never less than MAX_HISTORY.
+    """
+    capacity = history_capacity.get(series, history_capacity.get('default', DEFAULT_HISTORY_CAPACITY))
+    return max(int(capacity), MAX_HISTORY)
+
+# Sampling interval (seconds) per metric family.
+DEFAULT_SAMPLE_INTERVALS = {'cpu': 1.0, 'memory': 1.0, 'disk': 30.0, 'disk_io': 5.0, 'network': 1.0, 'processes': 5.0}
+sample_intervals = dict(DEFAULT_SAMPLE_INTERVALS, **(stats_config.get('intervals', {}) or {}))
+
+# Single writer thread for all metric inserts and maintenance tasks
+db_writer = create_db_writer(get_db_connection, stats_config.get('db_writer', {}) or {})
+db_writer.start()
 
 def queue_query(sql, params):
-    db_queue.put((sql, params))
-
-def db_worker():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    BATCH_SIZE = 20  # Number of queries to batch together
-    while True:
-        batch = []
-        try:
-            # Wait for at least one query; timeout after 10 seconds if none are queued
-            item = db_queue.get(timeout=10)
-            batch.append(item)
-        except Empty:
-            # If no query appears within timeout, commit any accumulated batch (if any) and continue
-            if batch:
-                for sql, params in batch:
-                    cursor.execute(sql, params)
-                conn.commit()
-            continue
+    db_writer.execute(sql, params)
+
+def queue_many(sql, rows):
+    """
+    Queue one statement for a list of parameter tuples; it is run with executemany.
+    """
+    db_writer.executemany(sql, rows)
+
+def queue_task(func):
+    """
+    Queue a callable that is run on the DB writer thread as func(cursor).
+    """
+    db_writer.submit(func)
 
-        # Try to get additional items without waiting
-        while len(batch) < BATCH_SIZE:
-            try:
-                item = db_queue.get_nowait()
-                batch.append(item)
-            except Empty:
-                break
-
-        for sql, params in batch:
-            try:
-                cursor.execute(sql, params)
-            except Exception as e:
-                logging.error("DB operation failed: %s; SQL: %s; Params: %s", e, sql, params)
-        conn.commit()
-
-# Start the DB worker thread
-db_worker_thread = threading.Thread(target=db_worker, daemon=True)
-db_worker_thread.start()
-
-# Global in-memory caches and histories for system metrics
+# Global in-memory caches and histories for system metrics.
+# cached_stats is replaced (never mutated) on every tick, so readers always see a consistent tick.
 cached_stats = {
     'system': {},
     'docker': [],
-    'network': {'interfaces': {}}
+    'network': {'interfaces': []}
 }
 
-cpu_history = {'time': [], 'usage': []}
-memory_history_basic = {'time': [], 'free': [], 'used': [], 'cached': []}
-disk_history_basic = {'time': [], 'total': [], 'used': [], 'free': []}
-cpu_history_24h = []
-memory_history_24h = []
-disk_history = []
-network_history = {}
+# Immutable, pre-encoded version of cached_stats published once per tick.
+StatsSnapshot = namedtuple('StatsSnapshot', ['version', 'etag', 'timestamp', 'body', 'gzip_body', 'frame'])
+SNAPSHOT_GZIP = bool(stats_config.get('snapshot_gzip', True))
+SNAPSHOT_GZIP_LEVEL = 5
+# Prefix for ETags so versions from a previous process never match after a restart.
+SNAPSHOT_EPOCH = format(int(time.time()), 'x')
+snapshot = None
+# Series families whose new samples are part of every snapshot (the live dashboard charts),
+# and the history cursor the last snapshot was published at.
+LIVE_HISTORY_FAMILIES = ('cpu', 'memory', 'disk', 'network')
+published_history_cursor = None
+
+# Server-Sent Events hub; every snapshot is pushed to all stream subscribers.
+stream_config = stats_config.get('stream', {}) or {}
+STREAM_HEARTBEAT = float(stream_config.get('heartbeat', 15))
+stream_hub = StreamHub(buffer_size=int(stream_config.get('buffer_size', 8)),
+                       max_subscribers=int(stream_config.get('max_subscribers', 50)))
+
+cpu_history = TimeSeries(('usage',), get_history_capacity('cpu'))
+memory_history_basic = TimeSeries(('free', 'used', 'cached'), get_history_capacity('memory'))
+disk_history_basic = TimeSeries(('total', 'used', 'free'), get_history_capacity('disk'))
+network_history = SeriesStore(('input', 'output'), get_history_capacity('network'))
+
+# Per-core CPU and per-device disk I/O: one float32 ring buffer row per tick,
+# with a single shared timestamp column instead of one series per core.
+cpu_core_history = TimeSeries(tuple(str(core) for core in range(cpu_sampler.cores or 1)),
+                              get_history_capacity('cpu_cores'), typecode='f')
+disk_io_history = SeriesStore(DISK_IO_FIELDS, get_history_capacity('disk_io'), typecode='f')
+disk_io_sampler = DiskIoSampler()
 
-# Aggregators for extended views
-cpu_24h_aggregator = {'current_hour': None, 'sum': 0.0, 'count': 0}
-mem_24h_aggregator = {'current_hour': None, 'sum': 0.0, 'count': 0}
-disk_7d_aggregator = {'current_6hour': None, 'sum': 0.0, 'count': 0}
+# Multi-resolution rollups (min/max/avg/count/last per bucket) for the extended views
+rollups = RollupEngine(load_tier_spec(stats_config))
+last_rollup_flush = time.time()
+
+# Raw samples are persisted as one metric_chunks row per series and CHUNK_SPAN window.
+# Series names match history_series(). Open chunks are written when their window ends
+# and on shutdown (registered after the DB writer, so atexit runs it before the writer's flush).
+chunks = ChunkWriter(lambda rows: queue_many(INSERT_CHUNK_SQL, rows))
+atexit.register(chunks.flush)
+
+# Age-based trimming of the history tables and rollup tiers, run in periodic batched sweeps
+retention = create_retention_engine(stats_config, rollups.tiers)
+
+# Incremental vacuum and ANALYZE in small steps, queued while the DB writer is idle
+maintenance = create_maintenance(db_writer, stats_config)
+
+# Binary snapshot of the ring buffers and open rollup buckets for instant warm starts
+warm_start = create_warm_start(stats_config)
+
+# Latest raw sample per metric family, written by the samplers
+latest = {'cpu': None, 'memory': None, 'disk': None}
 
 prev_net_io = None
 prev_net_time = None
-last_network_update = 0
+
+# Background process-table sampler (per-PID CPU/IO deltas, top-N, per-process history)
+process_sampler = create_process_sampler(stats_config.get('processes', {}) or {})
+
+# Scheduler that runs all samplers from the collector thread
+scheduler = None
+collector_thread = None
+# Seconds shutdown waits for the collector thread to finish its current tick
+COLLECTOR_JOIN_TIMEOUT = 10.0
+
+def format_rollup_history(metric, span, value_key, time_format='%H:%M'):
+    """
+    Format a metric's rollup buckets covering `span` seconds for the detail charts.
+    `value_key` carries the bucket average; min/max are kept so short spikes stay visible.
+    """
+    tier = rollups.tier_for(span, DETAIL_MAX_POINTS)
+    limit = max(1, span // tier.interval)
+    return [{
+        'time': bucket['time'],
+        value_key: round(bucket['avg'], 2),
+        'min': round(bucket['min'], 2),
+        'max': round(bucket['max'], 2)
+    } for bucket in rollups.history(tier.name, metric, limit, time_format)]
 
 def get_cpu_details():
     try:
         load15 = psutil.getloadavg()[2]
     except Exception:
         load15 = 0
-    if not cpu_history_24h:
-        current_usage = psutil.cpu_percent()
-        cpu_history_24h.insert(0, {'time': time.time(), 'usage': current_usage})
-    history_formatted = [{
-        'time': datetime.datetime.fromtimestamp(e['time']).strftime('%H:%M'),
-        'usage': e['usage']
-    } for e in cpu_history_24h]
-    return {'load15': load15, 'history24h': history_formatted}
+    return {'load15': load15, 'history24h': format_rollup_history('cpu.usage', DETAIL_SPAN_CPU, 'usage')}
 
 def get_memory_details():
-    if not memory_history_24h:
-        mem = psutil.virtual_memory()
-        mem_used_gb = round(mem.used / (1024 ** 3), 2)
-        memory_history_24h.insert(0, {'time': time.time(), 'usage': mem_used_gb})
-    history_formatted = [{
-        'time': datetime.datetime.fromtimestamp(e['time']).strftime('%H:%M'),
-        'usage': e['usage']
-    } for e in memory_history_24h]
-    return {'history24h': history_formatted}
-
-def get_disk_details():
-    disk = psutil.disk_usage('/')
-    if not disk_history:
-        disk_used_gb = round(disk.used / (1024 ** 3), 2)
-        disk_history.insert(0, {'time': time.time(), 'used': disk.used})
-    history = [{
-        'time': datetime.datetime.fromtimestamp(entry['time']).strftime('%m-%d %H:%M'),
-        'used': round(entry['used'] / (1024 ** 3), 2)
-    } for entry in disk_history]
+    return {'history24h': format_rollup_history('memory.used', DETAIL_SPAN_CPU, 'usage')}
+
+def get_disk_details(disk):
     return {
         'root': {
             'total': round(disk.total / (1024 ** 3), 2),
@@ -120,230 +174,279 @@ def get_disk_details():
             'free': round(disk.free / (1024 ** 3), 2),
             'percent': disk.percent
         },
+        'history': format_rollup_history('disk.used', DETAIL_SPAN_DISK, 'used', '%m-%d %H:%M')
+    }
+
+def flush_rollups(now, force=False):
+    """
+    Write finished rollup buckets to the database in batches.
+    """
+    global last_rollup_flush
+    if not force and len(rollups.pending) < ROLLUP_FLUSH_BATCH and (now - last_rollup_flush) < ROLLUP_FLUSH_INTERVAL:
+        return
+    last_rollup_flush = now
+    finished = rollups.drain()
+    if not finished:
+        return
+    queue_many(
+        """INSERT INTO metric_rollups (metric, tier, timestamp, min, max, avg, count, last)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", finished
+    )
+
+def sample_cpu(now):
+    cpu_percent = cpu_sampler.sample(now)
+    latest['cpu'] = cpu_percent
+    cpu_history.append(now, cpu_percent)
+    chunks.append('cpu', cpu_history.fields, now, (cpu_percent,))
+    per_core = cpu_sampler.per_core
+    if len(per_core) == len(cpu_core_history.fields):
+        cpu_core_history.append(now, *per_core)
+        chunks.append('cpu_cores', cpu_core_history.fields, now, per_core)
+    rollups.add('cpu.usage', now, cpu_percent)
+
+def sample_memory(now):
+    mem = psutil.virtual_memory()
+    latest['memory'] = mem
+    cached_val = getattr(mem, 'cached', 0)
+    cached_GB = round(cached_val / (1024 ** 3), 2)
+    used_no_cache_GB = round((mem.used - cached_val) / (1024 ** 3), 2)
+    free_GB = round(mem.free/(1024**3), 2)
+    memory_history_basic.append(now, free_GB, used_no_cache_GB, cached_GB)
+    chunks.append('memory', memory_history_basic.fields, now, (free_GB, used_no_cache_GB, cached_GB))
+    rollups.add('memory.used', now, round(mem.used/(1024**3), 2))
+    rollups.add('memory.free', now, free_GB)
+    rollups.add('memory.cached', now, cached_GB)
+
+def sample_disk(now):
+    disk = psutil.disk_usage('/')
+    latest['disk'] = disk
+    total_disk_GB = round(disk.total/(1024**3), 2)
+    used_disk_GB = round(disk.used/(1024**3), 2)
+    free_disk_GB = round(disk.free/(1024**3), 2)
+    disk_history_basic.append(now, total_disk_GB, used_disk_GB, free_disk_GB)
+    chunks.append('disk', disk_history_basic.fields, now, (total_disk_GB, used_disk_GB, free_disk_GB))
+    rollups.add('disk.used', now, used_disk_GB)
+    rollups.add('disk.free', now, free_disk_GB)
+
+def sample_disk_io(now):
+    rates = disk_io_sampler.sample(now)
+    for device, values in rates.items():
+        disk_io_history.append(device, now, *values)
+        chunks.append(f'disk_io.{device}', disk_io_history.fields, now, values)
+
+def sample_network(now):
+    global prev_net_io, prev_net_time
+    net_current = psutil.net_io_counters(pernic=True)
+    if prev_net_io is not None and prev_net_time is not None:
+        dt = now - prev_net_time
+        if dt > 0:
+            for iface, stats_net in net_current.items():
+                prev_stats = prev_net_io.get(iface)
+                if prev_stats:
+                    input_speed = (stats_net.bytes_recv - prev_stats.bytes_recv) / (dt * (1024 * 1024))
+                    output_speed = (stats_net.bytes_sent - prev_stats.bytes_sent) / (dt * (1024 * 1024))
+                    if input_speed < 0.0001:
+                        input_speed = 0
+                    if output_speed < 0.0001:
+                        output_speed = 0
+                    network_history.append(iface, now, input_speed, output_speed)
+                    rollups.add(f'net.{iface}.input', now, input_speed)
+                    rollups.add(f'net.{iface}.output', now, output_speed)
+                    chunks.append(f'network.{iface}', network_history.fields, now, (input_speed, output_speed))
+    prev_net_io = net_current
+    prev_net_time = now
+
+def sweep_retention(now):
+    """
+    Queue a retention sweep; it runs on the DB writer thread inside a write batch.
+    """
+    queue_task(retention.sweep)
+
+def publish_stats(now):
+    """
+    Close expired rollup buckets and rebuild the in-memory cache used by the API.
+    Runs once per scheduler tick, after the samplers that were due.
+    """
+    global cached_stats, published_history_cursor
+    rollups.roll(now)
+    flush_rollups(now)
+    chunks.seal_expired(now)
+    mem = latest['memory']
+    disk = latest['disk']
+    if mem is None or disk is None:
+        return
+
+    system = {
+        'cpu': latest['cpu'] or 0,
+        'cpu_cores': [round(value, 1) for value in cpu_sampler.per_core],
+        'memory': {
+            'percent': mem.percent,
+            'total': round(mem.total/(1024**3), 2),
+            'used': round(mem.used/(1024**3), 2),
+            'free': round(mem.free/(1024**3), 2),
+            'cached': round(getattr(mem, 'cached', 0)/(1024**3), 2)
+        },
+        'disk': {
+            'percent': disk.percent,
+            'total': round(disk.total/(1024**3), 2),
+            'used': round(disk.used/(1024**3), 2),
+            'free': round(disk.free/(1024**3), 2)
+        },
+        'cpu_details': get_cpu_details(),
+        'memory_details': get_memory_details(),
+        'disk_details': get_disk_details(disk)
+    }
+    # The live chart histories are kept by the dashboard itself; every snapshot carries only
+    # the samples added since the previous one (see history_since()), so each stream event
+    # extends the charts without a request per viewer.
+    since = published_history_cursor if published_history_cursor is not None else history_cursor()
+    history = history_since(since, SNAPSHOT_EPOCH, LIVE_HISTORY_FAMILIES)
+    history['since'] = since
+    published_history_cursor = history['cursor']
+    cached_stats = {
+        'system': system,
+        'docker': [],
+        'network': {'interfaces': sorted(iface for iface, _ in network_history.items())},
         'history': history
     }
+    publish_snapshot(cached_stats, now)
 
-def update_aggregators(cpu_percent, mem_used_gb, disk_used):
-    now = int(time.time())
-    current_hour = now - (now % 3600)
-    # CPU aggregator
-    if cpu_24h_aggregator['current_hour'] is None:
-        cpu_24h_aggregator['current_hour'] = current_hour
-        cpu_24h_aggregator['sum'] = cpu_percent
-        cpu_24h_aggregator['count'] = 1
-    else:
-        if current_hour == cpu_24h_aggregator['current_hour']:
-            cpu_24h_aggregator['sum'] += cpu_percent
-            cpu_24h_aggregator['count'] += 1
-        else:
-            avg_usage = (cpu_24h_aggregator['sum'] / cpu_24h_aggregator['count']) if cpu_24h_aggregator['count'] else 0
-            queue_query("INSERT INTO cpu_history_24h (timestamp, usage) VALUES (?, ?)",
-                        (float(cpu_24h_aggregator['current_hour']), avg_usage))
-            cutoff = time.time() - (24 * 3600)
-            queue_query("DELETE FROM cpu_history_24h WHERE timestamp < ?", (cutoff,))
-            cpu_24h_aggregator['current_hour'] = current_hour
-            cpu_24h_aggregator['sum'] = cpu_percent
-            cpu_24h_aggregator['count'] = 1
-
-    # Memory aggregator
-    if mem_24h_aggregator['current_hour'] is None:
-        mem_24h_aggregator['current_hour'] = current_hour
-        mem_24h_aggregator['sum'] = mem_used_gb
-        mem_24h_aggregator['count'] = 1
-    else:
-        if current_hour == mem_24h_aggregator['current_hour']:
-            mem_24h_aggregator['sum'] += mem_used_gb
-            mem_24h_aggregator['count'] += 1
-        else:
-            avg_mem_usage = (mem_24h_aggregator['sum'] / mem_24h_aggregator['count']) if mem_24h_aggregator['count'] else 0
-            queue_query("INSERT INTO memory_history_24h (timestamp, usage) VALUES (?, ?)",
-                        (float(mem_24h_aggregator['current_hour']), avg_mem_usage))
-            cutoff = time.time() - (24 * 3600)
-            queue_query("DELETE FROM memory_history_24h WHERE timestamp < ?", (cutoff,))
-            mem_24h_aggregator['current_hour'] = current_hour
-            mem_24h_aggregator['sum'] = mem_used_gb
-            mem_24h_aggregator['count'] = 1
-
-    # Disk aggregator (6-hour intervals)
-    current_6hour = now // 21600
-    if disk_7d_aggregator['current_6hour'] is None:
-        disk_7d_aggregator['current_6hour'] = current_6hour
-        disk_7d_aggregator['sum'] = disk_used
-        disk_7d_aggregator['count'] = 1
-    else:
-        if current_6hour == disk_7d_aggregator['current_6hour']:
-            disk_7d_aggregator['sum'] += disk_used
-            disk_7d_aggregator['count'] += 1
-        else:
-            avg_used = disk_7d_aggregator['sum'] / disk_7d_aggregator['count'] if disk_7d_aggregator['count'] > 0 else disk_used
-            old_6h_timestamp = float(disk_7d_aggregator['current_6hour'] * 21600)
-            queue_query("INSERT INTO disk_history_details (timestamp, used) VALUES (?, ?)",
-                        (old_6h_timestamp, avg_used))
-            cutoff_7d = time.time() - (7 * 24 * 3600)
-            queue_query("DELETE FROM disk_history_details WHERE timestamp < ?", (cutoff_7d,))
-            disk_7d_aggregator['current_6hour'] = current_6hour
-            disk_7d_aggregator['sum'] = disk_used
-            disk_7d_aggregator['count'] = 1
+def history_series():
+    """
+    Yield (name, TimeSeries) for every in-memory history exposed by the history API:
+    raw series ('cpu', 'memory', 'disk', 'cpu_cores', 'disk_io.<device>', 'network.<iface>') and finished rollup
+    buckets ('rollup.<tier>.<metric>').
+    """
+    yield 'cpu', cpu_history
+    yield 'memory', memory_history_basic
+    yield 'disk', disk_history_basic
+    yield 'cpu_cores', cpu_core_history
+    for device, series in list(disk_io_history.items()):
+        yield f'disk_io.{device}', series
+    for iface, series in list(network_history.items()):
+        yield f'network.{iface}', series
+    for tier in rollups.tiers:
+        for metric, series in list(tier.history.items()):
+            yield f'rollup.{tier.name}.{metric}', series
 
-def update_stats_cache():
-    SLEEP_INTERVAL = 1.0  # 1 second between in-memory updates
-    global prev_net_io, prev_net_time, last_network_update
-    while True:
+def resolve_history_series(name):
+    """
+    Return the TimeSeries for a history_series() name, creating keyed series as needed,
+    or None for unknown names.
+    """
+    fixed = {'cpu': cpu_history, 'memory': memory_history_basic, 'disk': disk_history_basic,
+             'cpu_cores': cpu_core_history}
+    if name in fixed:
+        return fixed[name]
+    family, _, key = name.partition('.')
+    if not key:
+        return None
+    if family == 'disk_io':
+        return disk_io_history.get(key)
+    if family == 'network':
+        return network_history.get(key)
+    if family == 'rollup':
+        tier_name, _, metric = key.partition('.')
         try:
-            now = time.time()
-            now_str = datetime.datetime.now().strftime('%H:%M:%S')
-            cpu_percent = psutil.cpu_percent()
-            mem = psutil.virtual_memory()
-            disk = psutil.disk_usage('/')
-
-            # CPU immediate updates
-            cpu_history['time'].append(now_str)
-            cpu_history['usage'].append(cpu_percent)
-            if len(cpu_history['time']) > MAX_HISTORY:
-                cpu_history['time'].pop(0)
-                cpu_history['usage'].pop(0)
-            queue_query("INSERT INTO cpu_history (timestamp, usage) VALUES (?, ?)", (now, cpu_percent))
-            queue_query(
-                """DELETE FROM cpu_history
-                   WHERE rowid NOT IN (
-                     SELECT rowid FROM cpu_history
-                     ORDER BY timestamp DESC
-                     LIMIT ?
-                   )""", (MAX_HISTORY,)
-            )
-
-            # Memory immediate updates
-            cached_val = getattr(mem, 'cached', 0)
-            cached_GB = cached_val / (1024 ** 3)
-            used_no_cache_GB = (mem.used - cached_val) / (1024 ** 3)
-            memory_history_basic['time'].append(now_str)
-            memory_history_basic['free'].append(round(mem.free/(1024**3), 2))
-            memory_history_basic['used'].append(round(used_no_cache_GB, 2))
-            memory_history_basic['cached'].append(round(cached_GB, 2))
-            if len(memory_history_basic['time']) > MAX_HISTORY:
-                memory_history_basic['time'].pop(0)
-                memory_history_basic['free'].pop(0)
-                memory_history_basic['used'].pop(0)
-                memory_history_basic['cached'].pop(0)
-            queue_query("INSERT INTO memory_history (timestamp, free, used, cached) VALUES (?, ?, ?, ?)",
-                        (now, round(mem.free/(1024**3), 2), round(used_no_cache_GB, 2), round(cached_GB, 2)))
-            queue_query(
-                """DELETE FROM memory_history
-                   WHERE rowid NOT IN (
-                     SELECT rowid FROM memory_history
-                     ORDER BY timestamp DESC
-                     LIMIT ?
-                   )""", (MAX_HISTORY,)
-            )
-
-            # Disk immediate updates
-            total_disk_GB = round(disk.total/(1024**3), 2)
-            used_disk_GB = round(disk.used/(1024**3), 2)
-            free_disk_GB = round(disk.free/(1024**3), 2)
-            disk_history_basic['time'].append(now_str)
-            disk_history_basic['total'].append(total_disk_GB)
-            disk_history_basic['used'].append(used_disk_GB)
-            disk_history_basic['free'].append(free_disk_GB)
-            if len(disk_history_basic['time']) > MAX_HISTORY:
-                disk_history_basic['time'].pop(0)
-                disk_history_basic['total'].pop(0)
-                disk_history_basic['used'].pop(0)
-                disk_history_basic['free'].pop(0)
-            queue_query("INSERT INTO disk_history_basic (timestamp, total, used, free) VALUES (?, ?, ?, ?)",
-                        (now, total_disk_GB, used_disk_GB, free_disk_GB))
-            queue_query(
-                """DELETE FROM disk_history_basic
-                   WHERE rowid NOT IN (
-                     SELECT rowid FROM disk_history_basic
-                     ORDER BY timestamp DESC
-                     LIMIT ?
-                   )""", (MAX_HISTORY,)
-            )
-
-            # Update aggregators for extended views
-            mem_used_gb = round(mem.used/(1024**3), 2)
-            update_aggregators(cpu_percent, mem_used_gb, disk.used)
-
-            # Format 24h data for UI
-            cpu_24h_formatted = [{
-                'time': datetime.datetime.fromtimestamp(e['time']).strftime('%H:%M'),
-                'usage': e['usage']
-            } for e in cpu_history_24h]
-            mem_24h_formatted = [{
-                'time': datetime.datetime.fromtimestamp(e['time']).strftime('%H:%M'),
-                'usage': e['usage']
-            } for e in memory_history_24h]
-
-            heavy_cpu_details = get_cpu_details()
-            heavy_cpu_details['history24h'] = cpu_24h_formatted
-            heavy_mem_details = get_memory_details()
-            heavy_mem_details['history24h'] = mem_24h_formatted
-
-            cached_disk_details = get_disk_details()
-
-            # Network stats update
-            if (now - last_network_update) >= NETWORK_UPDATE_INTERVAL:
-                net_current = psutil.net_io_counters(pernic=True)
-                if prev_net_io is not None and prev_net_time is not None:
-                    dt = now - prev_net_time
-                    if dt > 0:
-                        for iface, stats_net in net_current.items():
-                            prev_stats = prev_net_io.get(iface)
-                            if prev_stats:
-                                input_speed = (stats_net.bytes_recv - prev_stats.bytes_recv) / (dt * (1024 * 1024))
-                                output_speed = (stats_net.bytes_sent - prev_stats.bytes_sent) / (dt * (1024 * 1024))
-                                if input_speed < 0.0001:
-                                    input_speed = 0
-                                if output_speed < 0.0001:
-                                    output_speed = 0
-                                if iface not in network_history:
-                                    network_history[iface] = []
-                                network_history[iface].append({
-                                    'time': datetime.datetime.fromtimestamp(now).strftime('%H:%M:%S'),
-                                    'input': input_speed,
-                                    'output': output_speed
-                                })
-                                if len(network_history[iface]) > MAX_HISTORY:
-                                    network_history[iface] = network_history[iface][-MAX_HISTORY:]
-                                queue_query("INSERT INTO net_history (interface, timestamp, input, output) VALUES (?, ?, ?, ?)",
-                                            (iface, now, input_speed, output_speed))
-                                queue_query(
-                                    """DELETE FROM net_history
-                                       WHERE rowid NOT IN (
-                                         SELECT rowid FROM net_history
-                                         WHERE interface=?
-                                         ORDER BY timestamp DESC
-                                         LIMIT ?
-                                       )""", (iface, MAX_HISTORY)
-                                )
-                prev_net_io = net_current
-                prev_net_time = now
-                last_network_update = now
-
-            # Update the in-memory cache structure for API responses
-            cached_stats['system'] = {
-                'cpu': cpu_percent,
-                'memory': {
-                    'percent': mem.percent,
-                    'total': round(mem.total/(1024**3), 2),
-                    'used': round(mem.used/(1024**3), 2),
-                    'free': round(mem.free/(1024**3), 2),
-                    'cached': round(getattr(mem, 'cached', 0)/(1024**3), 2)
-                },
-                'disk': {
-                    'percent': disk.percent,
-                    'total': total_disk_GB,
-                    'used': used_disk_GB,
-                    'free': free_disk_GB
-                },
-                'cpu_history': cpu_history,
-                'memory_history': memory_history_basic,
-                'disk_history_basic': disk_history_basic,
-                'cpu_details': heavy_cpu_details,
-                'memory_details': heavy_mem_details,
-                'disk_details': cached_disk_details
-            }
-            cached_stats['network'] = {'interfaces': network_history}
-        except Exception as e:
-            logging.error("Error updating stats cache: %s", e)
-        time.sleep(SLEEP_INTERVAL)
+            return rollups.tier(tier_name).history.get(metric) if metric else None
+        except KeyError:
+            return None
+    return None
+
+def load_warm_start():
+    """
+    Restore the in-memory histories from the warm start snapshot.
+    Returns False if it could not be used and the history has to be loaded from the database.
+    """
+    return warm_start.load(resolve_history_series, rollups)
+
+def save_warm_start(now=None):
+    warm_start.save(list(history_series()), rollups, now)
+
+def shutdown_warm_start():
+    """
+    Save the final snapshot on exit. Finished rollup buckets are queued for the DB writer first,
+    so the snapshot only has to carry the still open ones.
+    """
+    if scheduler is not None:
+        scheduler.stop()
+    # Let a running tick finish first, so it cannot change the buffers while they are saved.
+    if collector_thread is not None and collector_thread is not threading.current_thread():
+        collector_thread.join(COLLECTOR_JOIN_TIMEOUT)
+        if collector_thread.is_alive():
+            logging.warning("Collector thread still running after %.0fs; saving the warm start snapshot anyway",
+                            COLLECTOR_JOIN_TIMEOUT)
+    flush_rollups(time.time(), force=True)
+    save_warm_start()
+
+# Registered after chunks.flush, so atexit runs it while the DB writer still accepts writes.
+atexit.register(shutdown_warm_start)
+
+def history_cursor():
+    """
+    Return the sequence number of the newest sample across all history series.
+    """
+    return max((series.seq for _, series in history_series()), default=0)
+
+def history_since(cursor, epoch=None, families=None):
+    """
+    Return only the samples appended after `cursor`, grouped by series, optionally limited
+    to the given series families (e.g. ['cpu', 'network'] for cpu and network.<iface>).
+    Every series carries a 'seq' column, so a client can skip samples it already has.
+    'resync' is set when the cursor is from another process (epoch mismatch) or has
+    fallen out of a ring buffer; the client must then reload the full history.
+    """
+    current = history_cursor()
+    response = {'cursor': current, 'epoch': SNAPSHOT_EPOCH, 'resync': False, 'series': {}}
+    if epoch != SNAPSHOT_EPOCH or cursor > current:
+        response['resync'] = True
+        return response
+    for name, series in history_series():
+        if families is not None and name.partition('.')[0] not in families:
+            continue
+        columns = series.to_columns(since=cursor, until=current, raw_timestamps=True, sequence=True)
+        if columns is None:
+            response['resync'] = True
+            response['series'] = {}
+            return response
+        if columns['time']:
+            response['series'][name] = columns
+    return response
+
+def publish_snapshot(data, now):
+    """
+    Encode the tick's stats once and atomically swap in a new immutable snapshot.
+    All API readers share the same bytes instead of serializing per request.
+    """
+    global snapshot
+    version = (snapshot.version + 1) if snapshot is not None else 1
+    body = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    gzip_body = gzip.compress(body, compresslevel=SNAPSHOT_GZIP_LEVEL) if SNAPSHOT_GZIP else None
+    etag = f"{SNAPSHOT_EPOCH}-{version}"
+    snapshot = StatsSnapshot(version, etag, now, body, gzip_body, encode_event(etag, body))
+    stream_hub.publish(snapshot.frame)
+
+def build_scheduler():
+    """
+    Create the collector scheduler with one sampler per metric family.
+    """
+    collector = SamplerScheduler(on_tick=publish_stats)
+    collector.add('cpu', sample_intervals['cpu'], sample_cpu)
+    collector.add('memory', sample_intervals['memory'], sample_memory)
+    collector.add('disk', sample_intervals['disk'], sample_disk)
+    collector.add('disk_io', sample_intervals['disk_io'], sample_disk_io)
+    collector.add('network', sample_intervals['network'], sample_network)
+    collector.add('processes', sample_intervals['processes'], process_sampler.sample)
+    collector.add('retention', retention.interval, sweep_retention)
+    collector.add('maintenance', maintenance.interval, maintenance.run)
+    collector.add('warm_start', warm_start.interval, save_warm_start)
+    return collector
+
+def update_stats_cache():
+    """
+    Collector thread entry point: runs all samplers on their own fixed-rate cadence.
+    """
+    global scheduler, collector_thread
+    scheduler = build_scheduler()
+    collector_thread = threading.current_thread()
+    scheduler.run_forever()
@@ -0,0 +1,127 @@
+# simplehostmetrics/stats_stream.py
+# This module implements the push hub behind the Server-Sent Events stats stream.
+# The collector publishes one pre-encoded frame per tick; every subscriber gets the same
+# bytes through a small bounded buffer, and clients that fall behind are disconnected.
+
+import threading
+import time
+from collections import deque
+
+
+class Subscriber:
+    """
+    Bounded per-client frame buffer.
+    """
+
+    def __init__(self, buffer_size):
+        self.frames = deque()
+        self.buffer_size = buffer_size
+        self.condition = threading.Condition()
+        self.closed = False
+        self.close_reason = None
+        self.connected = time.time()
+        self.sent = 0
+
+    def put(self, frame):
+        """
+        Queue a frame. Returns False (and closes the subscriber) if the buffer is full.
+        """
+        with self.condition:
+            if self.closed:
+                return False
+            if len(self.frames) >= self.buffer_size:
+                self._close('slow consumer')
+                return False
+            self.frames.append(frame)
+            self.condition.notify()
+            return True
+
+    def get(self, timeout):
+        """
+        Wait up to `timeout` seconds for the next frame.
+        Returns None on timeout; raises EOFError once the subscriber is closed.
+        """
+        with self.condition:
+            if not self.frames and not self.closed:
+                self.condition.wait(timeout)
+            if self.closed:
+                raise EOFError(self.close_reason)
+            if not self.frames:
+                return None
+            self.sent += 1
+            return self.frames.popleft()
+
+    def close(self, reason='closed'):
+        with self.condition:
+            self._close(reason)
+
+    def _close(self, reason):
+        self.closed = True
+        self.close_reason = reason
+        self.frames.clear()
+        self.condition.notify_all()
+
+
+class StreamHub:
+    """
+    Fan-out of pre-encoded frames to all connected stream subscribers.
+    """
+
+    def __init__(self, buffer_size=8, max_subscribers=100):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.published = 0
+        self.slow_disconnects = 0
+
+    def subscribe(self):
+        """
+        Register a new subscriber, or return None if the hub is at capacity.
+        """
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                return None
+            subscriber = Subscriber(self.buffer_size)
+            self.subscribers.add(subscriber)
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscriber.close()
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def publish(self, frame):
+        """
+        Hand the same frame bytes to every subscriber; drop those whose buffer is full.
+        """
+        with self.lock:
+            subscribers = list(self.subscribers)
+            self.published += 1
+        for subscriber in subscribers:
+            if not subscriber.put(frame):
+                with self.lock:
+                    if subscriber in self.subscribers:
+                        self.subscribers.discard(subscriber)
+                        self.slow_disconnects += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'subscribers': len(self.subscribers),
+                'max_subscribers': self.max_subscribers,
+                'buffer_size': self.buffer_size,
+                'published': self.published,
+                'slow_disconnects': self.slow_disconnects
+            }
+
+
+def encode_event(event_id, data, event='stats'):
+    """
+    Build one SSE frame from already JSON-encoded bytes (which contain no newlines).
+    """
+    return b''.join([
+        b'id: ', event_id.encode('ascii'), b'\n',
+        b'event: ', event.encode('ascii'), b'\n',
+        b'data: ', data, b'\n\n'
+    ])
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import unittest
+
+from centroids import CentroidIndex
+
+
+class TestCentroidIndex(unittest.TestCase):
+    """Test suite for the country centroid index"""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'centroids.yml')
+        with open(self.path, 'w') as f:
+            f.write("DE: [51.1657, 10.4515]\nNO: [60.472024, 8.468946]\nbad: [1]\n")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_lookup_is_case_insensitive_and_keeps_yaml_booleans_as_codes(self):
+        """NO is Norway, not False, and unknown codes return the default"""
+        index = CentroidIndex.load(self.path)
+        self.assertEqual(index.get('no'), (60.472024, 8.468946))
+        self.assertEqual(index.get('DE'), (51.1657, 10.4515))
+        self.assertEqual(index.get('XX', (0, 0)), (0, 0))
+        self.assertIsNone(index.get('Unknown'))
+        self.assertEqual(len(index), 2)
+
+    def test_compiled_cache_is_used_and_rebuilt_on_change(self):
+        """The compiled cache is read back and replaced when the YAML changes"""
+        CentroidIndex.load(self.path)
+        self.assertTrue(os.path.exists(self.path + '.bin'))
+        self.assertEqual(CentroidIndex.load(self.path).get('DE'), (51.1657, 10.4515))
+        with open(self.path, 'w') as f:
+            f.write("FR: [46.2276, 2.2137]\n")
+        index = CentroidIndex.load(self.path)
+        self.assertEqual(index.get('FR'), (46.2276, 2.2137))
+        self.assertNotIn('DE', index)
+
+
+if __name__ == "__main__":
+    unittest.main()
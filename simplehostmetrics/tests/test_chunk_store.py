@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import unittest
+
+from chunk_store import ChunkWriter, Chunk
+
+
+def row_to_chunk(row):
+    _, start, _, count, fields, offsets, data = row
+    return Chunk(start, count, fields, offsets, data)
+
+
+class TestChunkStore(unittest.TestCase):
+    """Test suite for the chunked raw sample format"""
+
+    def test_chunks_are_written_per_window_and_decode(self):
+        """Samples are sealed into one chunk per series and window and decode per column"""
+        written = []
+        writer = ChunkWriter(written.extend, span=60)
+        writer.append('memory', ('free', 'used'), 120.0, (1.5, 2.25))
+        writer.append('memory', ('free', 'used'), 150.5, (1.75, 2.5))
+        self.assertEqual(written, [])
+        writer.append('memory', ('free', 'used'), 180.0, (2.0, 3.0))
+        self.assertEqual(len(written), 1)
+        chunk = row_to_chunk(written[0])
+        self.assertEqual(written[0][0], 'memory')
+        self.assertEqual(chunk.timestamps(), [120.0, 150.5])
+        self.assertEqual(chunk.column('used').tolist(), [2.25, 2.5])
+
+    def test_index_bisects_the_offsets(self):
+        """Sample positions are found from the millisecond offsets, boundaries inclusive"""
+        written = []
+        writer = ChunkWriter(written.extend, span=60)
+        for timestamp in (120.0, 120.5, 121.25, 130.0):
+            writer.append('cpu', ('usage',), timestamp, (1.0,))
+        writer.flush()
+        chunk = row_to_chunk(written[0])
+        self.assertEqual(chunk.offsets().tolist(), [0, 500, 1250, 10000])
+        self.assertEqual([chunk.index(t) for t in (100.0, 120.0, 120.1, 121.25, 129.9, 131.0)],
+                         [0, 0, 1, 2, 3, 4])
+        self.assertEqual(chunk.index(125.0, 1, 2), 2)
+        self.assertEqual(chunk.timestamp(2), 121.25)
+
+    def test_seal_expired_and_pending(self):
+        """Open chunks are readable before they are written and sealed once their window ends"""
+        written = []
+        writer = ChunkWriter(written.extend, span=60)
+        writer.append('cpu', ('usage',), 60.0, (10.0,))
+        self.assertEqual(list(writer.pending('cpu').samples('usage')), [(60.0, 10.0)])
+        writer.seal_expired(90.0)
+        self.assertEqual(written, [])
+        writer.seal_expired(120.0)
+        self.assertEqual(len(written), 1)
+        self.assertIsNone(writer.pending('cpu'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+from db_writer import DBWriter
+
+INSERT = "INSERT INTO samples (name, value) VALUES (?, ?)"
+
+
+class RecordingCursor:
+    """Cursor wrapper that records the executemany() calls"""
+
+    def __init__(self, cursor, calls):
+        self.cursor = cursor
+        self.calls = calls
+
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        self.calls.append((sql, len(rows)))
+        return self.cursor.executemany(sql, rows)
+
+    def execute(self, sql, params=()):
+        return self.cursor.execute(sql, params)
+
+
+class RecordingConnection:
+    def __init__(self, conn):
+        self.conn = conn
+        self.calls = []
+
+    def cursor(self):
+        return RecordingCursor(self.conn.cursor(), self.calls)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+class TestDBWriter(unittest.TestCase):
+    """Test suite for the batching SQLite writer"""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'writer.db')
+        conn = self.connect()
+        conn.execute("CREATE TABLE samples (name TEXT, value REAL)")
+        conn.execute("CREATE TABLE events (name TEXT)")
+        conn.close()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def connect(self):
+        return sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+
+    def rows(self, table='samples'):
+        conn = self.connect()
+        try:
+            return conn.execute(f"SELECT * FROM {table} ORDER BY rowid").fetchall()
+        finally:
+            conn.close()
+
+    def test_same_sql_is_grouped_into_one_executemany(self):
+        conn = RecordingConnection(self.connect())
+        writer = DBWriter(lambda: conn)
+        batch = [(INSERT, ('a', 1)), ("INSERT INTO events (name) VALUES (?)", ('x',)),
+                 (INSERT, [('b', 2), ('c', 3)]), (INSERT, ('d', 4))]
+        writer._write(conn, batch)
+        self.assertEqual(conn.calls, [(INSERT, 4), ("INSERT INTO events (name) VALUES (?)", 1)])
+        self.assertEqual([row[0] for row in self.rows()], ['a', 'b', 'c', 'd'])
+        self.assertEqual((writer.written, writer.batches), (5, 1))
+        conn.conn.close()
+
+    def test_callables_are_ordering_barriers(self):
+        conn = self.connect()
+        writer = DBWriter(lambda: conn)
+        seen = []
+        batch = [(INSERT, ('a', 1)),
+                 lambda cursor: seen.append(cursor.execute("SELECT COUNT(*) FROM samples").fetchone()[0]),
+                 (INSERT, ('b', 2)),
+                 lambda cursor: seen.append(cursor.execute("SELECT COUNT(*) FROM samples").fetchone()[0])]
+        writer._write(conn, batch)
+        self.assertEqual(seen, [1, 2])
+        conn.close()
+
+    def test_failing_task_does_not_abort_the_batch(self):
+        conn = self.connect()
+        writer = DBWriter(lambda: conn)
+
+        def broken(cursor):
+            raise RuntimeError("boom")
+
+        writer._write(conn, [broken, (INSERT, ('a', 1))])
+        self.assertEqual(self.rows(), [('a', 1.0)])
+        self.assertEqual(writer.errors, 1)
+        conn.close()
+
+    def test_drop_newest_at_capacity(self):
+        writer = DBWriter(self.connect, max_queue=2, drop_policy='drop_newest')
+        results = [writer.execute(INSERT, (name, 0)) for name in 'abc']
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual([params[0] for _, params in writer.queue], ['a', 'b'])
+        self.assertEqual(writer.stats()['dropped'], 1)
+
+    def test_drop_oldest_at_capacity(self):
+        writer = DBWriter(self.connect, max_queue=2, drop_policy='drop_oldest')
+        results = [writer.execute(INSERT, (name, 0)) for name in 'abc']
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual([params[0] for _, params in writer.queue], ['b', 'c'])
+        self.assertEqual(writer.stats()['dropped'], 1)
+
+    def test_block_times_out_and_drops(self):
+        writer = DBWriter(self.connect, max_queue=1, drop_policy='block', block_timeout=0.05)
+        writer.execute(INSERT, ('a', 0))
+        started = time.monotonic()
+        self.assertFalse(writer.execute(INSERT, ('b', 0)))
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        self.assertEqual((len(writer.queue), writer.dropped), (1, 1))
+
+    def test_block_waits_for_room(self):
+        writer = DBWriter(self.connect, max_queue=1, drop_policy='block', block_timeout=5.0)
+        writer.execute(INSERT, ('a', 0))
+
+        def drain():
+            time.sleep(0.05)
+            with writer.condition:
+                writer.queue.popleft()
+                writer.condition.notify_all()
+
+        threading.Thread(target=drain).start()
+        self.assertTrue(writer.execute(INSERT, ('b', 0)))
+        self.assertEqual(([params[0] for _, params in writer.queue], writer.dropped), (['b'], 0))
+
+    def test_close_flushes_what_is_queued(self):
+        writer = DBWriter(self.connect, flush_interval=60.0)
+        writer.start()
+        writer.executemany(INSERT, [('a', 1), ('b', 2)])
+        writer.submit(lambda cursor: cursor.execute("INSERT INTO events (name) VALUES ('done')"))
+        started = time.monotonic()
+        writer.close()
+        self.assertLess(time.monotonic() - started, 5.0)
+        self.assertFalse(writer.thread.is_alive())
+        self.assertEqual(self.rows(), [('a', 1.0), ('b', 2.0)])
+        self.assertEqual(self.rows('events'), [('done',)])
+        self.assertTrue(writer.idle())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+import json
+import sqlite3
+import unittest
+
+from chunk_store import ChunkWriter, INSERT_CHUNK_SQL
+from export import encode_csv, encode_ndjson, raw_batches, rollup_batches
+
+
+class TestExport(unittest.TestCase):
+    """Test suite for the streaming history export"""
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("""CREATE TABLE metric_chunks (series TEXT, timestamp REAL, end_timestamp REAL,
+                             count INTEGER, fields TEXT, timestamps BLOB, data BLOB)""")
+        self.conn.execute("""CREATE TABLE metric_rollups (metric TEXT, tier TEXT, timestamp REAL, min REAL,
+                             max REAL, avg REAL, count INTEGER, last REAL)""")
+
+    def test_raw_series_streams_in_batches(self):
+        """Raw chunks are decoded into rows inside the range and emitted in bounded batches"""
+        writer = ChunkWriter(lambda rows: self.conn.executemany(INSERT_CHUNK_SQL, rows), span=60)
+        for ts in range(0, 180, 10):
+            writer.append('cpu', ('usage',), float(ts), (ts / 10 + 0.1,))
+        writer.flush()
+        batches = list(raw_batches(self.conn.cursor(), 'cpu', 30, 150, fetch_size=5))
+        self.assertGreater(len(batches), 1)
+        body = b''.join(encode_csv(batches)).decode().splitlines()
+        self.assertEqual(body[0], 'timestamp,usage')
+        self.assertEqual(body[1], '30.0,3.1')
+        self.assertEqual(len(body), 1 + 12)
+
+    def test_rollup_tier_with_metric_filter(self):
+        """Rollup exports are restricted to the tier, range and metric pattern"""
+        self.conn.executemany("INSERT INTO metric_rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+            ('cpu.usage', '1m', 60.0, 1.0, 5.0, 3.0, 60, 2.0),
+            ('net.eth0.input', '1m', 60.0, 0.0, 1.0, 0.5, 60, 1.0),
+            ('cpu.usage', '1h', 0.0, 1.0, 5.0, 3.0, 3600, 2.0),
+        ])
+        batches = rollup_batches(self.conn.cursor(), '1m', 0, 120, 'cpu.*')
+        rows = [json.loads(line) for line in b''.join(encode_ndjson(batches)).decode().splitlines()]
+        self.assertEqual(rows, [{'timestamp': 60.0, 'metric': 'cpu.usage', 'min': 1.0, 'max': 5.0,
+                                 'avg': 3.0, 'count': 60, 'last': 2.0}])
+
+
+if __name__ == "__main__":
+    unittest.main()
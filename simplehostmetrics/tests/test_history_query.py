@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+import unittest
+
+from chunk_store import ChunkWriter
+from history_query import _float32, bucket_raw
+from test_chunk_store import row_to_chunk
+
+
+def naive_buckets(samples, start, end, width):
+    buckets = {}
+    for timestamp, value in samples:
+        if start <= timestamp < end:
+            buckets.setdefault(int((timestamp - start) // width), []).append(value)
+    return [(index, min(values), max(values), _float32(sum(values) / len(values)), len(values))
+            for index, values in sorted(buckets.items())]
+
+
+class TestBucketRaw(unittest.TestCase):
+    """Test suite for the downsampling of raw sample chunks"""
+
+    def setUp(self):
+        written = []
+        writer = ChunkWriter(written.extend, span=60)
+        self.samples = [(1000.0 + i * 2.5, float((i * 7) % 11)) for i in range(200)]
+        for timestamp, value in self.samples:
+            writer.append('cpu', ('usage',), timestamp, (value,))
+        writer.seal_expired(2000.0)
+        self.chunks = [row_to_chunk(row) for row in written]
+
+    def test_buckets_across_chunk_boundaries(self):
+        for start, end, width in ((1000, 1500, 45), (1013, 1400, 7), (900, 2000, 1000), (1100, 1101, 1)):
+            rows = bucket_raw(iter(self.chunks), 'usage', start, end, width)
+            self.assertEqual(rows, naive_buckets(self.samples, start, end, width), (start, end, width))
+
+    def test_missing_field_and_empty_range(self):
+        self.assertEqual(bucket_raw(self.chunks, 'steal', 1000, 1500, 60), [])
+        self.assertEqual(bucket_raw(self.chunks, 'usage', 3000, 4000, 60), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import gzip
+import os
+import tempfile
+import unittest
+from collections import deque
+from unittest import mock
+
+from log_backfill import LogBackfill, discover_archives
+from log_parsing import parse_log_timestamp
+from log_offsets import FileOffsetTracker
+import rtad_manager
+
+NPM_LINE = '[{} +0000] {} - GET https example.com "/{}" [Client 203.0.113.{}] [Length 0] [Gzip -] [Sent-to 10.0.0.2]\n'
+
+
+class TestLogBackfill(unittest.TestCase):
+    """Test suite for the parallel backfill of rotated log archives"""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'proxy-host-1_access.log')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write_archive(self, suffix, hours):
+        opener = gzip.open if suffix.endswith('.gz') else open
+        with opener(self.path + suffix, 'wt') as f:
+            for i, hour in enumerate(hours):
+                f.write(NPM_LINE.format(f"12/Mar/2025:{hour:02d}:00:00", 404, f"{suffix}-{i}", i))
+
+    def test_discover_archives_oldest_first(self):
+        for suffix in ('', '.1', '.2.gz', '.10.gz', '.old'):
+            open(self.path + suffix, 'w').close()
+        self.assertEqual([os.path.basename(path)[len('proxy-host-1_access.log'):]
+                          for path in discover_archives(self.path)], ['.10.gz', '.2.gz', '.1'])
+        self.assertEqual(parse_log_timestamp("12/Mar/2025:10:00:00 +0000"), 1741773600.0)
+
+    def test_backfill_merges_archives_in_timestamp_order(self):
+        self.write_archive('.1', [1, 4, 7])
+        self.write_archive('.2.gz', [2, 3, 8])
+        stored = []
+        finished = []
+        tracker = FileOffsetTracker()
+        backfill = LogBackfill(lambda *event: stored.append(event), tracker, workers=2,
+                               finish=lambda: finished.append(len(stored)))
+        log_configs = [{'path': self.path, 'proxy_type': 'npm'}]
+
+        self.assertTrue(backfill.start(log_configs))
+        backfill.thread.join(30)
+        progress = backfill.progress()
+        self.assertEqual(progress['status'], 'finished', progress)
+        self.assertEqual((progress['files_done'], progress['events'], progress['percent']), (2, 6, 100.0))
+        timestamps = [event[5] for event in stored]
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertEqual([event[2] for event in stored],
+                         ['/.1-0', '/.2.gz-0', '/.2.gz-1', '/.1-1', '/.1-2', '/.2.gz-2'])
+        self.assertEqual(finished, [6])
+
+        # Imported archives are skipped by the next run.
+        backfill.start(log_configs)
+        backfill.thread.join(30)
+        self.assertEqual((backfill.progress()['files_total'], len(stored)), (0, 6))
+
+
+class TestBackfillMerge(unittest.TestCase):
+    """Test suite for adding backfilled events to the live RTAD event cache"""
+
+    def setUp(self):
+        patcher = mock.patch.multiple(rtad_manager, http_error_logs_cache=deque(maxlen=5),
+                                      backfilled_http_error_logs=deque(maxlen=5), enrich_event=lambda entry: None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_backfilled_events_never_evict_live_events(self):
+        for i in range(3):
+            rtad_manager.http_error_logs_cache.append({'id': i, 'url': f'/live-{i}'})
+        for i in range(4):
+            rtad_manager.store_backfilled_http_error_log('npm', 404, f'/old-{i}', '203.0.113.1', 'example.com')
+        rtad_manager.merge_backfilled_http_error_logs()
+        self.assertEqual([entry['url'] for entry in rtad_manager.http_error_logs_cache],
+                         ['/old-2', '/old-3', '/live-0', '/live-1', '/live-2'])
+        self.assertFalse(rtad_manager.backfilled_http_error_logs)
+
+    def test_full_cache_keeps_only_live_events(self):
+        for i in range(5):
+            rtad_manager.http_error_logs_cache.append({'id': i, 'url': f'/live-{i}'})
+        rtad_manager.store_backfilled_http_error_log('npm', 404, '/old', '203.0.113.1', 'example.com')
+        rtad_manager.merge_backfilled_http_error_logs()
+        self.assertEqual([entry['id'] for entry in rtad_manager.http_error_logs_cache], [0, 1, 2, 3, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
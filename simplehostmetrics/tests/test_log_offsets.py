@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from log_offsets import FileOffsetTracker, find_rotated, identify, start_offset
+
+
+class TestLogOffsets(unittest.TestCase):
+    """Test suite for the persistent, rotation-aware log offsets"""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'access.log')
+        self.db = os.path.join(self.dir.name, 'offsets.db')
+        sqlite3.connect(self.db).execute(
+            """CREATE TABLE log_offsets (path TEXT PRIMARY KEY, device INTEGER, inode INTEGER, fingerprint TEXT,
+               fingerprint_size INTEGER, offset INTEGER, updated REAL)""")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def connect(self):
+        return sqlite3.connect(self.db, check_same_thread=False)
+
+    def record(self, tracker, path, key):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            tracker.update(key, identify(f, stat, stat.st_size))
+
+    def test_offsets_survive_restart_and_detect_truncation(self):
+        """A stored position is resumed by a new tracker and reset if the file was rewritten"""
+        with open(self.path, 'w') as f:
+            f.write("one\ntwo\n")
+        tracker = FileOffsetTracker(self.connect)
+        self.record(tracker, self.path, self.path)
+        tracker.flush()
+        state = FileOffsetTracker(self.connect).get(self.path)
+        with open(self.path, 'ab') as f:
+            f.write(b"three\n")
+        with open(self.path, 'rb') as f:
+            self.assertEqual(start_offset(f, os.fstat(f.fileno()), state), 8)
+        with open(self.path, 'wb') as f:
+            f.write(b"other content\n")
+        with open(self.path, 'rb') as f:
+            self.assertEqual(start_offset(f, os.fstat(f.fileno()), state), 0)
+
+    def test_checkpoints_are_coalesced_until_flushed(self):
+        """Updates only reach the database with the next flush, once per path"""
+        with open(self.path, 'w') as f:
+            f.write("one\n")
+        tracker = FileOffsetTracker(self.connect, checkpoint_interval=3600)
+        with open(self.path, 'rb') as f:
+            state = identify(f, os.fstat(f.fileno()), 0)
+        for offset in range(1, 5):
+            tracker.update(self.path, state._replace(offset=offset))
+        tracker.update('gone.log', state)
+        tracker.reset('gone.log')
+        self.assertIsNone(FileOffsetTracker(self.connect).get(self.path))
+        tracker.flush()
+        self.assertIsNone(tracker.timer)
+        self.assertEqual(FileOffsetTracker(self.connect).get(self.path).offset, 4)
+        self.assertIsNone(FileOffsetTracker(self.connect).get('gone.log'))
+
+    def test_default_checkpoints_every_update(self):
+        """Without an interval each position is written as soon as it is stored"""
+        with open(self.path, 'w') as f:
+            f.write("one\n")
+        tracker = FileOffsetTracker(self.connect)
+        with open(self.path, 'rb') as f:
+            state = identify(f, os.fstat(f.fileno()), 4)
+        tracker.update(self.path, state)
+        self.assertIsNone(tracker.timer)
+        self.assertEqual(FileOffsetTracker(self.connect).get(self.path).offset, 4)
+
+    def test_reload_picks_up_positions_written_elsewhere(self):
+        """Positions checkpointed by another tracker are seen after reload(); unsaved ones are kept"""
+        with open(self.path, 'w') as f:
+            f.write("one\n")
+        with open(self.path, 'rb') as f:
+            state = identify(f, os.fstat(f.fileno()), 4)
+        reader = FileOffsetTracker(self.connect, checkpoint_interval=3600)
+        self.assertIsNone(reader.get(self.path))
+        reader.update('own.log', state)
+        writer = FileOffsetTracker(self.connect, checkpoint_interval=0)
+        writer.update(self.path, state)
+        self.assertIsNone(reader.get(self.path))
+        reader.reload()
+        self.assertEqual(reader.get(self.path), state)
+        self.assertEqual(reader.get('own.log'), state)
+
+    def test_rotated_file_is_found_by_identity(self):
+        """After a rename rotation the recorded file is found under its .1 name"""
+        with open(self.path, 'w') as f:
+            f.write("old line\n")
+        tracker = FileOffsetTracker()
+        self.record(tracker, self.path, self.path)
+        os.rename(self.path, self.path + '.1')
+        with open(self.path, 'w') as f:
+            f.write("new line\n")
+        self.assertEqual(find_rotated(self.path, tracker.get(self.path)), self.path + '.1')
+        with open(self.path + '.1', 'w') as f:
+            f.write("unrelated\n")
+        self.assertIsNone(find_rotated(self.path, tracker.get(self.path)))
+
+    def test_dateext_rotation_is_found(self):
+        """A rename to a dated name is found as well; compressed archives are not candidates"""
+        with open(self.path, 'w') as f:
+            f.write("old line\n")
+        tracker = FileOffsetTracker()
+        self.record(tracker, self.path, self.path)
+        with open(self.path + '.2.gz', 'wb') as f:
+            f.write(b"old line\n")
+        os.rename(self.path, self.path + '-20240101')
+        with open(self.path, 'w') as f:
+            f.write("new line\n")
+        self.assertEqual(find_rotated(self.path, tracker.get(self.path)), self.path + '-20240101')
+
+
+if __name__ == "__main__":
+    unittest.main()
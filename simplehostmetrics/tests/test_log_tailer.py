@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+import io
+import unittest
+
+from log_tailer import read_line_batches
+
+
+class TestLogTailer(unittest.TestCase):
+    """Test suite for the chunked log line reader"""
+
+    def test_lines_split_across_chunks_and_partial_tail(self):
+        """Lines spanning chunk borders are joined; an unfinished last line is left for later"""
+        f = io.BytesIO(b"first line\nsecond line\r\nthird\npartial")
+        batches = list(read_line_batches(f, 0, chunk_size=4, max_batch_bytes=64))
+        self.assertEqual([line for lines, _ in batches for line in lines],
+                         ['first line', 'second line\r', 'third'])
+        self.assertEqual(batches[-1][1], len(b"first line\nsecond line\r\nthird\n"))
+
+    def test_batches_are_bounded_and_resume_from_offset(self):
+        """Batches stay near max_batch_bytes and reading resumes at the returned offset"""
+        data = b''.join(b"line %03d\n" % i for i in range(100))
+        batches = list(read_line_batches(io.BytesIO(data), 0, chunk_size=16, max_batch_bytes=100))
+        self.assertGreater(len(batches), 5)
+        self.assertTrue(all(sum(len(line) + 1 for line in lines) < 100 + 2 * 16 for lines, _ in batches))
+        offset = batches[2][1]
+        rest = [line for lines, _ in read_line_batches(io.BytesIO(data), offset) for line in lines]
+        self.assertEqual(rest[0], data[offset:].split(b'\n')[0].decode())
+        self.assertEqual(rest[-1], 'line 099')
+
+    def test_final_read_hands_out_the_last_line(self):
+        """A finished file's last line is read even without a line ending"""
+        data = b"first line\nlast without newline"
+        batches = list(read_line_batches(io.BytesIO(data), 0, chunk_size=4, final=True))
+        self.assertEqual([line for lines, _ in batches for line in lines], ['first line', 'last without newline'])
+        self.assertEqual(batches[-1][1], len(data))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from maintenance import DatabaseMaintenance
+
+
+class QueueingWriter:
+    """Stands in for the DB writer and keeps the submitted tasks"""
+
+    def __init__(self):
+        self.tasks = []
+
+    def idle(self):
+        return not self.tasks
+
+    def submit(self, func):
+        self.tasks.append(func)
+        return True
+
+
+class TestMaintenance(unittest.TestCase):
+    """Test suite for the incremental database maintenance"""
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+        os.remove(self.path)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.conn.execute("CREATE TABLE samples (timestamp REAL, data BLOB)")
+        self.conn.executemany("INSERT INTO samples VALUES (?, ?)", [(i, bytes(4000)) for i in range(200)])
+        self.conn.execute("DELETE FROM samples")
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        os.remove(self.path)
+
+    def run_step(self, maintenance, writer, now):
+        self.assertTrue(maintenance.run(now))
+        self.assertFalse(maintenance.run(now))  # Only one step is queued at a time
+        maintenance.step(self.conn.cursor())
+        writer.tasks.clear()
+
+    def test_analyze_round_then_vacuum_in_small_steps(self):
+        """Each step analyzes one table or frees at most vacuum_pages pages"""
+        writer = QueueingWriter()
+        maintenance = DatabaseMaintenance(writer, vacuum_pages=50, analyze_interval=3600)
+        self.assertGreater(self.conn.execute("PRAGMA freelist_count").fetchone()[0], 100)
+        self.run_step(maintenance, writer, 0)
+        self.assertEqual(maintenance.analyzed_tables, 1)
+        self.assertEqual(maintenance.vacuumed_pages, 0)
+        free = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        self.run_step(maintenance, writer, 30)
+        self.assertEqual(maintenance.vacuumed_pages, 50)
+        self.assertEqual(self.conn.execute("PRAGMA freelist_count").fetchone()[0], free - 50)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import database
+from chunk_store import read_chunks
+
+HOUR = 3600
+DAY = 86400
+START = 1700006400  # Midnight (UTC), a multiple of DAY
+
+# Schema of stats.db before the metrics tables were split off and migrated (the baseline).
+BASELINE_SCHEMA = """
+CREATE TABLE cpu_history (timestamp REAL, usage REAL);
+CREATE TABLE cpu_history_24h (timestamp REAL, usage REAL);
+CREATE TABLE memory_history (timestamp REAL, free REAL, used REAL, cached REAL);
+CREATE TABLE memory_history_24h (timestamp REAL, usage REAL);
+CREATE TABLE disk_history_basic (timestamp REAL, total REAL, used REAL, free REAL);
+CREATE TABLE disk_history_details (timestamp REAL, used REAL);
+CREATE TABLE net_history (interface TEXT, timestamp REAL, input REAL, output REAL);
+CREATE TABLE custom_network_graphs (id INTEGER PRIMARY KEY, graph_name TEXT, interfaces TEXT);
+CREATE TABLE country_centroids (country_code TEXT PRIMARY KEY, lat REAL, lon REAL);
+"""
+
+
+class TestMigrations(unittest.TestCase):
+    """Test suite for the schema upgrade path of the metrics database"""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.paths = database.DB_PATH, database.AUTH_DB_PATH
+        database.DB_PATH = os.path.join(self.dir.name, 'metrics.db')
+        database.AUTH_DB_PATH = os.path.join(self.dir.name, 'stats.db')
+
+    def tearDown(self):
+        database.DB_PATH, database.AUTH_DB_PATH = self.paths
+        self.dir.cleanup()
+
+    def connect(self):
+        return sqlite3.connect(database.DB_PATH)
+
+    def tables(self, conn):
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+    def test_legacy_aggregates_become_rollups(self):
+        conn = self.connect()
+        conn.execute("CREATE TABLE cpu_history_24h (timestamp REAL, usage REAL)")
+        conn.execute("CREATE TABLE memory_history_24h (timestamp REAL, usage REAL)")
+        conn.execute("CREATE TABLE disk_history_details (timestamp REAL, used REAL)")
+        conn.execute("""CREATE TABLE metric_rollups (metric TEXT, tier TEXT, timestamp REAL, min REAL, max REAL,
+                        avg REAL, count INTEGER, last REAL)""")
+        conn.executemany("INSERT INTO cpu_history_24h VALUES (?, ?)", [(START, 10.0), (START + HOUR, 20.0)])
+        conn.execute("INSERT INTO memory_history_24h VALUES (?, ?)", (START, 3.5))
+        conn.executemany("INSERT INTO disk_history_details VALUES (?, ?)", [(START, 5.0), (START + 6 * HOUR, 7.0)])
+        # Written by the rollup engine already; must win over the legacy row.
+        conn.execute("INSERT INTO metric_rollups VALUES ('cpu.usage', '1h', ?, 1, 3, 2, 60, 3)", (START,))
+        conn.commit()
+        conn.close()
+
+        database.initialize_database()
+
+        conn = self.connect()
+        self.assertFalse(self.tables(conn) & set(database.LEGACY_AGGREGATE_TABLES))
+        rows = conn.execute("""SELECT metric, tier, timestamp, min, max, avg, count, last FROM metric_rollups
+                               ORDER BY metric, timestamp""").fetchall()
+        conn.close()
+        self.assertEqual(rows, [
+            ('cpu.usage', '1h', START, 1, 3, 2, 60, 3),
+            ('cpu.usage', '1h', START + HOUR, 20.0, 20.0, 20.0, 1, 20.0),
+            ('disk.used', '1d', START, 5.0, 7.0, 6.0, 2, 7.0),
+            ('memory.used', '1h', START, 3.5, 3.5, 3.5, 1, 3.5),
+        ])
+
+    def test_baseline_stats_db_is_upgraded(self):
+        legacy = sqlite3.connect(database.AUTH_DB_PATH)
+        legacy.executescript(BASELINE_SCHEMA)
+        legacy.executemany("INSERT INTO cpu_history VALUES (?, ?)", [(START + i, float(i)) for i in range(90)])
+        legacy.executemany("INSERT INTO memory_history VALUES (?, 1, 2, 3)", [(START,), (START + 1,)])
+        legacy.executemany("INSERT INTO net_history VALUES (?, ?, ?, ?)",
+                           [('eth0', START, 10, 20), ('eth0', START + 1, 11, 21), ('lo', START, 1, 2)])
+        legacy.execute("INSERT INTO cpu_history_24h VALUES (?, 42)", (START,))
+        legacy.execute("INSERT INTO custom_network_graphs VALUES (7, 'uplinks', 'eth0,eth1')")
+        legacy.commit()
+        legacy.close()
+
+        database.initialize_database()
+
+        conn = self.connect()
+        conn.row_factory = sqlite3.Row
+        self.assertEqual(database.get_schema_version(conn), database.MIGRATIONS[-1][0])
+        self.assertNotIn('country_centroids', self.tables(conn))
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertLessEqual({'idx_cpu_history_timestamp', 'idx_net_history_interface_timestamp',
+                              'idx_metric_rollups_metric_tier_timestamp', 'idx_metric_chunks_series_timestamp'},
+                             indexes)
+        # Per-row samples were packed into chunks and the row tables emptied.
+        cpu = list(read_chunks(conn.cursor(), 'cpu'))
+        self.assertEqual([chunk.start for chunk in cpu], [START, START + 60])
+        self.assertEqual([value for chunk in cpu for value in chunk.column('usage')], [float(i) for i in range(90)])
+        eth0 = list(read_chunks(conn.cursor(), 'network.eth0'))
+        self.assertEqual(list(eth0[0].samples('output')), [(START, 20.0), (START + 1, 21.0)])
+        self.assertEqual(len(list(read_chunks(conn.cursor(), 'network.lo'))), 1)
+        self.assertEqual(len(list(read_chunks(conn.cursor(), 'memory'))), 1)
+        for table in ('cpu_history', 'memory_history', 'net_history'):
+            self.assertEqual(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0], 0)
+        self.assertEqual(conn.execute("SELECT metric, avg FROM metric_rollups").fetchone()[:], ('cpu.usage', 42.0))
+        # User configuration is not copied; it stays in the auth database.
+        self.assertNotIn('custom_network_graphs', self.tables(conn))
+        conn.close()
+        # The auth database keeps its tables untouched.
+        legacy = sqlite3.connect(database.AUTH_DB_PATH)
+        self.assertEqual(legacy.execute("SELECT COUNT(*) FROM cpu_history").fetchone()[0], 90)
+        self.assertEqual(legacy.execute("SELECT id, graph_name, interfaces FROM custom_network_graphs").fetchall(),
+                         [(7, 'uplinks', 'eth0,eth1')])
+        legacy.close()
+
+    def test_network_graphs_move_back_to_the_auth_database(self):
+        legacy = sqlite3.connect(database.AUTH_DB_PATH)
+        legacy.execute("CREATE TABLE custom_network_graphs (id INTEGER PRIMARY KEY, graph_name TEXT, interfaces TEXT)")
+        legacy.execute("INSERT INTO custom_network_graphs VALUES (1, 'deleted since the split', '[]')")
+        legacy.commit()
+        legacy.close()
+        conn = self.connect()
+        conn.execute("CREATE TABLE custom_network_graphs (id INTEGER PRIMARY KEY, graph_name TEXT, interfaces TEXT)")
+        conn.execute("INSERT INTO custom_network_graphs VALUES (7, 'uplinks', '[]')")
+        conn.execute("PRAGMA user_version = 5")
+        conn.commit()
+        conn.close()
+
+        database.initialize_database()
+
+        conn = self.connect()
+        self.assertNotIn('custom_network_graphs', self.tables(conn))
+        conn.close()
+        legacy = sqlite3.connect(database.AUTH_DB_PATH)
+        self.assertEqual(legacy.execute("SELECT id, graph_name FROM custom_network_graphs").fetchall(), [(7, 'uplinks')])
+        legacy.close()
+
+    def test_existing_database_is_only_vacuumed_on_request(self):
+        conn = self.connect()
+        conn.execute("CREATE TABLE cpu_history (timestamp REAL, usage REAL)")
+        conn.commit()
+        conn.close()
+
+        database.initialize_database()
+
+        conn = self.connect()
+        self.assertEqual(conn.execute("PRAGMA auto_vacuum").fetchone()[0], 0)
+        database.enable_incremental_vacuum(conn, vacuum=True)
+        self.assertEqual(conn.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+        conn.close()
+
+    def test_country_centroids_table_is_dropped(self):
+        conn = self.connect()
+        conn.execute("CREATE TABLE country_centroids (country_code TEXT PRIMARY KEY, lat REAL, lon REAL)")
+        conn.execute("INSERT INTO country_centroids VALUES ('DE', 51.1657, 10.4515)")
+        conn.commit()
+        conn.close()
+
+        database.initialize_database()
+
+        conn = self.connect()
+        self.assertNotIn('country_centroids', self.tables(conn))
+        conn.close()
+
+    def test_new_database_starts_incremental(self):
+        database.initialize_database()
+        conn = self.connect()
+        self.assertEqual(conn.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+        conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
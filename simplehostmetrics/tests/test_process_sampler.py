@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import process_sampler
+from process_sampler import ProcessSampler
+
+MB = 1024 * 1024
+
+
+def fake_process(pid, create_time, cpu_seconds, io_bytes=0, rss=MB, name=None):
+    return SimpleNamespace(info={
+        'pid': pid,
+        'name': name or f'proc{pid}',
+        'username': 'root',
+        'status': 'running',
+        'create_time': create_time,
+        'cpu_times': SimpleNamespace(user=cpu_seconds, system=0.0),
+        'memory_info': SimpleNamespace(rss=rss),
+        'memory_percent': 1.0,
+        'io_counters': SimpleNamespace(read_bytes=io_bytes, write_bytes=0),
+    })
+
+
+class TestProcessSampler(unittest.TestCase):
+    """Test suite for the background process table sampler"""
+
+    def sample(self, sampler, now, processes):
+        with mock.patch.object(process_sampler.psutil, 'process_iter', return_value=processes):
+            sampler.sample(now)
+        return {row['pid']: row for row in sampler.rows}
+
+    def test_cpu_and_io_are_deltas_against_the_previous_tick(self):
+        sampler = ProcessSampler()
+        rows = self.sample(sampler, 100.0, [fake_process(1, 10.0, cpu_seconds=5.0, io_bytes=1000)])
+        self.assertEqual((rows[1]['cpu_percent'], rows[1]['io_rate']), (0.0, 0.0))
+        rows = self.sample(sampler, 102.0, [fake_process(1, 10.0, cpu_seconds=6.0, io_bytes=5000)])
+        self.assertEqual((rows[1]['cpu_percent'], rows[1]['io_rate']), (50.0, 2000.0))
+
+    def test_reused_pid_starts_from_a_fresh_baseline(self):
+        sampler = ProcessSampler()
+        self.sample(sampler, 100.0, [fake_process(1, 10.0, cpu_seconds=5.0)])
+        # Same PID, but a different process (new create_time) with less CPU time used.
+        rows = self.sample(sampler, 101.0, [fake_process(1, 100.5, cpu_seconds=0.2)])
+        self.assertEqual(rows[1]['cpu_percent'], 0.0)
+        self.assertEqual(list(sampler.baselines), [(1, 100.5)])
+
+    def test_exited_processes_are_forgotten(self):
+        sampler = ProcessSampler(history_retention=10)
+        self.sample(sampler, 100.0, [fake_process(1, 10.0, 1.0), fake_process(2, 10.0, 1.0)])
+        self.assertIn(2, sampler.history)
+        self.sample(sampler, 101.0, [fake_process(1, 10.0, 1.5)])
+        self.assertEqual(list(sampler.baselines), [(1, 10.0)])
+        self.assertNotIn(2, sampler.history)
+        self.assertIsNone(sampler.process_history(2))
+
+    def test_top_n_per_key(self):
+        sampler = ProcessSampler(top_n=2)
+        processes = [fake_process(pid, 10.0, cpu_seconds=0.0, rss=pid * MB) for pid in range(1, 6)]
+        self.sample(sampler, 100.0, processes)
+        processes = [fake_process(pid, 10.0, cpu_seconds=(6 - pid) * 0.1, rss=pid * MB) for pid in range(1, 6)]
+        self.sample(sampler, 101.0, processes)
+        top = sampler.top_consumers()['top']
+        self.assertEqual([row['pid'] for row in top['cpu_percent']], [1, 2])
+        self.assertEqual([row['pid'] for row in top['rss']], [5, 4])
+        self.assertEqual(sorted(pid for pid, _ in sampler.history.items()), [1, 2, 4, 5])
+
+    def test_pagination_and_sorting(self):
+        sampler = ProcessSampler()
+        self.sample(sampler, 100.0, [fake_process(pid, 10.0, 0.0, name=f'p{pid:02d}') for pid in range(1, 8)])
+        page = sampler.page(sort='pid', descending=False, page=2, per_page=3)
+        self.assertEqual((page['total'], page['order']), (7, 'asc'))
+        self.assertEqual([row['pid'] for row in page['processes']], [4, 5, 6])
+        last = sampler.page(sort='name', descending=True, page=3, per_page=3)
+        self.assertEqual([row['name'] for row in last['processes']], ['p01'])
+        with self.assertRaises(ValueError):
+            sampler.sorted_rows('command')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import sqlite3
+import unittest
+
+from retention import RetentionEngine, RetentionPolicy, create_retention_engine
+
+HOUR = 3600
+NOW = 1700006400.0
+
+
+class TestRetentionEngine(unittest.TestCase):
+    """Test suite for the batched retention sweeps"""
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute("CREATE TABLE metric_chunks (series TEXT, timestamp REAL, data BLOB)")
+        self.conn.execute("CREATE INDEX idx_metric_chunks_series_timestamp ON metric_chunks (series, timestamp)")
+        self.conn.execute("CREATE TABLE net_history (interface TEXT, timestamp REAL, input REAL)")
+        self.conn.execute("CREATE INDEX idx_net_history_timestamp ON net_history (timestamp)")
+
+    def tearDown(self):
+        self.conn.close()
+
+    def chunks(self):
+        return self.conn.execute("SELECT series, timestamp FROM metric_chunks ORDER BY series, timestamp").fetchall()
+
+    def test_series_patterns_are_trimmed_with_their_own_retention(self):
+        rows = [(series, NOW - hours * HOUR) for series in ('cpu', 'network.eth0', 'network.lo')
+                for hours in (48, 12, 1)]
+        self.conn.executemany("INSERT INTO metric_chunks (series, timestamp) VALUES (?, ?)", rows)
+        engine = RetentionEngine([
+            RetentionPolicy('metric_chunks', 24 * HOUR, 'series GLOB ?', ('cpu',)),
+            RetentionPolicy('metric_chunks', 6 * HOUR, 'series GLOB ?', ('network.*',)),
+        ])
+        self.assertEqual(engine.sweep(self.conn.cursor(), NOW), 5)
+        self.assertEqual(self.chunks(), [
+            ('cpu', NOW - 12 * HOUR), ('cpu', NOW - HOUR),
+            ('network.eth0', NOW - HOUR), ('network.lo', NOW - HOUR),
+        ])
+        policies = engine.stats()['policies']
+        self.assertEqual(policies['metric_chunks[cpu]']['deleted'], 1)
+        self.assertEqual(policies['metric_chunks[network.*]']['deleted'], 4)
+
+    def test_append_only_table_is_trimmed_up_to_the_rowid_watermark(self):
+        self.conn.executemany("INSERT INTO net_history VALUES ('eth0', ?, 1)",
+                              [(NOW - minutes * 60,) for minutes in range(100, 0, -1)])
+        engine = RetentionEngine([RetentionPolicy('net_history', 30 * 60, None, ())])
+        self.assertEqual(engine.sweep(self.conn.cursor(), NOW), 70)
+        oldest = self.conn.execute("SELECT MIN(timestamp), COUNT(*) FROM net_history").fetchone()
+        self.assertEqual(oldest, (NOW - 30 * 60, 30))
+        self.assertEqual(engine.sweep(self.conn.cursor(), NOW), 0)
+
+    def test_everything_expired_empties_the_table(self):
+        self.conn.executemany("INSERT INTO net_history VALUES ('eth0', ?, 1)", [(NOW - HOUR,), (NOW - 2 * HOUR,)])
+        engine = RetentionEngine([RetentionPolicy('net_history', 60, None, ())])
+        self.assertEqual(engine.sweep(self.conn.cursor(), NOW), 2)
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM net_history").fetchone()[0], 0)
+
+    def test_backlog_is_worked_off_in_limited_batches(self):
+        self.conn.executemany("INSERT INTO net_history VALUES ('eth0', ?, 1)",
+                              [(NOW - minutes * 60,) for minutes in range(25, 0, -1)])
+        self.conn.executemany("INSERT INTO metric_chunks (series, timestamp) VALUES ('cpu', ?)",
+                              [(NOW - minutes * 60,) for minutes in range(25, 0, -1)])
+        engine = RetentionEngine([
+            RetentionPolicy('net_history', 5 * 60, None, ()),
+            RetentionPolicy('metric_chunks', 5 * 60, 'series GLOB ?', ('cpu',)),
+        ], batch_size=8)
+        passes = []
+        while True:
+            deleted = engine.sweep(self.conn.cursor(), NOW)
+            if not deleted:
+                break
+            passes.append(deleted)
+        self.assertEqual(passes, [16, 16, 8])
+        for table in ('net_history', 'metric_chunks'):
+            remaining = self.conn.execute(f"SELECT MIN(timestamp), COUNT(*) FROM {table}").fetchone()
+            self.assertEqual(remaining, (NOW - 5 * 60, 5))
+
+    def test_invalid_config_entries_are_skipped(self):
+        engine = create_retention_engine({'retention': {'series': {'cpu': 'soon'}, 'tables': {'net_history': '2h'}}})
+        names = {engine.policy_name(policy) for policy in engine.policies}
+        self.assertNotIn('metric_chunks[cpu]', names)
+        self.assertIn('metric_chunks[memory]', names)
+        self.assertIn('net_history', names)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+import unittest
+
+from rollup import RollupEngine, parse_interval
+
+
+class TestRollupEngine(unittest.TestCase):
+    """Test suite for the multi-resolution rollup engine"""
+
+    def setUp(self):
+        self.engine = RollupEngine([
+            {'name': '1m', 'interval': '1m', 'retention': '1h'},
+            {'name': '1h', 'interval': '1h', 'retention': '1d'},
+        ])
+
+    def test_parse_interval(self):
+        """Intervals accept plain seconds and unit suffixes"""
+        self.assertEqual(parse_interval(90), 90)
+        self.assertEqual(parse_interval('1m'), 60)
+        self.assertEqual(parse_interval('6h'), 21600)
+        self.assertEqual(parse_interval('7d'), 604800)
+
+    def test_bucket_keeps_min_max_avg_count_last(self):
+        """A closed bucket keeps every aggregate, so spikes are not averaged away"""
+        for offset, value in enumerate([10, 95, 20, 15]):
+            self.engine.add('cpu.usage', 3600 + offset, value)
+        self.engine.roll(3660)
+        finished = self.engine.drain()
+        self.assertEqual(finished, [('cpu.usage', '1m', 3600.0, 10, 95, 35.0, 4, 15)])
+
+    def test_buckets_cascade_into_coarser_tiers(self):
+        """Finished minute buckets are merged into the hour tier"""
+        for minute in range(60):
+            self.engine.add('cpu.usage', 3600 + minute * 60, minute)
+        self.engine.roll(7200)
+        hourly = [row for row in self.engine.drain() if row[1] == '1h']
+        self.assertEqual(len(hourly), 1)
+        metric, tier, start, low, high, avg, count, last = hourly[0]
+        self.assertEqual((start, low, high, count, last), (3600.0, 0, 59, 60, 59))
+        self.assertAlmostEqual(avg, 29.5)
+        self.assertEqual(len(self.engine.history('1m', 'cpu.usage')), 60)
+
+
+    def test_late_samples_are_counted(self):
+        """A sample older than the open bucket is dropped, but not silently"""
+        self.engine.add('cpu.usage', 3660, 10)
+        self.engine.add('cpu.usage', 3650, 99)
+        self.engine.roll(3720)
+        self.assertEqual(self.engine.drain(), [('cpu.usage', '1m', 3660.0, 10, 10, 10.0, 1, 10)])
+        stats = self.engine.stats()
+        self.assertEqual((stats['late_samples'], stats['late_by_metric']), (1, {'cpu.usage': 1}))
+
+
+if __name__ == "__main__":
+    unittest.main()
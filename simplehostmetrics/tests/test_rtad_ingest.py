@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import rtad_manager
+from log_offsets import FileOffsetTracker
+from rtad_ingest import EventForwarder, IngestSupervisor
+
+# Child that sends one batch with one event and then exits, as if it crashed.
+CHILD = """
+import sys, time
+from multiprocessing.connection import Connection
+conn = Connection(int(sys.argv[2]), readable=False)
+now = time.time()
+conn.send({'events': [('http_error', {'id': 1, 'url': '/'})], 'oldest': now - 0.5, 'sent': now,
+           'backlog_bytes': 42})
+"""
+
+
+class TestIngestSupervisor(unittest.TestCase):
+    """Test suite for the supervision of the RTAD ingestion process"""
+
+    def test_events_are_applied_and_crashed_child_is_restarted(self):
+        received = []
+        supervisor = IngestSupervisor(apply=lambda kind, entry: received.append((kind, entry)),
+                                      command=[sys.executable, '-c', CHILD])
+        supervisor.start()
+        try:
+            deadline = time.time() + 20
+            while len(received) < 2 and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            supervisor.stop()
+        stats = supervisor.stats()
+        self.assertGreaterEqual(len(received), 2)
+        self.assertEqual(received[0], ('http_error', {'id': 1, 'url': '/'}))
+        self.assertGreaterEqual(stats['restarts'], 1)
+        self.assertEqual(stats['events'], len(received))
+        self.assertEqual(stats['backlog_bytes'], 42)
+        self.assertGreaterEqual(stats['lag'], 0.5)
+        self.assertFalse(stats['running'])
+
+
+class RecordingPipe:
+    def __init__(self):
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append(message)
+
+
+class TestEventForwarder(unittest.TestCase):
+    """Test suite for the message side of the ingestion process"""
+
+    @mock.patch.object(rtad_manager, 'offset_tracker', FileOffsetTracker())
+    def test_messages_carry_the_last_measured_backlog(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'access.log')
+            with open(path, 'wb') as f:
+                f.write(b'x' * 100)
+            pipe = RecordingPipe()
+            forwarder = EventForwarder(pipe, [{'path': path}])
+            forwarder.send([], None)
+            forwarder.refresh_backlog()
+            with open(path, 'ab') as f:
+                f.write(b'y' * 50)
+            forwarder.send([], None)
+        self.assertEqual([message['backlog_bytes'] for message in pipe.messages], [None, 100])
+
+
+class TestLiveParsing(unittest.TestCase):
+    """Test suite for the timestamps of events parsed from live log lines"""
+
+    def parse(self, line):
+        parser = object.__new__(rtad_manager.LogParser)
+        with mock.patch.object(rtad_manager.LogParser, 'store_http_error_log') as store:
+            parser.process_http_error_log(line, 'npm')
+        return store.call_args.args
+
+    def test_event_keeps_the_logged_time(self):
+        args = self.parse('[12/Mar/2025:10:00:00 +0000] 404 - GET https example.com "/x" [Client 203.0.113.5]')
+        self.assertEqual(args[:5], ('npm', 404, '/x', '203.0.113.5', 'example.com'))
+        self.assertEqual(args[5], 1741773600.0)
+
+    def test_unparsable_time_falls_back_to_now(self):
+        args = self.parse('[yesterday] 502 - GET https example.com "/y" [Client 203.0.113.6]')
+        self.assertIsNone(args[5])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+import unittest
+
+from scheduler import SamplerScheduler
+
+
+class FakeClock:
+    """Monotonic clock that only moves when the test advances it"""
+
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestSamplerScheduler(unittest.TestCase):
+    """Test suite for the fixed-rate sampler scheduler"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.ticks = []
+        self.scheduler = SamplerScheduler(on_tick=self.ticks.append, clock=self.clock, wall_clock=self.clock)
+
+    def test_slow_tick_does_not_shift_the_schedule(self):
+        runs = []
+
+        def slow(now):
+            runs.append(now)
+            self.clock.now += 0.4  # Sampling takes 40% of the interval
+
+        sampler = self.scheduler.add('slow', 1.0, slow)
+        for expected_due in (100.0, 101.0, 102.0):
+            self.clock.now = expected_due
+            self.assertTrue(self.scheduler.run_due(self.clock.now))
+            self.assertEqual(sampler.next_due, expected_due + 1.0)
+        self.assertEqual(runs, [100.0, 101.0, 102.0])
+        self.assertEqual(sampler.missed, 0)
+
+    def test_stall_counts_missed_ticks_and_resumes_on_the_grid(self):
+        sampler = self.scheduler.add('cpu', 1.0, lambda now: None)
+        self.scheduler.run_due(self.clock.now)
+        self.clock.now = 104.5  # Stalled past the slots at 101, 102, 103 and 104
+        self.scheduler.run_due(self.clock.now)
+        self.assertEqual((sampler.runs, sampler.missed, sampler.next_due), (2, 3, 105.0))
+        self.assertFalse(self.scheduler.run_due(104.9))
+
+    def test_on_tick_runs_once_per_wake_up(self):
+        first = self.scheduler.add('cpu', 1.0, lambda now: None)
+        second = self.scheduler.add('memory', 2.0, lambda now: None)
+        self.scheduler.run_due(self.clock.now)  # Both due
+        self.clock.now = 101.0
+        self.scheduler.run_due(self.clock.now)  # Only cpu due
+        self.scheduler.run_due(self.clock.now + 0.5)  # Nothing due
+        self.assertEqual(self.ticks, [100.0, 101.0])
+        self.assertEqual((first.runs, second.runs, self.scheduler.ticks), (2, 1, 2))
+
+    def test_failing_sampler_is_counted_and_does_not_stop_others(self):
+        def broken(now):
+            raise RuntimeError("boom")
+
+        failing = self.scheduler.add('broken', 1.0, broken)
+        healthy = self.scheduler.add('cpu', 1.0, lambda now: None)
+        self.scheduler.run_due(self.clock.now)
+        self.assertEqual((failing.errors, failing.runs, healthy.runs), (1, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
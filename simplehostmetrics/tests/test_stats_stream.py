@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+import unittest
+
+from stats_stream import StreamHub, Subscriber, encode_event
+
+
+class TestStreamHub(unittest.TestCase):
+    """Test suite for the fan-out of stats stream frames"""
+
+    def test_every_subscriber_gets_the_same_frame(self):
+        hub = StreamHub(buffer_size=4)
+        first, second = hub.subscribe(), hub.subscribe()
+        frame = encode_event('1', b'{}')
+        hub.publish(frame)
+        self.assertIs(first.get(0), frame)
+        self.assertIs(second.get(0), frame)
+        self.assertIsNone(first.get(0))
+        self.assertEqual(hub.stats()['published'], 1)
+
+    def test_slow_subscriber_is_disconnected_on_overflow(self):
+        hub = StreamHub(buffer_size=2)
+        slow, fast = hub.subscribe(), hub.subscribe()
+        for n in range(3):
+            hub.publish(encode_event(str(n), b'{}'))
+            fast.get(0)
+        self.assertTrue(slow.closed)
+        with self.assertRaises(EOFError):
+            slow.get(0)
+        self.assertFalse(fast.closed)
+        stats = hub.stats()
+        self.assertEqual((stats['subscribers'], stats['slow_disconnects']), (1, 1))
+
+    def test_subscribe_respects_capacity(self):
+        hub = StreamHub(max_subscribers=1)
+        subscriber = hub.subscribe()
+        self.assertIsNone(hub.subscribe())
+        hub.unsubscribe(subscriber)
+        self.assertTrue(subscriber.closed)
+        self.assertIsNotNone(hub.subscribe())
+
+    def test_closed_subscriber_rejects_frames(self):
+        subscriber = Subscriber(buffer_size=2)
+        subscriber.close('bye')
+        self.assertFalse(subscriber.put(b'x'))
+        with self.assertRaisesRegex(EOFError, 'bye'):
+            subscriber.get(0)
+
+
+class TestEncodeEvent(unittest.TestCase):
+    """Test suite for the SSE frame format"""
+
+    def test_frame_layout(self):
+        self.assertEqual(encode_event('42', b'{"cpu": 1}'),
+                         b'id: 42\nevent: stats\ndata: {"cpu": 1}\n\n')
+
+    def test_custom_event_name(self):
+        self.assertEqual(encode_event('7', b'[]', event='ping'), b'id: 7\nevent: ping\ndata: []\n\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
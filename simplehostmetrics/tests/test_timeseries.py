@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+import unittest
+
+from timeseries import TimeSeries, SeriesStore
+
+
+class TestTimeSeries(unittest.TestCase):
+    """Test suite for the ring-buffer metric store"""
+
+    def test_view_returns_newest_samples_in_order(self):
+        """The view always holds the newest samples, oldest first, after wrapping"""
+        series = TimeSeries(('usage', 'idle'), capacity=4)
+        for i in range(10):
+            series.append(1000.0 + i, i, 100 - i)
+        timestamps, values = series.view()
+        self.assertEqual(len(series), 4)
+        self.assertEqual(list(timestamps), [1006.0, 1007.0, 1008.0, 1009.0])
+        self.assertEqual(values['usage'].tolist(), [6.0, 7.0, 8.0, 9.0])
+        self.assertEqual(values['idle'].tolist(), [94.0, 93.0, 92.0, 91.0])
+
+    def test_view_limit_and_last(self):
+        """Limited views and last() only expose valid samples"""
+        series = TimeSeries(('usage',), capacity=8)
+        self.assertIsNone(series.last())
+        series.append(1.0, 10)
+        series.append(2.0, 20)
+        timestamps, values = series.view(limit=5)
+        self.assertEqual(list(timestamps), [1.0, 2.0])
+        self.assertEqual(series.last(), {'usage': 20.0})
+        self.assertEqual(series.last_timestamp(), 2.0)
+
+    def test_clear(self):
+        """Clearing a series drops all samples"""
+        series = TimeSeries(('usage',), capacity=3)
+        series.append(1.0, 1)
+        series.clear()
+        self.assertEqual(len(series), 0)
+        self.assertEqual(series.to_columns(), {'time': [], 'usage': []})
+
+    def test_since_returns_only_newer_samples(self):
+        """since() returns samples after a cursor and flags cursors that fell out of the buffer"""
+        series = TimeSeries(('usage',), capacity=3)
+        series.append(1.0, 10)
+        cursor = series.seq
+        series.append(2.0, 20)
+        series.append(3.0, 30)
+        timestamps, values = series.since(cursor)
+        self.assertEqual(values['usage'].tolist(), [20.0, 30.0])
+        self.assertEqual(len(series.since(series.seq)[0]), 0)
+        series.append(4.0, 40)
+        series.append(5.0, 50)
+        self.assertIsNone(series.since(cursor))
+
+    def test_until_and_sequence_columns(self):
+        """Views can stop at a cursor and report each sample's sequence number"""
+        series = TimeSeries(('usage',), capacity=4)
+        series.append(1.0, 10)
+        first = series.seq
+        series.append(2.0, 20)
+        cursor = series.seq
+        series.append(3.0, 30)
+        self.assertEqual(series.to_columns(until=cursor)['usage'], [10.0, 20.0])
+        self.assertEqual(series.to_records(until=first), [{'time': series.to_columns()['time'][0], 'usage': 10.0}])
+        columns = series.to_columns(since=first, sequence=True)
+        self.assertEqual((columns['usage'], columns['seq']), ([20.0, 30.0], [cursor, series.seq]))
+
+    def test_float32_series_returns_clean_values(self):
+        """Compact float32 series report values at float32 precision"""
+        series = TimeSeries(('0', '1'), capacity=2, typecode='f')
+        series.append(1.0, 4.9, 12.3)
+        self.assertEqual(series.to_columns()['0'], [4.9])
+        self.assertEqual(series.last(), {'0': 4.9, '1': 12.3})
+
+    def test_series_store_creates_series_lazily(self):
+        """A SeriesStore creates one series per key with the shared layout"""
+        store = SeriesStore(('input', 'output'), capacity=2)
+        store.append('eth0', 1.0, 0.5, 0.25)
+        store.append('eth0', 2.0, 1.5, 1.25)
+        store.append('eth0', 3.0, 2.5, 2.25)
+        records = store.to_records()
+        self.assertEqual(list(records), ['eth0'])
+        self.assertEqual([r['input'] for r in records['eth0']], [1.5, 2.5])
+
+
+if __name__ == "__main__":
+    unittest.main()
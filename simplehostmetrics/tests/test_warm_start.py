@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import unittest
+
+from rollup import RollupEngine
+from timeseries import TimeSeries
+from warm_start import read_snapshot, write_snapshot
+
+TIERS = [{'name': '1m', 'interval': '1m', 'retention': '1h'}]
+
+
+class TestWarmStart(unittest.TestCase):
+    """Test suite for the binary metrics snapshot"""
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_round_trip_restores_series_and_open_buckets(self):
+        """Ring buffers and partial rollup buckets survive a save and load"""
+        cpu = TimeSeries(('usage',), 4)
+        cores = TimeSeries(('0', '1'), 4, typecode='f')
+        for ts in range(6):
+            cpu.append(100.0 + ts, ts * 1.5)
+            cores.append(100.0 + ts, ts, ts + 0.5)
+        engine = RollupEngine(TIERS)
+        engine.add('cpu.usage', 120, 10.0)
+        engine.add('cpu.usage', 130, 30.0)
+        write_snapshot(self.path, [('cpu', cpu), ('cpu_cores', cores)], engine, now=1000.0)
+
+        restored = {'cpu': TimeSeries(('usage',), 4), 'cpu_cores': TimeSeries(('0', '1'), 4, typecode='f')}
+        engine = RollupEngine(TIERS)
+        created = read_snapshot(self.path, restored.get, engine, max_age=60, now=1010.0)
+        self.assertEqual(created, 1000.0)
+        self.assertEqual(restored['cpu'].to_columns(raw_timestamps=True)['timestamp'], [102.0, 103.0, 104.0, 105.0])
+        self.assertEqual(restored['cpu'].to_columns()['usage'], [3.0, 4.5, 6.0, 7.5])
+        self.assertEqual(restored['cpu_cores'].last(), {'0': 5.0, '1': 5.5})
+        restored['cpu'].append(106.0, 9.0)
+        self.assertEqual(restored['cpu'].to_columns()['usage'], [4.5, 6.0, 7.5, 9.0])
+        engine.roll(180)
+        self.assertEqual(engine.drain(), [('cpu.usage', '1m', 120.0, 10.0, 30.0, 20.0, 2, 30.0)])
+
+    def test_stale_or_invalid_snapshot_is_ignored(self):
+        """Old or corrupt files load nothing, so the caller falls back to the database"""
+        cpu = TimeSeries(('usage',), 4)
+        cpu.append(100.0, 1.0)
+        write_snapshot(self.path, [('cpu', cpu)], RollupEngine(TIERS), now=1000.0)
+        target = TimeSeries(('usage',), 4)
+        self.assertIsNone(read_snapshot(self.path, {'cpu': target}.get, RollupEngine(TIERS), max_age=60, now=2000.0))
+        with open(self.path, 'r+b') as f:
+            f.truncate(40)
+        self.assertIsNone(read_snapshot(self.path, {'cpu': target}.get, RollupEngine(TIERS), now=1000.0))
+        self.assertEqual(len(target), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,256 @@
+# simplehostmetrics/timeseries.py
+# This module provides a fixed-capacity, array-backed ring buffer for metric histories.
+# Every series keeps one typed column per metric field plus a shared timestamp column,
+# so appending a sample is O(1) and never allocates or shifts existing data.
+
+from array import array
+from bisect import bisect_right
+import datetime
+import itertools
+from functools import lru_cache
+
+# Process-wide sample sequence. Every appended sample gets the next number, so one
+# cursor value can be used to ask any series for "everything newer than this".
+_sequence = itertools.count(1)
+
+
+@lru_cache(maxsize=4096)
+def format_timestamp(ts, fmt='%H:%M:%S'):
+    """
+    Format a UNIX timestamp for chart labels.
+    Series sampled in the same tick share timestamps, so the labels are cached.
+    """
+    return datetime.datetime.fromtimestamp(ts).strftime(fmt)
+
+
+def _float32_list(column):
+    """
+    Convert float32 values to Python floats without the binary noise of the widening
+    (4.9 instead of 4.900000095367432), keeping float32's ~7 significant digits.
+    """
+    return [float(format(value, '.7g')) for value in column]
+
+
+class TimeSeries:
+    """
+    Fixed-capacity ring buffer with one typed column per field and a shared timestamp column.
+
+    Each column is allocated twice as long as the capacity and every value is written to
+    both halves ("mirrored" ring buffer). The newest N samples are therefore always stored
+    contiguously, which lets view() return zero-copy memoryview slices instead of copies.
+    """
+
+    def __init__(self, fields, capacity, typecode='d'):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.fields = tuple(fields)
+        self.capacity = int(capacity)
+        self.typecode = typecode
+        self._timestamps = array('d', bytes(8 * 2 * self.capacity))
+        self._seqs = array('q', bytes(8 * 2 * self.capacity))
+        self._columns = [array(typecode, [0]) * (2 * self.capacity) for _ in self.fields]
+        self._tolist = _float32_list if typecode == 'f' else (lambda column: column.tolist())
+        self._count = 0   # Number of valid samples (<= capacity).
+        self._next = 0    # Slot in [0, capacity) that the next sample is written to.
+        self.evicted_seq = 0  # Sequence number of the newest sample that was overwritten.
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, *values):
+        """
+        Append one sample. Values are given positionally in the order of self.fields.
+        """
+        i = self._next
+        j = i + self.capacity
+        if self._count == self.capacity:
+            self.evicted_seq = self._seqs[i]
+        self._seqs[i] = self._seqs[j] = next(_sequence)
+        self._timestamps[i] = self._timestamps[j] = timestamp
+        for column, value in zip(self._columns, values):
+            column[i] = column[j] = value
+        self._next = i + 1 if i + 1 < self.capacity else 0
+        if self._count < self.capacity:
+            self._count += 1
+
+    def clear(self):
+        """
+        Drop all samples without releasing the underlying buffers.
+        """
+        self._count = 0
+        self._next = 0
+        self.evicted_seq = self.seq
+
+    def load(self, timestamps, columns):
+        """
+        Replace the contents with the given samples (oldest first) in one bulk copy.
+        `timestamps` and `columns` (one per field) are arrays or memoryviews of the series'
+        typecodes ('d' for timestamps); only the newest `capacity` samples are kept.
+        """
+        self.clear()
+        n = min(len(timestamps), self.capacity)
+        skip = len(timestamps) - n
+        targets = [self._seqs, self._timestamps] + self._columns
+        sources = [array('q', itertools.islice(_sequence, n)), memoryview(timestamps)[skip:]]
+        sources += [memoryview(column)[skip:] for column in columns]
+        for target, source in zip(targets, sources):
+            view = memoryview(target)
+            view[:n] = source
+            view[self.capacity:self.capacity + n] = source
+        self._count = n
+        self._next = n if n < self.capacity else 0
+
+    @property
+    def seq(self):
+        """
+        Sequence number of the newest sample, or the last evicted one if the series is empty.
+        """
+        if not self._count:
+            return self.evicted_seq
+        return self._seqs[self._next - 1 + self.capacity]
+
+    def last_timestamp(self):
+        """
+        Return the timestamp of the newest sample, or None if the series is empty.
+        """
+        if not self._count:
+            return None
+        return self._timestamps[self._next - 1 + self.capacity]
+
+    def last(self):
+        """
+        Return the newest sample as a dict of field -> value, or None if the series is empty.
+        """
+        if not self._count:
+            return None
+        i = self._next - 1 + self.capacity
+        return {field: self._tolist(column[i:i + 1])[0] for field, column in zip(self.fields, self._columns)}
+
+    def _window(self, limit=None, since=None, until=None):
+        """
+        Return the (start, end) slot range of the newest `limit` samples with a sequence
+        number greater than `since` and not greater than `until`, or None if samples newer
+        than `since` were already overwritten.
+        """
+        if since is not None and since < self.evicted_seq:
+            return None
+        end = self._next + self.capacity
+        start = end - self._count
+        if since is not None or until is not None:
+            seqs = memoryview(self._seqs)[start:end]
+            if until is not None:
+                end = start + bisect_right(seqs, until)
+            if since is not None:
+                start = min(start + bisect_right(seqs, since), end)
+        if limit is not None:
+            start = max(start, end - limit)
+        return start, end
+
+    def _slices(self, start, end):
+        timestamps = memoryview(self._timestamps)[start:end]
+        values = {field: memoryview(column)[start:end]
+                  for field, column in zip(self.fields, self._columns)}
+        return timestamps, values
+
+    def view(self, limit=None, until=None):
+        """
+        Return (timestamps, {field: values}) for the newest `limit` samples (oldest first),
+        up to sequence number `until` if given.
+        The values are memoryview slices of the live buffers, so no data is copied. They stay
+        valid until the writer wraps around, so copy them (e.g. tolist()) before handing them
+        to another thread or keeping them across ticks.
+        """
+        return self._slices(*self._window(limit, until=until))
+
+    def since(self, cursor, limit=None, until=None):
+        """
+        Return the samples with a sequence number greater than `cursor` (and not greater
+        than `until`, if given) as (timestamps, {field: values}) memoryviews, like view().
+        Returns None if samples newer than the cursor were already overwritten, in which
+        case the caller has to resynchronize from a full view.
+        """
+        window = self._window(limit, cursor, until)
+        return self._slices(*window) if window is not None else None
+
+    def to_columns(self, limit=None, time_format='%H:%M:%S', since=None, until=None, raw_timestamps=False,
+                   sequence=False):
+        """
+        Return the newest samples in the column layout used by the dashboard charts:
+        {'time': [...labels], field: [...values], ...}.
+        With `since`, only samples newer than that cursor are returned; None means the
+        cursor fell out of the buffer (see since()). `until` leaves out samples newer than
+        that cursor. raw_timestamps adds a 'timestamp' column with the UNIX timestamps,
+        sequence a 'seq' column with the samples' sequence numbers.
+        """
+        window = self._window(limit, since, until)
+        if window is None:
+            return None
+        timestamps, values = self._slices(*window)
+        result = {'time': [format_timestamp(ts, time_format) for ts in timestamps]}
+        if raw_timestamps:
+            result['timestamp'] = timestamps.tolist()
+        if sequence:
+            result['seq'] = memoryview(self._seqs)[window[0]:window[1]].tolist()
+        for field, column in values.items():
+            result[field] = self._tolist(column)
+        return result
+
+    def to_records(self, limit=None, time_format='%H:%M:%S', until=None):
+        """
+        Return the newest samples as a list of {'time': label, field: value, ...} dicts.
+        """
+        timestamps, values = self.view(limit, until)
+        columns = [(field, self._tolist(column)) for field, column in values.items()]
+        records = []
+        for idx, ts in enumerate(timestamps):
+            record = {'time': format_timestamp(ts, time_format)}
+            for field, column in columns:
+                record[field] = column[idx]
+            records.append(record)
+        return records
+
+
+class SeriesStore:
+    """
+    A keyed collection of TimeSeries sharing a field layout, e.g. one series per network interface.
+    Series are created lazily on first append with the configured capacity and typecode.
+    """
+
+    def __init__(self, fields, capacity, typecode='d'):
+        self.fields = tuple(fields)
+        self.capacity = int(capacity)
+        self.typecode = typecode
+        self.series = {}
+
+    def __contains__(self, key):
+        return key in self.series
+
+    def __iter__(self):
+        return iter(self.series)
+
+    def __len__(self):
+        return len(self.series)
+
+    def get(self, key):
+        """
+        Return the TimeSeries for key, creating it if necessary.
+        """
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = TimeSeries(self.fields, self.capacity, self.typecode)
+        return series
+
+    def append(self, key, timestamp, *values):
+        self.get(key).append(timestamp, *values)
+
+    def clear(self):
+        self.series.clear()
+
+    def items(self):
+        return self.series.items()
+
+    def to_records(self, limit=None, time_format='%H:%M:%S', until=None):
+        """
+        Return {key: [records...]} for every series in the store.
+        """
+        return {key: series.to_records(limit, time_format, until) for key, series in list(self.series.items())}
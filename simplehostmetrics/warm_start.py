@@ -0,0 +1,216 @@
+# simplehostmetrics/warm_start.py
+# This module persists the in-memory metric state to a compact binary snapshot file, so a
+# restarted collector is warm immediately instead of rebuilding its ring buffers from SQLite.
+# The file holds a small JSON header (series names, fields, open rollup buckets) followed by
+# the raw ring buffer columns. On startup it is memory-mapped and the columns are copied into
+# the ring buffers in bulk; a missing, foreign or stale file falls back to the SQLite history.
+
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+
+from rollup import parse_interval
+
+SNAPSHOT_MAGIC = b'SHMWARM1'
+HEADER_SIZE = struct.Struct('<I')
+ALIGNMENT = 8
+
+DEFAULT_PATH = 'metrics.snapshot'
+DEFAULT_INTERVAL = 60
+DEFAULT_MAX_AGE = 3600
+
+
+def _padding(size):
+    return -size % ALIGNMENT
+
+
+def write_snapshot(path, series_items, rollups, now=None):
+    """
+    Write every (name, TimeSeries) of `series_items` and the open buckets of `rollups`
+    to `path`. The file is replaced atomically. Returns the number of bytes written.
+    """
+    now = time.time() if now is None else now
+    entries = []
+    blocks = []
+    offset = 0
+    for name, series in series_items:
+        timestamps, values = series.view()
+        count = len(timestamps)
+        if not count:
+            continue
+        entries.append({'name': name, 'fields': list(series.fields), 'typecode': series.typecode,
+                        'count': count, 'offset': offset})
+        for block in [timestamps] + [values[field] for field in series.fields]:
+            blocks.append(block)
+            offset += block.nbytes
+            if _padding(block.nbytes):
+                blocks.append(bytes(_padding(block.nbytes)))
+                offset += _padding(block.nbytes)
+    header = json.dumps({
+        'created': now,
+        'byteorder': sys.byteorder,
+        'series': entries,
+        'tiers': {tier.name: tier.interval for tier in rollups.tiers},
+        'open': rollups.open_buckets()
+    }, separators=(',', ':')).encode('utf-8')
+    header += b' ' * _padding(len(SNAPSHOT_MAGIC) + HEADER_SIZE.size + len(header))
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(HEADER_SIZE.pack(len(header)))
+        f.write(header)
+        for block in blocks:
+            f.write(block)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return len(SNAPSHOT_MAGIC) + HEADER_SIZE.size + len(header) + offset
+
+
+def read_snapshot(path, resolve, rollups, max_age=None, now=None):
+    """
+    Load a snapshot written by write_snapshot(). `resolve(name)` returns the TimeSeries a
+    stored series is loaded into, or None to skip it. Series whose fields or typecode changed
+    are skipped, as are rollup buckets of tiers whose interval changed.
+    Returns the snapshot's creation time, or None if the file is missing, invalid or older
+    than `max_age` seconds (nothing is loaded in that case).
+    """
+    now = time.time() if now is None else now
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    with f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            logging.warning("Ignoring metrics snapshot %s: %s", path, e)
+            return None
+        with mapped:
+            # Errors are handled inside the mapping, so the views held by the traceback
+            # are gone before the mapping is closed.
+            try:
+                with memoryview(mapped) as view:
+                    return _load(view, resolve, rollups, max_age, now)
+            except (ValueError, KeyError, TypeError, struct.error) as e:
+                logging.warning("Ignoring metrics snapshot %s: %s", path, e)
+    return None
+
+
+def _load(view, resolve, rollups, max_age, now):
+    prefix = len(SNAPSHOT_MAGIC) + HEADER_SIZE.size
+    if bytes(view[:len(SNAPSHOT_MAGIC)]) != SNAPSHOT_MAGIC:
+        raise ValueError("not a metrics snapshot")
+    (header_size,) = HEADER_SIZE.unpack(view[len(SNAPSHOT_MAGIC):prefix])
+    header = json.loads(bytes(view[prefix:prefix + header_size]))
+    if header['byteorder'] != sys.byteorder:
+        raise ValueError(f"written on a {header['byteorder']}-endian host")
+    if max_age is not None and now - header['created'] > max_age:
+        logging.info("Metrics snapshot is %.0fs old; loading history from the database", now - header['created'])
+        return None
+    data = view[prefix + header_size:]
+
+    # Map and check every column first, so a truncated file loads nothing at all.
+    loads = []
+    for entry in header['series']:
+        series = resolve(entry['name'])
+        if series is None or list(series.fields) != entry['fields'] or series.typecode != entry['typecode']:
+            continue
+        count = entry['count']
+        offset = entry['offset']
+        columns = []
+        for typecode in ['d'] + [series.typecode] * len(series.fields):
+            size = array(typecode).itemsize
+            end = offset + size * count
+            if end > len(data):
+                raise ValueError("snapshot is truncated")
+            columns.append(data[offset:end].cast(typecode))
+            offset = end + _padding(size * count)
+        loads.append((series, columns))
+    for series, columns in loads:
+        series.load(columns[0], columns[1:])
+
+    tiers = {tier.name: tier.interval for tier in rollups.tiers}
+    rollups.restore_open([bucket for bucket in header['open']
+                          if header['tiers'].get(bucket[0]) == tiers.get(bucket[0])])
+    return header['created']
+
+
+class WarmStart:
+    """
+    Periodically saves the metrics snapshot (and once more on shutdown) and loads it on startup.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, interval=DEFAULT_INTERVAL, max_age=DEFAULT_MAX_AGE):
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.saves = 0
+        self.errors = 0
+        self.last_save = None
+        self.last_size = 0
+        self.last_duration = 0.0
+        self.loaded = None
+        self.load_duration = 0.0
+
+    def save(self, series_items, rollups, now=None):
+        started = time.perf_counter()
+        with self.lock:
+            try:
+                self.last_size = write_snapshot(self.path, series_items, rollups, now)
+            except OSError as e:
+                self.errors += 1
+                logging.error("Failed to write metrics snapshot %s: %s", self.path, e)
+                return False
+            self.saves += 1
+            self.last_save = time.time() if now is None else now
+            self.last_duration = time.perf_counter() - started
+        return True
+
+    def load(self, resolve, rollups):
+        """
+        Load the snapshot. Returns True if it was used, False if the caller has to
+        fall back to the database history.
+        """
+        started = time.perf_counter()
+        self.loaded = read_snapshot(self.path, resolve, rollups, self.max_age)
+        self.load_duration = time.perf_counter() - started
+        if self.loaded is not None:
+            logging.info("Loaded metrics snapshot %s in %.1f ms", self.path, self.load_duration * 1000)
+        return self.loaded is not None
+
+    def stats(self):
+        with self.lock:
+            return {
+                'path': self.path,
+                'interval': self.interval,
+                'saves': self.saves,
+                'errors': self.errors,
+                'last_save': self.last_save,
+                'last_size': self.last_size,
+                'last_duration': round(self.last_duration, 6),
+                'loaded_from': self.loaded,
+                'load_duration': round(self.load_duration, 6)
+            }
+
+
+def create_warm_start(stats_config):
+    """
+    Build the snapshot handler from the stats.warm_start section of config.yml.
+    """
+    config = stats_config.get('warm_start', {}) or {}
+    try:
+        return WarmStart(config.get('path', DEFAULT_PATH),
+                         parse_interval(config.get('interval', DEFAULT_INTERVAL)),
+                         parse_interval(config.get('max_age', DEFAULT_MAX_AGE)))
+    except (TypeError, ValueError) as e:
+        logging.error("Invalid stats.warm_start configuration: %s", e)
+        return WarmStart()